@@ -0,0 +1,164 @@
+"""
+Sprite animation from sprite sheets.
+
+A sheet in `CHAR_IMAGE_PATH` has one row per cycle and one column per frame, all frames have
+the size of the sheet's `frame_size`. The frames of a cycle are sliced once by the `ImageCache`
+(subsurfaces of the sheet, flipped variants are cached copies) and shared by every sprite that
+plays the cycle. Switching a frame only swaps the `image` and `mask` references of a sprite.
+"""
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import pygame
+
+from images import CHAR_IMAGE_PATH, IMAGE_CACHE, CachedImage, ImageCache
+
+# CYCLES
+CYCLE_IDLE = "idle"
+CYCLE_WALK = "walk"
+CYCLE_SPRINT = "sprint"
+
+
+class AnimationCycle(NamedTuple):
+    row: int
+    frame_count: int
+    frame_time: float  # seconds per frame
+
+
+class SpriteSheet(NamedTuple):
+    path: Path
+    frame_size: Tuple[int, int]
+    cycles: Dict[str, AnimationCycle]
+
+
+def character_cycles(idle_time: float = 0.5, walk_time: float = 0.15,
+                     sprint_time: float = 0.1) -> Dict[str, AnimationCycle]:
+    """the cycles of the character sheets: idle in the first row, walk in the second, sprint in the third"""
+    return {
+        CYCLE_IDLE: AnimationCycle(0, 2, idle_time),
+        CYCLE_WALK: AnimationCycle(1, 4, walk_time),
+        CYCLE_SPRINT: AnimationCycle(2, 4, sprint_time),
+    }
+
+
+SPRITE_SHEETS: Dict[str, SpriteSheet] = {
+    "main_char": SpriteSheet(CHAR_IMAGE_PATH / 'main_char_sheet.png', (140, 200), character_cycles()),
+    "monster": SpriteSheet(CHAR_IMAGE_PATH / 'monster_sheet.png', (180, 200), character_cycles(0.6, 0.2, 0.12)),
+}
+
+FrameSequence = Tuple[CachedImage, ...]
+
+
+class AnimationCache:
+    """Slices the frame sequences of the `SPRITE_SHEETS` once, a sequence per sheet, cycle and flip"""
+
+    def __init__(self, image_cache: ImageCache = IMAGE_CACHE):
+        self.image_cache = image_cache
+        self._sequences: Dict[Tuple[str, str, bool], FrameSequence] = {}
+
+    def get(self, sheet_name: str, cycle_name: str, flipped: bool = False) -> FrameSequence:
+        key = (sheet_name, cycle_name, flipped)
+        sequence = self._sequences.get(key)
+        if sequence is None:
+            sheet = SPRITE_SHEETS[sheet_name]
+            cycle = sheet.cycles[cycle_name]
+            width, height = sheet.frame_size
+            sequence = self._sequences[key] = tuple(
+                self.image_cache.get(
+                    sheet.path, flipped, pygame.Rect(column * width, cycle.row * height, width, height)
+                )
+                for column in range(cycle.frame_count)
+            )
+        return sequence
+
+    def warm(self, sheet_name: str) -> None:
+        """slices all cycles of a sheet, so no frame gets sliced during the game"""
+        for cycle_name in SPRITE_SHEETS[sheet_name].cycles:
+            self.get(sheet_name, cycle_name, False)
+            self.get(sheet_name, cycle_name, True)
+
+    def clear(self) -> None:
+        self._sequences.clear()
+
+
+ANIMATION_CACHE = AnimationCache()
+
+
+class Animator:
+    """
+    Plays the cycles of a sheet on `sprite` by elapsed time, independent of the frame rate.
+
+    ## Arguments
+    - `sprite`, gets the `image` and `mask` of the current frame
+    - `sheet_name`, a key of `SPRITE_SHEETS`
+    """
+    __slots__ = ("sprite", "cache", "sheet_name", "cycle_name", "flipped", "frames", "frame_time",
+                 "elapsed", "frame_index")
+
+    def __init__(self, sprite: pygame.sprite.Sprite, sheet_name: str, cycle_name: str = CYCLE_IDLE,
+                 cache: AnimationCache = ANIMATION_CACHE):
+        self.sprite = sprite
+        self.cache = cache
+        self.sheet_name = sheet_name
+        self.cycle_name = cycle_name
+        self.flipped = False
+        self.frames: FrameSequence = ()
+        self.frame_time = 1.0
+        self.elapsed = 0.0
+        self.frame_index = 0
+        self.play(cycle_name, False, sheet_name)
+
+    def play(self, cycle_name: str, flipped: bool, sheet_name: Optional[str] = None) -> None:
+        """
+        switches the cycle, the flip or the sheet. a new cycle starts at its first frame,
+        flipping keeps the frame, so turning around does not restart the steps
+        """
+        sheet_name = sheet_name or self.sheet_name
+        if (cycle_name, flipped, sheet_name) == (self.cycle_name, self.flipped, self.sheet_name) and self.frames:
+            return
+        if cycle_name != self.cycle_name or sheet_name != self.sheet_name:
+            self.elapsed = 0.0
+            self.frame_index = 0
+        self.sheet_name = sheet_name
+        self.cycle_name = cycle_name
+        self.flipped = flipped
+        self.frames = self.cache.get(sheet_name, cycle_name, flipped)
+        self.frame_time = SPRITE_SHEETS[sheet_name].cycles[cycle_name].frame_time
+        self.frame_index %= len(self.frames)
+        self.show_frame()
+
+    def update(self, dt: float) -> None:
+        """advances the cycle by `dt` seconds"""
+        cycle_time = self.frame_time * len(self.frames)
+        self.elapsed = (self.elapsed + dt) % cycle_time
+        frame_index = int(self.elapsed / self.frame_time)
+        if frame_index != self.frame_index:
+            self.frame_index = frame_index
+            self.show_frame()
+
+    def show_frame(self) -> None:
+        frame = self.frames[self.frame_index]
+        self.sprite.image = frame.surface
+        self.sprite.mask = frame.mask
+
+
+class AnimatedSprite(pygame.sprite.Sprite):
+    """
+    A sprite that only plays a cycle, e.g. an npc. `update(dt)` advances it, a cycle of a single
+    frame leaves nothing to update and the sprite falls asleep in its layer, see layers.py
+    """
+
+    def __init__(self, sheet_name: str = "monster", *groups: pygame.sprite.AbstractGroup):
+        super().__init__(*groups)
+        self.animator = Animator(self, sheet_name)
+        self.rect = self.image.get_rect()
+
+    def update(self, dt: float) -> None:
+        self.animator.update(dt)
+
+    def is_idle(self) -> bool:
+        return len(self.animator.frames) < 2
+
+
+def create_animated_sprite(sheet_name: str = "monster") -> AnimatedSprite:
+    return AnimatedSprite(sheet_name)
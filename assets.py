@@ -0,0 +1,230 @@
+"""
+Compiled assets, pre-decoded images and sounds.
+
+`python assets.py` compiles the PNG images and OGG sounds of `RESOURCE_PATH` into blobs in
+`COMPILED_ASSET_PATH`: the pixels of an image as BGRA bytes, the format `convert_alpha` gives on
+common displays, and the samples of a sound in the format of the mixer. Loading a blob maps the
+file and copies the payload into a surface or a sound, nothing is decoded.
+A blob header holds the size, the modification time and a hash of its source file. When the
+source changed, the blob is missing or the mixer runs with another format, the source file is
+loaded instead. The music is streamed by `pygame.mixer.music` and stays an OGG.
+"""
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+import pygame
+
+# PATHS
+RESOURCE_PATH = Path.cwd() / 'resources'
+COMPILED_ASSET_PATH = Path.cwd() / 'data' / 'assets'
+
+# BLOBS
+ASSET_MAGIC = b"GRPGAST1"
+# magic, kind, source size, source mtime in ns, source hash, width or frequency, height or
+# sample format, channels, payload size
+ASSET_HEADER = struct.Struct("<8sBQq16sIiII")
+ASSET_IMAGE = 1
+ASSET_SOUND = 2
+IMAGE_FORMAT = "BGRA"
+COMPILED_SUFFIXES = {".png": ASSET_IMAGE, ".ogg": ASSET_SOUND}
+# directories of `RESOURCE_PATH` with assets that are loaded as a whole
+COMPILED_DIRECTORIES = ("img", "sound")
+
+
+class AssetHeader(NamedTuple):
+    magic: bytes
+    kind: int
+    source_size: int
+    source_mtime: int
+    source_hash: bytes
+    width: int  # the frequency of sounds
+    height: int  # the sample format of sounds
+    channels: int
+    payload_size: int
+
+
+def file_hash(path: Path) -> bytes:
+    with open(path, 'rb') as fp:
+        return hashlib.blake2b(fp.read(), digest_size=16).digest()
+
+
+def compiled_file(source: Path, path: Path = COMPILED_ASSET_PATH) -> Optional[Path]:
+    """the blob of `source`, None for files outside of `RESOURCE_PATH`"""
+    try:
+        relative = Path(source).resolve().relative_to(RESOURCE_PATH.resolve())
+    except ValueError:
+        return None
+    return Path(path) / relative.with_suffix(relative.suffix + ".bin")
+
+
+def source_header(source: Path, kind: int, width: int, height: int, channels: int, payload_size: int) -> bytes:
+    stat = os.stat(source)
+    return ASSET_HEADER.pack(ASSET_MAGIC, kind, stat.st_size, stat.st_mtime_ns, file_hash(source),
+                             width, height, channels, payload_size)
+
+
+def is_current(header: AssetHeader, source: Path) -> bool:
+    """
+    true if the blob was compiled from the current `source`. the hash is only compared when the
+    modification time changed, e.g. after a checkout, a blob without its source is always current
+    """
+    try:
+        stat = os.stat(source)
+    except OSError:
+        return True
+    if stat.st_size != header.source_size:
+        return False
+    return stat.st_mtime_ns == header.source_mtime or file_hash(source) == header.source_hash
+
+
+def write_blob(file: Path, header: bytes, payload: bytes) -> None:
+    file.parent.mkdir(parents=True, exist_ok=True)
+    temporary_file = file.with_suffix(".tmp")
+    with open(temporary_file, 'wb') as fp:
+        fp.write(header)
+        fp.write(payload)
+    os.replace(temporary_file, file)
+
+
+def compile_image(source: Path, file: Path) -> int:
+    """returns the payload size"""
+    surface = pygame.image.load(source)
+    payload = pygame.image.tobytes(surface, IMAGE_FORMAT)
+    width, height = surface.get_size()
+    write_blob(file, source_header(source, ASSET_IMAGE, width, height, 4, len(payload)), payload)
+    return len(payload)
+
+
+def compile_sound(source: Path, file: Path) -> int:
+    """returns the payload size, the samples are stored in the format of the running mixer"""
+    frequency, sample_format, channels = pygame.mixer.get_init()
+    payload = pygame.mixer.Sound(source).get_raw()
+    write_blob(file, source_header(source, ASSET_SOUND, frequency, sample_format, channels, len(payload)), payload)
+    return len(payload)
+
+
+def source_assets(path: Path = RESOURCE_PATH) -> Iterator[Path]:
+    for directory in COMPILED_DIRECTORIES:
+        for source in sorted((Path(path) / directory).rglob("*")):
+            if source.suffix.lower() in COMPILED_SUFFIXES:
+                yield source
+
+
+def compile_assets(force: bool = False) -> List[Tuple[Path, int]]:
+    """compiles the stale and missing blobs. returns the compiled sources with their payload sizes"""
+    compiled = []
+    for source in source_assets():
+        file = compiled_file(source)
+        if file is None:
+            continue
+        if not force:
+            header = read_header(file)
+            if header is not None and is_current(header, source):
+                continue
+        if COMPILED_SUFFIXES[source.suffix.lower()] == ASSET_IMAGE:
+            compiled.append((source, compile_image(source, file)))
+        else:
+            compiled.append((source, compile_sound(source, file)))
+    return compiled
+
+
+def read_header(file: Path) -> Optional[AssetHeader]:
+    try:
+        with open(file, 'rb') as fp:
+            data = fp.read(ASSET_HEADER.size)
+    except OSError:
+        return None
+    if len(data) != ASSET_HEADER.size:
+        return None
+    header = AssetHeader(*ASSET_HEADER.unpack(data))
+    return header if header.magic == ASSET_MAGIC else None
+
+
+class MappedBlob:
+    """The header and a memoryview of the payload of a blob, mapped read-only"""
+
+    def __init__(self, file: Path, kind: int, source: Path):
+        self.header: Optional[AssetHeader] = None
+        self.payload: Optional[memoryview] = None
+        self._map: Optional[mmap.mmap] = None
+        try:
+            with open(file, 'rb') as fp:
+                self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return
+        if len(self._map) < ASSET_HEADER.size:
+            return
+        header = AssetHeader(*ASSET_HEADER.unpack_from(self._map))
+        if (header.magic != ASSET_MAGIC or header.kind != kind
+                or len(self._map) != ASSET_HEADER.size + header.payload_size or not is_current(header, source)):
+            return
+        self.header = header
+        self.payload = memoryview(self._map)[ASSET_HEADER.size:]
+
+    def __enter__(self) -> "MappedBlob":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.payload is not None:
+            self.payload.release()
+        if self._map is not None:
+            self._map.close()
+
+
+def load_compiled_image(source: Path) -> Optional[pygame.Surface]:
+    file = compiled_file(source)
+    if file is None:
+        return None
+    with MappedBlob(file, ASSET_IMAGE, source) as blob:
+        if blob.header is None:
+            return None
+        mapped_surface = pygame.image.frombuffer(blob.payload, (blob.header.width, blob.header.height), IMAGE_FORMAT)
+        # a copy, the mapped surface is only valid while the file is mapped
+        surface = mapped_surface.copy()
+        del mapped_surface
+    return surface
+
+
+def load_compiled_sound(source: Path) -> Optional[pygame.mixer.Sound]:
+    file = compiled_file(source)
+    if file is None:
+        return None
+    with MappedBlob(file, ASSET_SOUND, source) as blob:
+        if blob.header is None:
+            return None
+        if pygame.mixer.get_init() != (blob.header.width, blob.header.height, blob.header.channels):
+            return None
+        # the mixer copies the samples
+        return pygame.mixer.Sound(buffer=blob.payload)
+
+
+def load_image(source: Path) -> pygame.Surface:
+    """the compiled image of `source` or the decoded source file"""
+    surface = load_compiled_image(source)
+    return surface if surface is not None else pygame.image.load(source)
+
+
+def load_sound(source: Path) -> pygame.mixer.Sound:
+    """the compiled sound of `source` or the decoded source file"""
+    sound = load_compiled_sound(source)
+    return sound if sound is not None else pygame.mixer.Sound(source)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="compiles the images and sounds into fast loading blobs")
+    parser.add_argument("--force", action="store_true", help="compiles the blobs that are current as well")
+    args = parser.parse_args()
+    pygame.mixer.init()
+    compiled = compile_assets(args.force)
+    for source, size in compiled:
+        print(f"{source.relative_to(RESOURCE_PATH)}: {size / 1024:.0f} KiB")
+    print(f"compiled {len(compiled)} assets into {COMPILED_ASSET_PATH}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,553 @@
+"""
+Benchmarks for the game systems. Run with `python benchmark.py <name>`, without name all benchmarks run.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+
+def measure_allocated_bytes(create: Callable[[], object]) -> int:
+    """returns the bytes that are still allocated by the result of `create`"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = create()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def bench_item_storage(count: int = 200_000) -> None:
+    """bytes per item for item views and for the bare columnar `ItemStore`"""
+    from models import ItemModel, ItemStore
+
+    def create_views():
+        store = ItemStore()
+        return store, [ItemModel(f"item {index}", index % 20, store) for index in range(count)]
+
+    def create_rows():
+        store = ItemStore()
+        for index in range(count):
+            store.append(f"item {index}", index % 20)
+        return store
+
+    views = measure_allocated_bytes(create_views)
+    rows = measure_allocated_bytes(create_rows)
+    print(f"items: {count}")
+    print(f"ItemModel views + store: {views / count:.1f} bytes/item")
+    print(f"ItemStore rows only:     {rows / count:.1f} bytes/item")
+
+
+def bench_mask_collision(pairs: int = 100_000) -> None:
+    """pixel precise collisions per second of the cached masks for overlapping and for distant sprite pairs"""
+    import os
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    from images import CHAR_IMAGE_PATH, IMAGE_CACHE
+
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+
+    def create_sprite(image_name: str, pos: Tuple[int, int], flipped: bool = False) -> pygame.sprite.Sprite:
+        sprite = pygame.sprite.Sprite()
+        cached_image = IMAGE_CACHE.get(CHAR_IMAGE_PATH / image_name, flipped)
+        sprite.image, sprite.mask = cached_image.surface, cached_image.mask
+        sprite.rect = sprite.image.get_rect(topleft=pos)
+        return sprite
+
+    main_char = create_sprite('main_char.png', (0, 0))
+    cases = {
+        "overlapping": create_sprite('monster.png', (60, 40), True),
+        "rects touch, pixels not": create_sprite('monster.png', (130, 0)),
+        "distant": create_sprite('monster.png', (1000, 600)),
+    }
+    for name, monster in cases.items():
+        start = time.perf_counter()
+        for _ in range(pairs):
+            collided = pygame.sprite.collide_mask(main_char, monster) is not None
+        seconds = time.perf_counter() - start
+        print(f"{name:<24} collided={collided!s:<5} {pairs / seconds:,.0f} tests/s")
+    pygame.display.quit()
+
+
+def check_combat_rules() -> None:
+    """raises AssertionError, if combatants that were dead at the start of a tick hit or get hit"""
+    from combat import CombatEngine
+    from models import MainCharModel
+
+    engine = CombatEngine(hit_chance=1.0)
+    dead = MainCharModel("dead", 5, hp=0)
+    alive = MainCharModel("alive", 5, hp=10)
+    for _ in range(3):
+        engine.queue_attack(dead, alive)
+        engine.queue_attack(alive, dead)
+    result = engine.resolve()
+    if result.hits.any() or alive.hp != 10 or dead.hp != 0:
+        raise AssertionError(f"dead combatants hit or got hit: hits {result.hits.tolist()}, hp {alive.hp}")
+    print("dead attackers and targets miss: ok")
+
+
+def bench_combat(attacks: int = 5_000, ticks: int = 200) -> None:
+    """resolve time of a tick with `attacks` attacks between two groups of 50 combatants"""
+    import statistics
+    from combat import CombatEngine
+    from models import MainCharModel
+
+    check_combat_rules()
+
+    attackers = [MainCharModel(f"attacker {index}", 2) for index in range(50)]
+    targets = [MainCharModel(f"target {index}", 3) for index in range(50)]
+    engine = CombatEngine()
+    times = []
+    for _ in range(ticks):
+        # about half of the targets die in every tick
+        for index, target in enumerate(targets):
+            target.hp = 400 + index * 8
+        for index in range(attacks):
+            engine.queue_attack(attackers[index % 50], targets[index * 7 % 50])
+        start = time.perf_counter()
+        engine.resolve()
+        times.append(time.perf_counter() - start)
+    print(f"attacks per tick: {attacks}")
+    print(f"median resolve: {statistics.median(times) * 1000:.3f} ms")
+    print(f"max resolve:    {max(times) * 1000:.3f} ms")
+
+
+def bench_frame_times(frames: int = 10000, projectiles_per_frame: int = 40, projectile_frames: int = 30) -> None:
+    """
+    p99 frame time (until the flip) of the game in a generated 300x300 world while projectiles
+    with a hit callback (a reference cycle) are spawned every frame. Once with new sprites and the automatic garbage collector, once
+    with pooled sprites, frozen startup objects and collections in idle frame time
+    """
+    import os
+    import statistics
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import pygame
+    from pygame.locals import K_a, K_d, K_s, K_w
+    import main
+    from gc_control import create_gc_controller, freeze_startup_objects
+    from pool import create_sprite_pool
+    from scheduler import FRAME_DEADLINE_MARGIN
+    from user_input import InputFrame, InputSource, KeyState, TRACKED_KEY_BITS
+
+    class WalkingInputSource(InputSource):
+        """walks in a square, a quarter second per side"""
+
+        def __init__(self):
+            self.frame = 0
+
+        def next_frame(self):
+            self.frame += 1
+            key = (K_d, K_s, K_a, K_w)[self.frame // 15 % 4]
+            return InputFrame(KeyState(TRACKED_KEY_BITS[key]), [])
+
+    def run(game_components, create_projectile, release_projectile) -> List[float]:
+        projectiles = pygame.sprite.Group()
+        spawned: List[List[pygame.sprite.Sprite]] = []
+        frame_times = []
+        for frame in range(frames):
+            frame_start = time.perf_counter()
+            main.check_user_action(game_components)
+            main.update_game(game_components, 1 / main.GAME_FPS)
+            wave = []
+            for index in range(projectiles_per_frame):
+                projectile = create_projectile()
+                projectile.rect = pygame.Rect(index * 8, frame % 900, 4, 4)
+                # the hit callback references the projectile, a cycle only the garbage collector frees
+                projectile.payload = {"damage": index, "on_hit": projectile.kill}
+                projectiles.add(projectile)
+                wave.append(projectile)
+            spawned.append(wave)
+            if len(spawned) > projectile_frames:
+                for projectile in spawned.pop(0):
+                    release_projectile(projectile)
+            main.GAME_WINDOW.fill(pygame.color.Color("grey"))
+            main.draw_sprites(game_components)
+            main.GAME_DISPLAY.flip()
+            frame_times.append(time.perf_counter() - frame_start)
+            game_components.scheduler.run(frame_start + 1 / main.GAME_FPS - FRAME_DEADLINE_MARGIN)
+            if game_components.gc_controller:
+                game_components.gc_controller.collect_overdue()
+        for wave in spawned:
+            for projectile in wave:
+                release_projectile(projectile)
+        return frame_times
+
+    def report(name: str, frame_times: List[float]) -> None:
+        frame_times = sorted(frame_times)
+        p99 = frame_times[int(len(frame_times) * 0.99)]
+        p999 = frame_times[int(len(frame_times) * 0.999)]
+        missed = sum(frame_time > 1 / main.GAME_FPS for frame_time in frame_times)
+        print(f"{name:<32} p50 {statistics.median(frame_times) * 1000:5.2f} ms  p99 {p99 * 1000:5.2f} ms  "
+              f"p99.9 {p999 * 1000:6.2f} ms  max {frame_times[-1] * 1000:6.2f} ms  over 60 FPS: {missed}")
+
+    pygame.init()
+    game_components = main.create_game_components(WalkingInputSource(), world_size=(300, 300))
+    game_components.game.game_state = main.GameState.GAME
+
+    def kill(projectile: pygame.sprite.Sprite) -> None:
+        projectile.kill()
+
+    pauses: Dict[int, List[float]] = {0: [], 1: [], 2: []}
+
+    def measure_collection(phase: str, info: dict) -> None:
+        if phase == "start":
+            measure_collection.start = time.perf_counter()
+        else:
+            pauses[info["generation"]].append(time.perf_counter() - measure_collection.start)
+
+    def run_and_report(name: str, create_projectile, release_projectile) -> None:
+        for times in pauses.values():
+            times.clear()
+        missed_frames = game_components.scheduler.missed_frames
+        report(name, run(game_components, create_projectile, release_projectile))
+        print(f"{'':<32} collections {[len(times) for times in pauses.values()]}, "
+              f"max pause {max(max(times, default=0) for times in pauses.values()) * 1000:.2f} ms, "
+              f"frames past the deadline {game_components.scheduler.missed_frames - missed_frames}")
+
+    gc.callbacks.append(measure_collection)
+    run_and_report("new sprites, automatic gc", pygame.sprite.Sprite, kill)
+
+    print(f"frozen objects: {freeze_startup_objects()}")
+    gc_controller = create_gc_controller(game_components.scheduler)
+    game_components = game_components._replace(gc_controller=gc_controller)
+    run_and_report("new sprites, idle gc, frozen", pygame.sprite.Sprite, kill)
+    sprite_pool = create_sprite_pool()
+    sprite_pool.prefill(projectiles_per_frame * (projectile_frames + 1))
+    run_and_report("pooled sprites, idle gc, frozen", sprite_pool.acquire, sprite_pool.release)
+    gc.callbacks.remove(measure_collection)
+    gc_controller.close()
+    pygame.quit()
+
+
+def bench_network(clients: int = 16, ticks: int = 3600, world_size: Tuple[int, int] = (20, 20)) -> None:
+    """
+    a local server with `clients` bot clients over udp on localhost. The bots sprint in zig zags
+    of different lengths, so they spread over the stages. Reports the snapshot sizes with
+    delta compression and as full snapshots, and the bandwidth at the server tick rate
+    """
+    import os
+    import statistics
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    from pygame.locals import K_LSHIFT, K_d, K_s
+    from game_world import create_game_world
+    from network import SERVER_TICK_RATE, create_network_client, create_network_server, encode_snapshot
+    from user_input import KeyState, TRACKED_KEY_BITS
+
+    pygame.init()
+    server = create_network_server(create_game_world(world_size), ("127.0.0.1", 0), world_size, 0)
+    bots = [create_network_client(server.address) for _ in range(clients)]
+    for bot in bots:
+        bot.send(bytes([1, 1, 0]))  # hello, protocol version 1
+    server.receive()
+    for bot in bots:
+        bot.receive()
+    tick_times = []
+    delta_sizes = []
+    full_sizes = []
+    for tick in range(ticks):
+        for index, bot in enumerate(bots):
+            key = (K_d, K_s)[tick // (60 + index * 23) % 2]
+            bot.send_input(KeyState(TRACKED_KEY_BITS[key] | TRACKED_KEY_BITS[K_LSHIFT]))
+        start = time.perf_counter()
+        server.receive()
+        server.step()
+        tick_times.append(time.perf_counter() - start)
+        for client in server.clients.values():
+            entities = client.sent_snapshots[server.tick]
+            full_sizes.append(len(encode_snapshot(server.tick, client.last_input, entities)))
+        for bot in bots:
+            bot.update()
+        delta_sizes.append(sum(bot.traffic.bytes_received for bot in bots))
+    received = sum(bot.traffic.bytes_received for bot in bots)
+    snapshots = sum(bot.snapshots for bot in bots)
+    stages = len({id(client.current_stage) for client in server.clients.values()})
+    populated = sum(stage.has_state for stage in server.game_world.stages)
+    print(f"clients: {clients}, ticks: {ticks}, players in {stages} stages, {populated} stages with npcs")
+    print(f"snapshots: {snapshots}, dropped {sum(bot.dropped_snapshots for bot in bots)}, "
+          f"avg {server.snapshot_entities / max(server.full_snapshots + server.delta_snapshots, 1):.1f} entities")
+    print(f"delta snapshot: {received / snapshots:6.1f} bytes, "
+          f"{received / snapshots * SERVER_TICK_RATE / 1024:5.2f} KiB/s per client at {SERVER_TICK_RATE} ticks/s")
+    print(f"full snapshot:  {statistics.mean(full_sizes):6.1f} bytes, "
+          f"{statistics.mean(full_sizes) * SERVER_TICK_RATE / 1024:5.2f} KiB/s per client")
+    print(f"server tick: median {statistics.median(tick_times) * 1000:.3f} ms, max {max(tick_times) * 1000:.3f} ms")
+    for bot in bots:
+        bot.close()
+    server.close()
+    pygame.quit()
+
+
+def bench_animation(sprites: int = 2000, frames: int = 600) -> None:
+    """
+    update time of `sprites` animated npcs sharing one frame cache, and the surfaces and
+    python memory allocated while they animate
+    """
+    import os
+    import random
+    import statistics
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    from animation import ANIMATION_CACHE, CYCLE_IDLE, CYCLE_SPRINT, CYCLE_WALK, create_animated_sprite
+    from images import IMAGE_CACHE
+
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    rng = random.Random(0)
+    group = pygame.sprite.Group()
+    for _ in range(sprites):
+        sprite = create_animated_sprite(rng.choice(("monster", "main_char")))
+        sprite.animator.play(rng.choice((CYCLE_IDLE, CYCLE_WALK, CYCLE_SPRINT)), rng.random() < 0.5)
+        # out of step, so the sprites do not all switch their frame in the same frame
+        sprite.animator.update(rng.random())
+        group.add(sprite)
+    ANIMATION_CACHE.warm("monster")
+    ANIMATION_CACHE.warm("main_char")
+    surfaces = len(IMAGE_CACHE.surfaces())
+
+    times = []
+    switches = 0
+    for frame in range(frames):
+        images = [sprite.image for sprite in group]
+        start = time.perf_counter()
+        group.update(1 / 60)
+        times.append(time.perf_counter() - start)
+        switches += sum(image is not sprite.image for image, sprite in zip(images, group))
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for frame in range(frames):
+        group.update(1 / 60)
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"sprites: {sprites}, frames: {frames}, frame switches per frame: {switches / frames:.0f}")
+    print(f"update: median {statistics.median(times) * 1000:.3f} ms, max {max(times) * 1000:.3f} ms")
+    print(f"cached surfaces: {surfaces} before, {len(IMAGE_CACHE.surfaces())} after, "
+          f"python memory still allocated: {allocated} bytes")
+    pygame.display.quit()
+
+
+def bench_particles(particles: int = 8192, frames: int = 300) -> None:
+    """
+    update and draw time of `particles` live particles in the window, compared with the same
+    number of 2x2 pixel sprites drawn by a sprite group
+    """
+    import os
+    import statistics
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    from particles import HIT_SPARKS, ParticleSystem
+
+    pygame.display.init()
+    window = pygame.display.set_mode((1300, 900))
+    system = ParticleSystem(particles, emit_budget=particles, seed=0)
+    # long living sparks, so all particles stay alive
+    effect = HIT_SPARKS._replace(lifetime=(1000.0, 1000.0), gravity=0.0, drag=0.0, speed=(10.0, 40.0))
+    while system.count < particles:
+        system.emit(effect, (650 + system.count % 600 - 300, 450 + system.count % 400 - 200), 512)
+    update_times = []
+    draw_times = []
+    for _ in range(frames):
+        window.fill((128, 128, 128))
+        start = time.perf_counter()
+        system.update(1 / 60)
+        update_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        system.draw(window)
+        draw_times.append(time.perf_counter() - start)
+
+    group = pygame.sprite.Group()
+    dot = pygame.Surface((2, 2))
+    dot.fill(effect.color)
+    for index in range(particles):
+        sprite = pygame.sprite.Sprite(group)
+        sprite.image = dot
+        sprite.rect = dot.get_rect(topleft=(int(system.position[index, 0]), int(system.position[index, 1])))
+    sprite_times = []
+    for _ in range(frames):
+        window.fill((128, 128, 128))
+        start = time.perf_counter()
+        for sprite in group:
+            sprite.rect.move_ip(1, 0)
+        group.draw(window)
+        sprite_times.append(time.perf_counter() - start)
+
+    budget = ParticleSystem(seed=0)
+    budget.emit(HIT_SPARKS, (0, 0), 20000)
+    print(f"particles: {system.count}")
+    print(f"update:          median {statistics.median(update_times) * 1000:.3f} ms")
+    print(f"draw (surfarray) median {statistics.median(draw_times) * 1000:.3f} ms")
+    print(f"sprites (move + draw) median {statistics.median(sprite_times) * 1000:.3f} ms")
+    print(f"a burst of 20000 in one frame: {budget.count} emitted, {budget.dropped} dropped")
+    pygame.display.quit()
+
+
+def bench_assets(repeats: int = 20) -> None:
+    """load time of every image and sound from its source file and from its compiled blob"""
+    import os
+    import statistics
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import pygame
+    from assets import ASSET_IMAGE, COMPILED_SUFFIXES, RESOURCE_PATH, compile_assets, load_compiled_image, \
+        load_compiled_sound, source_assets
+
+    pygame.mixer.init()
+    compile_assets()
+
+    def median_time(load: Callable[[object], object], source) -> float:
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            load(source)
+            times.append(time.perf_counter() - start)
+        return statistics.median(times)
+
+    total_source = total_compiled = 0.0
+    for source in source_assets():
+        if COMPILED_SUFFIXES[source.suffix.lower()] == ASSET_IMAGE:
+            source_time = median_time(pygame.image.load, source)
+            compiled_time = median_time(load_compiled_image, source)
+        else:
+            source_time = median_time(pygame.mixer.Sound, source)
+            compiled_time = median_time(load_compiled_sound, source)
+        total_source += source_time
+        total_compiled += compiled_time
+        print(f"{str(source.relative_to(RESOURCE_PATH)):<30} source {source_time * 1000:7.2f} ms, "
+              f"compiled {compiled_time * 1000:6.2f} ms")
+    print(f"all assets: source {total_source * 1000:.1f} ms, compiled {total_compiled * 1000:.1f} ms "
+          f"({total_source / total_compiled:.0f}x)")
+    pygame.mixer.quit()
+
+
+def bench_layers(actors: int = 2000, decor: int = 2000, frames: int = 600) -> None:
+    """
+    update time of a stage with `actors` animated npcs and `decor` static sprites spread over a
+    large stage, as one group that updates every sprite and as stage layers, where the decor never
+    updates and the actors outside the viewport update at the distant period
+    """
+    import os
+    import random
+    import statistics
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    from animation import CYCLE_IDLE, CYCLE_WALK, create_animated_sprite
+    from layers import LAYER_ACTORS, LAYER_BACKGROUND, create_stage_layers
+
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    rng = random.Random(0)
+    stage_size = (12000, 12000)
+    viewport = pygame.Rect(0, 0, 1300, 900)
+
+    def create_stage(actor_count: int) -> Tuple[pygame.sprite.Group, object]:
+        group = pygame.sprite.Group()
+        layers = create_stage_layers()
+        for index in range(actor_count + decor):
+            sprite = create_animated_sprite()
+            sprite.animator.play(rng.choice((CYCLE_IDLE, CYCLE_WALK)), rng.random() < 0.5)
+            sprite.rect.topleft = (rng.randrange(stage_size[0]), rng.randrange(stage_size[1]))
+            group.add(sprite)
+            layers.add(sprite, LAYER_ACTORS if index < actor_count else LAYER_BACKGROUND)
+        return group, layers
+
+    def frame_times(update: Callable[[], object]) -> List[float]:
+        times = []
+        for _ in range(frames):
+            start = time.perf_counter()
+            update()
+            times.append(time.perf_counter() - start)
+        return times
+
+    for actor_count in (actors, actors * 4):
+        group, layers = create_stage(actor_count)
+        group_times = frame_times(lambda: group.update(1 / 60))
+        # the first frame updates every sprite once, the sprites do not know the viewport before
+        start = time.perf_counter()
+        first_updates = layers.update(1 / 60, viewport)
+        first_time = time.perf_counter() - start
+        updates = []
+        layer_times = frame_times(lambda: updates.append(layers.update(1 / 60, viewport)))
+        print(f"{actor_count} actors, {decor} decor, {layers.awake_count()} awake:")
+        print(f"  first frame {first_time * 1000:.3f} ms, {first_updates} sprite updates")
+        print(f"  group  median {statistics.median(group_times) * 1000:.3f} ms, max {max(group_times) * 1000:.3f} ms")
+        print(f"  layers median {statistics.median(layer_times) * 1000:.3f} ms, max {max(layer_times) * 1000:.3f} ms, "
+              f"{statistics.mean(updates):.0f} sprite updates per frame (max {max(updates)})")
+    pygame.display.quit()
+
+
+def bench_routing(world_size: Tuple[int, int] = (500, 500), queries: int = 200, landmark_counts=(0, 8)) -> None:
+    """
+    route queries between random stages of a generated world. Reports the graph build, the cold
+    queries (A* with an empty cache) and the cached queries, with and without landmarks
+    """
+    import os
+    import random
+    import statistics
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import pygame
+    from game_world import create_game_world
+    from routing import create_stage_router
+
+    pygame.init()
+    game_world = create_game_world(world_size)
+    rng = random.Random(0)
+    pairs = [(rng.choice(game_world.stages), rng.choice(game_world.stages)) for _ in range(queries)]
+    print(f"stages: {len(game_world.stages)}, queries: {queries}")
+    for landmark_count in landmark_counts:
+        router = create_stage_router(game_world, landmark_count)
+        start = time.perf_counter()
+        router.refresh()
+        build_time = time.perf_counter() - start
+        cold_times = []
+        for start_stage, goal_stage in pairs:
+            router.route_cache.clear()
+            start = time.perf_counter()
+            router.route(start_stage, goal_stage)
+            cold_times.append(time.perf_counter() - start)
+        for start_stage, goal_stage in pairs:
+            router.route(start_stage, goal_stage)
+        cached_times = []
+        for start_stage, goal_stage in pairs:
+            start = time.perf_counter()
+            router.route(start_stage, goal_stage)
+            cached_times.append(time.perf_counter() - start)
+        print(f"landmarks {landmark_count}: build {build_time:.2f} s, "
+              f"cold median {statistics.median(cold_times) * 1000:.2f} ms (max {max(cold_times) * 1000:.2f} ms), "
+              f"cached median {statistics.median(cached_times) * 1e6:.1f} us")
+    pygame.quit()
+
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {
+    "items": bench_item_storage,
+    "mask": bench_mask_collision,
+    "combat": bench_combat,
+    "frames": bench_frame_times,
+    "netplay": bench_network,
+    "animation": bench_animation,
+    "particles": bench_particles,
+    "assets": bench_assets,
+    "layers": bench_layers,
+    "routing": bench_routing,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="GenericRpgV2 benchmarks")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run: {', '.join(BENCHMARKS)}")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    for name in args.names or BENCHMARKS:
+        print(f"== {name}")
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+from typing import Sequence
+
+import pygame
+
+from images import IMAGE_CACHE
+
+
+class Camera:
+    """
+    Viewport into a stage that can be larger than the window.
+    Positions of sprites and tiles are stage coordinates, the camera moves them onto the screen.
+
+    With a `scale` below 1 the viewport gets drawn into a smaller surface, see render_scale.py.
+
+    ## Arguments
+    - `viewport_size`, width and height of the visible area (the window)
+    """
+
+    def __init__(self, viewport_size: Sequence[int]):
+        self.viewport = pygame.Rect(0, 0, viewport_size[0], viewport_size[1])
+        self.scale = 1.0
+
+    @property
+    def offset(self) -> tuple:
+        """screen position of the stage origin"""
+        return round(-self.viewport.x * self.scale), round(-self.viewport.y * self.scale)
+
+    def follow(self, target: pygame.Rect, stage_size: Sequence[int]) -> None:
+        """centers the viewport on `target` without leaving the stage"""
+        self.viewport.x = min(max(target.centerx - self.viewport.width // 2, 0),
+                              max(stage_size[0] - self.viewport.width, 0))
+        self.viewport.y = min(max(target.centery - self.viewport.height // 2, 0),
+                              max(stage_size[1] - self.viewport.height, 0))
+
+    def draw_group(self, group: pygame.sprite.AbstractGroup, surface: pygame.Surface) -> int:
+        """draws the sprites of `group` that are inside the viewport. returns the number of drawn sprites"""
+        viewport = self.viewport
+        scale = self.scale
+        if scale == 1.0:
+            visible = [
+                (sprite.image, sprite.rect.move(-viewport.x, -viewport.y))
+                for sprite in group.sprites()
+                if viewport.colliderect(sprite.rect)
+            ]
+        else:
+            visible = [
+                (IMAGE_CACHE.get_scaled(sprite.image, scale),
+                 (round((sprite.rect.x - viewport.x) * scale), round((sprite.rect.y - viewport.y) * scale)))
+                for sprite in group.sprites()
+                if viewport.colliderect(sprite.rect)
+            ]
+        surface.blits(visible, False)
+        return len(visible)
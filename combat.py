@@ -0,0 +1,175 @@
+"""
+Batched combat resolution.
+
+Attacks are queued during a tick and resolved together in `CombatEngine.resolve` over NumPy arrays.
+All attacks of a tick happen at the same time: a combatant that dies in a tick still lands the
+attacks it queued in that tick. Attacks of and on combatants that were dead at the start of the tick miss.
+
+The random rolls of a tick only depend on the seed and the tick number, so replaying the same
+attacks gives the same results.
+"""
+from __future__ import annotations
+
+from array import array
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+
+from models import MainCharModel
+from seeds import normalize_seed
+
+HIT_CHANCE = 0.9
+CRIT_CHANCE = 0.1
+CRIT_MULTIPLIER = 2.0
+DAMAGE_SPREAD = 0.2  # damage varies by +- this fraction
+
+
+def damage_dealt(targets: np.ndarray, damage: np.ndarray) -> np.ndarray:
+    """the damage every target got from the attacks before and including each attack, in queue order"""
+    if not len(targets):
+        return damage.copy()
+    order = np.argsort(targets, kind='stable')
+    sorted_targets = targets[order]
+    sorted_damage = damage[order]
+    sorted_total = np.cumsum(sorted_damage)
+    group_starts = np.flatnonzero(np.r_[True, sorted_targets[1:] != sorted_targets[:-1]])
+    group_offsets = np.repeat(sorted_total[group_starts] - sorted_damage[group_starts],
+                              np.diff(np.r_[group_starts, len(order)]))
+    dealt = np.empty_like(damage)
+    dealt[order] = sorted_total - group_offsets
+    return dealt
+
+
+class AttackEvent(NamedTuple):
+    attacker: MainCharModel
+    target: MainCharModel
+    damage: int
+    hit: bool
+    crit: bool
+    kill: bool
+
+
+class CombatResult:
+    """The outcome of one tick. Per attack arrays in queue order, the events are created on demand"""
+
+    def __init__(self, tick: int, combatants: List[MainCharModel], attackers: np.ndarray, targets: np.ndarray,
+                 damage: np.ndarray, hits: np.ndarray, crits: np.ndarray, kills: np.ndarray):
+        self.tick = tick
+        self.combatants = combatants
+        self.attackers = attackers
+        self.targets = targets
+        self.damage = damage
+        self.hits = hits
+        self.crits = crits
+        self.kills = kills
+
+    def __len__(self) -> int:
+        return len(self.attackers)
+
+    @property
+    def deaths(self) -> List[MainCharModel]:
+        """combatants that died in this tick, in the order of their killing attacks"""
+        return [self.combatants[target] for target in self.targets[self.kills]]
+
+    def events(self) -> Iterator[AttackEvent]:
+        for attacker, target, damage, hit, crit, kill in zip(
+                self.attackers.tolist(), self.targets.tolist(), self.damage.tolist(),
+                self.hits.tolist(), self.crits.tolist(), self.kills.tolist()
+        ):
+            yield AttackEvent(self.combatants[attacker], self.combatants[target], damage, hit, crit, kill)
+
+
+class CombatEngine:
+    """
+    Queues the attacks between `MainCharModel`s and resolves them once per tick.
+    The damage of an attacker is its base `damage` plus the damage of its `current_item`.
+
+    ## Arguments
+    - `seed`, seed of the random rolls
+    """
+
+    def __init__(self, seed: int = 0, hit_chance: float = HIT_CHANCE, crit_chance: float = CRIT_CHANCE,
+                 crit_multiplier: float = CRIT_MULTIPLIER, damage_spread: float = DAMAGE_SPREAD):
+        # numpy seeds are never negative
+        self.seed = normalize_seed(seed)
+        self.hit_chance = hit_chance
+        self.crit_chance = crit_chance
+        self.crit_multiplier = crit_multiplier
+        self.damage_spread = damage_spread
+        self.tick = 0
+        self.last_result: Optional[CombatResult] = None
+
+        self.combatants: List[MainCharModel] = []
+        self._combatant_indices: Dict[int, int] = {}
+        # queued attacks as indices into `combatants`
+        self._attackers = array('q')
+        self._targets = array('q')
+
+    @property
+    def pending_attacks(self) -> int:
+        return len(self._attackers)
+
+    def combatant_index(self, model: MainCharModel) -> int:
+        """returns the index of `model`, registers it on first use"""
+        index = self._combatant_indices.get(id(model))
+        if index is None:
+            index = self._combatant_indices[id(model)] = len(self.combatants)
+            self.combatants.append(model)
+        return index
+
+    def queue_attack(self, attacker: MainCharModel, target: MainCharModel) -> None:
+        self._attackers.append(self.combatant_index(attacker))
+        self._targets.append(self.combatant_index(target))
+
+    def resolve(self) -> CombatResult:
+        """
+        resolves all queued attacks, writes the new hp to the models and returns the result.
+        an attack only hits, if attacker and target were alive at the start of the tick
+        """
+        tick, self.tick = self.tick, self.tick + 1
+        attackers = np.array(self._attackers, dtype=np.int64)
+        targets = np.array(self._targets, dtype=np.int64)
+        self._attackers = array('q')
+        self._targets = array('q')
+
+        combatant_count = len(self.combatants)
+        hp = np.fromiter((model.hp for model in self.combatants), np.int64, combatant_count)
+        attack_damage = np.fromiter(
+            (model.damage + model.current_item.damage for model in self.combatants), np.float64, combatant_count
+        )
+
+        rng = np.random.default_rng((self.seed, tick))
+        rolls = rng.random((3, len(attackers)), dtype=np.float32)
+        hits = (rolls[0] < self.hit_chance) & (hp[attackers] > 0) & (hp[targets] > 0)
+        crits = hits & (rolls[1] < self.crit_chance)
+        spread = 1 + self.damage_spread * (2 * rolls[2] - 1)
+        damage = attack_damage[attackers] * spread
+        damage[crits] *= self.crit_multiplier
+        damage = np.where(hits, np.maximum(np.rint(damage), 1), 0).astype(np.int64)
+
+        new_hp = hp - np.bincount(targets, weights=damage, minlength=combatant_count).astype(np.int64)
+        kills = np.zeros(len(attackers), dtype=bool)
+        dying = (hp > 0) & (new_hp <= 0)
+        if dying.any():
+            # only the attacks on dying targets are ordered, to find the killing attacks
+            attacks = np.flatnonzero(hits & dying[targets])
+            dealt = damage_dealt(targets[attacks], damage[attacks])
+            target_hp = hp[targets[attacks]]
+            kills[attacks] = (dealt >= target_hp) & (dealt - damage[attacks] < target_hp)
+        new_hp = np.maximum(new_hp, 0)
+        for index in np.flatnonzero(new_hp != hp).tolist():
+            self.combatants[index].hp = int(new_hp[index])
+
+        self.last_result = CombatResult(tick, self.combatants, attackers, targets, damage, hits, crits, kills)
+        return self.last_result
+
+    def clear(self) -> None:
+        """forgets all combatants and queued attacks"""
+        self.combatants = []
+        self._combatant_indices.clear()
+        self._attackers = array('q')
+        self._targets = array('q')
+
+
+def create_combat_engine(seed: int = 0) -> CombatEngine:
+    return CombatEngine(seed)
@@ -0,0 +1,143 @@
+"""
+Explored stages as a bitset.
+
+One bit per cell of the bounding box of the stage coordinates, so the exploration of a world
+of a million stages takes 125 KB and no python object per stage. A bit is set when the
+current stage changes, looking up and setting a bit is O(1).
+The bitset is stored in `EXPLORATION_PATH` per world and two explorations of the same world
+are merged with a bitwise or.
+"""
+from __future__ import annotations
+
+import os
+import struct
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Sequence, Tuple
+
+from seeds import normalize_seed
+
+if TYPE_CHECKING:
+    from game_world import GameStage, GameWorld
+
+EXPLORATION_PATH = Path.cwd() / 'data' / 'saves'
+EXPLORATION_MAGIC = b"GRPGEXP1"
+EXPLORATION_HEADER = struct.Struct("<8siiII")  # magic, origin x, origin y, width, height
+
+
+class ExplorationMap:
+    """
+    Explored flags of the cells from `origin` to `origin + size` in stage coordinates.
+
+    ## Arguments
+    - `origin`, coordinates of the top left cell
+    - `size`, width and height in cells
+    - `bits`, a stored bitset, row major and least significant bit first
+    """
+
+    def __init__(self, origin: Tuple[int, int], size: Tuple[int, int], bits: Optional[bytes] = None):
+        self.origin = origin
+        self.size = size
+        byte_count = (size[0] * size[1] + 7) // 8
+        if bits is not None and len(bits) != byte_count:
+            raise ValueError(f"exploration of {len(bits)} bytes does not fit a {size[0]}x{size[1]} world")
+        self.bits = bytearray(bits) if bits is not None else bytearray(byte_count)
+        # where `save` writes to without a file, set by `create_exploration_map`
+        self.file: Optional[Path] = None
+
+    def bit_index(self, x: int, y: int) -> int:
+        """index of the bit of the cell, -1 outside of the map"""
+        x -= self.origin[0]
+        y -= self.origin[1]
+        if 0 <= x < self.size[0] and 0 <= y < self.size[1]:
+            return y * self.size[0] + x
+        return -1
+
+    def is_explored(self, x: int, y: int) -> bool:
+        index = self.bit_index(x, y)
+        return index >= 0 and bool(self.bits[index >> 3] >> (index & 7) & 1)
+
+    def explore(self, x: int, y: int) -> None:
+        index = self.bit_index(x, y)
+        if index >= 0:
+            self.bits[index >> 3] |= 1 << (index & 7)
+
+    def is_fog(self, x: int, y: int) -> bool:
+        """true for unexplored cells next to an explored cell, the border of the explored area"""
+        if self.is_explored(x, y):
+            return False
+        return (self.is_explored(x - 1, y) or self.is_explored(x + 1, y)
+                or self.is_explored(x, y - 1) or self.is_explored(x, y + 1))
+
+    def explored_count(self) -> int:
+        return bin(int.from_bytes(self.bits, 'little')).count("1")
+
+    def merge(self, other: ExplorationMap) -> None:
+        """adds the explored cells of `other`, e.g. of another save of the same world"""
+        if other.origin != self.origin or other.size != self.size:
+            raise ValueError("only explorations of the same world can be merged")
+        merged = int.from_bytes(self.bits, 'little') | int.from_bytes(other.bits, 'little')
+        self.bits[:] = merged.to_bytes(len(self.bits), 'little')
+
+    def on_stage_change(self, previous_stage: GameStage, new_stage: GameStage) -> None:
+        self.explore(*new_stage.coordinates)
+
+    def to_bytes(self) -> bytes:
+        return EXPLORATION_HEADER.pack(EXPLORATION_MAGIC, *self.origin, *self.size) + bytes(self.bits)
+
+    def save(self, file: Optional[Path] = None) -> None:
+        file = file or self.file
+        if file is None:
+            return
+        file.parent.mkdir(parents=True, exist_ok=True)
+        # written to a temporary file first, so quitting while saving never loses the exploration
+        temporary_file = file.with_suffix(".tmp")
+        with open(temporary_file, 'wb') as fp:
+            fp.write(self.to_bytes())
+        os.replace(temporary_file, file)
+
+
+def load_exploration(file: Path, origin: Tuple[int, int], size: Tuple[int, int]) -> Optional[ExplorationMap]:
+    """returns the stored exploration or None, if the file is missing or belongs to another world"""
+    try:
+        with open(file, 'rb') as fp:
+            data = fp.read()
+    except OSError:
+        return None
+    if len(data) != EXPLORATION_HEADER.size + (size[0] * size[1] + 7) // 8:
+        return None
+    if EXPLORATION_HEADER.unpack_from(data) != (EXPLORATION_MAGIC, *origin, *size):
+        return None
+    return ExplorationMap(origin, size, data[EXPLORATION_HEADER.size:])
+
+
+def stage_bounds(stages: Sequence[GameStage]) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    """origin and size of the bounding box of the stage coordinates"""
+    xs = [stage.coordinates[0] for stage in stages]
+    ys = [stage.coordinates[1] for stage in stages]
+    return (min(xs), min(ys)), (max(xs) - min(xs) + 1, max(ys) - min(ys) + 1)
+
+
+def exploration_file(game_world: GameWorld, seed: int, path: Path = EXPLORATION_PATH) -> Path:
+    """the save of the world of `seed`, named with the same normalized seed as the world file"""
+    if game_world.grid_size is None:
+        return Path(path) / "exploration_default.bin"
+    return Path(path) / f"exploration_{normalize_seed(seed)}_{game_world.grid_size[0]}x{game_world.grid_size[1]}.bin"
+
+
+def create_exploration_map(game_world: GameWorld, file: Optional[Path] = None) -> ExplorationMap:
+    """
+    loads the exploration of the world from `file` or starts a new one, marks the current stage
+    explored and follows the stage changes of `game_world`
+    """
+    if game_world.grid_size is not None:
+        # generated worlds start at 0, 0, the bounds are known without looking at a million stages
+        origin, size = (0, 0), game_world.grid_size
+    else:
+        origin, size = stage_bounds(game_world.stages)
+    exploration = load_exploration(file, origin, size) if file else None
+    if exploration is None:
+        exploration = ExplorationMap(origin, size)
+    exploration.file = file
+    exploration.explore(*game_world.current_stage.coordinates)
+    game_world.stage_change_listeners.append(exploration.on_stage_change)
+    return exploration
@@ -1,14 +1,27 @@
 from __future__ import annotations
 
+import weakref
+from array import array
 from enum import Enum
-from pathlib import Path
-from typing import List, Optional, Tuple
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Generator, List, Optional, Sequence, Tuple
 
 import pygame
 from pygame.locals import *
 
+from animation import ANIMATION_CACHE, CYCLE_IDLE, CYCLE_SPRINT, CYCLE_WALK, Animator
+from camera import Camera
+from exploration import ExplorationMap
+from layers import LAYER_ACTORS, StageLayers, create_stage_layers
 from menu import SCREEN_SIZE, GAME_WINDOW
 from models import DataModel
+from seeds import normalize_seed
+from simulation import create_stage_state
+from tilemap import TileMap, load_tilemap
+from user_input import KeyState
+
+if TYPE_CHECKING:
+    from routing import StageRouter
 
 GAME_FPS = 60
 WALKING_TARGET_FPS = 45
@@ -16,21 +29,68 @@ GAME_WALKING_FPS_RATIO = GAME_FPS / WALKING_TARGET_FPS
 
 
 class GameStage:
+    __slots__ = (
+        "sprite_group", "name", "tilemap", "size", "coordinates", "_state",
+        "_top_stage", "_bottom_stage", "_right_stage", "_left_stage", "font_surface", "_font_text", "_layers",
+        # `titled_stages` holds stages weakly
+        "__weakref__",
+    )
+    # incremented on every change of a neighbor link, used to invalidate cached routes
+    topology_version = 0
+
     def __init__(
             self,
             sprite_group: MainCharGroup = None,
-            name: str = "Stage"
+            name: str = "Stage",
+            tilemap: Optional[TileMap] = None,
+            size: Optional[Sequence[int]] = None
     ):
         self.sprite_group = sprite_group
         self.name = name
+        self.tilemap = tilemap
+        if size is None:
+            size = tilemap.pixel_size if tilemap else SCREEN_SIZE
+        # a stage is never smaller than the window
+        if not isinstance(size, tuple) or size[0] < SCREEN_SIZE[0] or size[1] < SCREEN_SIZE[1]:
+            size = (max(size[0], SCREEN_SIZE[0]), max(size[1], SCREEN_SIZE[1]))
+        self.size = size
         self.coordinates = [0, 0]
+        self._state: Optional[array] = None
 
         self._top_stage: Optional[GameStage] = None
         self._bottom_stage: Optional[GameStage] = None
         self._right_stage: Optional[GameStage] = None
         self._left_stage: Optional[GameStage] = None
 
-        self.font_surface = self.set_font()
+        self.font_surface: Optional[pygame.Surface] = None
+        self._font_text = ""
+        self._layers: Optional[StageLayers] = None
+
+    @property
+    def layers(self) -> StageLayers:
+        """the sprite layers of the stage, created on first use. most stages of a generated world never need them"""
+        if self._layers is None:
+            self._layers = create_stage_layers()
+        return self._layers
+
+    @property
+    def state(self) -> array:
+        """simulation state (timers, npcs), see simulation.py. created on first use"""
+        if self._state is None:
+            self._state = create_stage_state()
+        return self._state
+
+    @state.setter
+    def state(self, state: array):
+        self._state = state
+
+    @property
+    def has_state(self) -> bool:
+        return self._state is not None
+
+    def clamp(self, rect: pygame.Rect) -> pygame.Rect:
+        """returns `rect` moved inside the stage. neighbor stages can differ in size"""
+        return rect.clamp(pygame.Rect((0, 0), self.size))
 
     @property
     def top_stage(self) -> Optional[GameStage]:
@@ -39,9 +99,10 @@ class GameStage:
     @top_stage.setter
     def top_stage(self, stage: GameStage):
         self._top_stage = stage
+        GameStage.topology_version += 1
         if not stage.bottom_stage:
             stage.bottom_stage = self
-            stage.coordinates[1] = self._top_stage.coordinates[1] - 1
+            stage.coordinates[:] = [self.coordinates[0], self.coordinates[1] - 1]
 
     @property
     def bottom_stage(self) -> Optional[GameStage]:
@@ -50,9 +111,10 @@ class GameStage:
     @bottom_stage.setter
     def bottom_stage(self, stage: GameStage):
         self._bottom_stage = stage
+        GameStage.topology_version += 1
         if not stage.top_stage:
             stage.top_stage = self
-            stage.coordinates[1] = self._bottom_stage.coordinates[1] + 1
+            stage.coordinates[:] = [self.coordinates[0], self.coordinates[1] + 1]
 
     @property
     def right_stage(self) -> Optional[GameStage]:
@@ -61,9 +123,10 @@ class GameStage:
     @right_stage.setter
     def right_stage(self, stage: GameStage):
         self._right_stage = stage
+        GameStage.topology_version += 1
         if not stage.left_stage:
             stage.left_stage = self
-            stage.coordinates[0] = self._right_stage.coordinates[0] + 1
+            stage.coordinates[:] = [self.coordinates[0] + 1, self.coordinates[1]]
 
     @property
     def left_stage(self) -> Optional[GameStage]:
@@ -72,19 +135,49 @@ class GameStage:
     @left_stage.setter
     def left_stage(self, stage: GameStage):
         self._left_stage = stage
+        GameStage.topology_version += 1
         if not stage.right_stage:
             stage.right_stage = self
-            stage.coordinates[0] = self._left_stage.coordinates[0] - 1
+            stage.coordinates[:] = [self.coordinates[0] - 1, self.coordinates[1]]
+
+    def get_page_name(self) -> str:
+        return self.name + " Koordinaten: " + str(self.coordinates[0]) + ", " + str(self.coordinates[1])
 
     def set_font(self) -> pygame.Surface:
         """Sets font and returns a text surface"""
-        font = pygame.font.SysFont("Arial", 40)
-        text = self.name + " Koordinaten: " + str(self.coordinates[0]) + ", " + str(self.coordinates[1])
-        return font.render(text, True, pygame.color.Color("blue"))
+        return get_font("Arial", 40).render(self.get_page_name(), True, pygame.color.Color("blue"))
+
+    def get_font_surface(self) -> pygame.Surface:
+        """returns the cached text surface, renders it only if the page name has changed"""
+        if self.font_surface is None or self._font_text != self.get_page_name():
+            if self.font_surface is None:
+                _titled_stages.add(self)
+            self.font_surface = self.set_font()
+            self._font_text = self.get_page_name()
+        return self.font_surface
+
+    def warm_up(self, viewport: pygame.Rect, scale: float = 1.0) -> Generator[None, None, None]:
+        """
+        Prepares everything the first frame in the stage needs. `viewport` is the expected camera
+        viewport after entering, `scale` the render scale. Runs one step per cached asset, see `FrameScheduler`
+        """
+        self.get_font_surface()
+        yield
+        if self.tilemap:
+            yield from self.tilemap.warm_chunks(viewport, scale)
+
+    def draw_background(self, camera: Camera, surface: pygame.Surface = GAME_WINDOW) -> None:
+        """Draws the visible chunks of the tilemap of the stage"""
+        if self.tilemap:
+            self.tilemap.draw(surface, camera.offset, camera.scale)
+
+    def draw_sprites(self, camera: Camera, surface: pygame.Surface = GAME_WINDOW) -> None:
+        """Draws the sprites of the stage layers that are inside the camera viewport"""
+        self.layers.draw(camera, surface)
 
     def draw_page_name(self) -> None:
         """Draws the page name on top of the window"""
-        self.font_surface = self.set_font()
+        self.get_font_surface()
 
         GAME_WINDOW.blit(
             self.font_surface,
@@ -95,10 +188,47 @@ class GameStage:
         )
 
 
+# the stages with a rendered page name, a few of all stages of a generated world.
+# weak, so the stages of a world that is not used anymore are freed with it
+_titled_stages: weakref.WeakSet[GameStage] = weakref.WeakSet()
+
+
+def titled_stages() -> List[GameStage]:
+    return list(_titled_stages)
+
+
 class GameWorld:
-    def __init__(self, stages: Tuple[GameStage, ...]):
+    def __init__(self, stages: Tuple[GameStage, ...], grid_size: Optional[Tuple[int, int]] = None):
         self.stages = stages
-        self.current_stage = self.stages[0]
+        # width and height of a generated world, its stages are stored in row major order
+        self.grid_size = grid_size
+        self._current_stage = self.stages[0]
+        self.camera = Camera(SCREEN_SIZE)
+        # called with (previous_stage, new_stage) whenever the current stage changes
+        self.stage_change_listeners: List[Callable[[GameStage, GameStage], None]] = [self.move_main_char]
+        self.move_main_char(None, self._current_stage)
+
+    @property
+    def current_stage(self) -> GameStage:
+        return self._current_stage
+
+    @current_stage.setter
+    def current_stage(self, stage: GameStage):
+        previous_stage = self._current_stage
+        self._current_stage = stage
+        if stage is not previous_stage:
+            for listener in self.stage_change_listeners:
+                listener(previous_stage, stage)
+
+    @staticmethod
+    def move_main_char(previous_stage: Optional[GameStage], stage: GameStage) -> None:
+        """the main char is an actor of the current stage only"""
+        main_char = stage.sprite_group.sprite if stage.sprite_group else None
+        if main_char is None:
+            return
+        if previous_stage is not None:
+            previous_stage.layers[LAYER_ACTORS].remove(main_char)
+        stage.layers.add(main_char, LAYER_ACTORS)
 
 
 class Map:
@@ -106,28 +236,109 @@ class Map:
     CELL_HEIGHT = 40
     CELL_BORDER_COLOR = pygame.color.Color("black")
     CELL_BORDER_COLOR_HIGHLIGHT = pygame.color.Color("red")
+    CELL_FOG_COLOR = pygame.color.Color("gray35")
+    CELL_ROUTE_COLOR = pygame.color.Color("gold")
+    CELL_ROUTE_BORDER = 3
     START_POSITION = [SCREEN_SIZE[0] / 2 - CELL_WIDTH / 2, SCREEN_SIZE[1] / 2 - CELL_HEIGHT / 2]
 
-    def __init__(self, game_world: GameWorld):
+    def __init__(self, game_world: GameWorld, exploration: Optional[ExplorationMap] = None,
+                 router: Optional[StageRouter] = None):
         self.game_world = game_world
+        # without exploration every stage is drawn
+        self.exploration = exploration
+        # without router there is no "route to" display
+        self.router = router
+        self.route_target: Optional[GameStage] = None
+        # reused for every cell, `pygame.draw.rect` does not keep it
+        self._cell_rect = pygame.Rect(0, 0, self.CELL_WIDTH, self.CELL_HEIGHT)
+
+    def origin(self) -> Tuple[int, int]:
+        """the coordinates of the stage in the center cell"""
+        if self.game_world.grid_size is not None:
+            return self.game_world.current_stage.coordinates
+        return 0, 0
+
+    def cell_rect(self, stage: GameStage, origin: Tuple[int, int]) -> pygame.Rect:
+        """the window rect of the cell of `stage`, the same rect object for every call"""
+        cell_rect = self._cell_rect
+        cell_rect.x = self.START_POSITION[0] + (stage.coordinates[0] - origin[0]) * self.CELL_WIDTH
+        cell_rect.y = self.START_POSITION[1] + (stage.coordinates[1] - origin[1]) * self.CELL_HEIGHT
+        return cell_rect
+
+    def stage_at(self, pos: Tuple[int, int]) -> Optional[GameStage]:
+        """the stage of the drawn cell at the window position `pos`"""
+        origin = self.origin()
+        exploration = self.exploration
+        for stage in self.visible_stages():
+            x, y = stage.coordinates
+            if exploration is not None and not exploration.is_explored(x, y) and not exploration.is_fog(x, y):
+                continue
+            if self.cell_rect(stage, origin).collidepoint(pos):
+                return stage
+        return None
+
+    def select_route_target(self, pos: Tuple[int, int]) -> None:
+        """shows the route to the cell at `pos`. a click on the target, the current stage or outside hides it"""
+        stage = self.stage_at(pos)
+        if stage is self.route_target or stage is self.game_world.current_stage:
+            stage = None
+        self.route_target = stage
+
+    def route(self) -> Tuple[GameStage, ...]:
+        """
+        the stages from the current stage to the route target. empty until the router has built the graph
+        of the current topology in the scheduler, so opening the map never waits for the rebuild
+        """
+        if self.route_target is self.game_world.current_stage:
+            self.route_target = None
+        if self.router is None or self.route_target is None or not self.router.is_current():
+            return ()
+        return self.router.route(self.game_world.current_stage, self.route_target) or ()
+
+    def visible_stages(self) -> Sequence[GameStage]:
+        """
+        the stages to draw. a generated world is centered on the current stage
+        and only the stages in the window are looked up
+        """
+        grid_size = self.game_world.grid_size
+        if grid_size is None:
+            return self.game_world.stages
+        center_x, center_y = self.game_world.current_stage.coordinates
+        columns = SCREEN_SIZE[0] // self.CELL_WIDTH // 2 + 1
+        rows = SCREEN_SIZE[1] // self.CELL_HEIGHT // 2 + 1
+        return [
+            self.game_world.stages[y * grid_size[0] + x]
+            for y in range(max(0, center_y - rows), min(grid_size[1], center_y + rows + 1))
+            for x in range(max(0, center_x - columns), min(grid_size[0], center_x + columns + 1))
+        ]
 
     def draw_map(self):
-        """draws the map from the game world stages"""
-        for stage in self.game_world.stages:
+        """
+        draws the map from the game world stages. with exploration only the explored stages are drawn,
+        the unexplored stages next to them are drawn as fog. the drawn stages of the route are marked
+        """
+        origin = self.origin()
+        exploration = self.exploration
+        route_stages = {id(stage) for stage in self.route()}
+        for stage in self.visible_stages():
+            x, y = stage.coordinates
+            border_width = 1
             color = self.CELL_BORDER_COLOR
+            if exploration is not None and not exploration.is_explored(x, y):
+                if not exploration.is_fog(x, y):
+                    continue
+                border_width = 0
+                color = self.CELL_FOG_COLOR
             if self.game_world.current_stage == stage:
                 color = self.CELL_BORDER_COLOR_HIGHLIGHT
-            cell_rect = pygame.Rect(
-                self.START_POSITION[0] + stage.coordinates[0] * self.CELL_WIDTH,
-                self.START_POSITION[1] + stage.coordinates[1] * self.CELL_HEIGHT,
-                self.CELL_WIDTH,
-                self.CELL_HEIGHT
-            )
+            elif id(stage) in route_stages:
+                border_width = self.CELL_ROUTE_BORDER
+                color = self.CELL_ROUTE_COLOR
             pygame.draw.rect(
                 GAME_WINDOW,
                 color,
-                cell_rect,
-                1
+                self.cell_rect(stage, origin),
+                border_width
             )
 
 
@@ -153,10 +364,10 @@ class MainChar(pygame.sprite.Sprite):
     WALK_SPEED = 4
     SPRINT_SPEED = 6
     MAPPED_WALKING = {
-        KSCAN_W: "top",
-        KSCAN_D: "right",
-        KSCAN_A: "left",
-        KSCAN_S: "down",
+        K_a: "left",
+        K_d: "right",
+        K_s: "down",
+        K_w: "top",
     }
 
     # STATS
@@ -164,26 +375,31 @@ class MainChar(pygame.sprite.Sprite):
     MAX_HP = BASE_HP
 
     # IMAGE
-    IMAGENAME = 'main_char.png'
+    ANIMATION_SHEET = 'main_char'
 
     _counter = 0
 
-    def __init__(self, pos: List[int], *groups: pygame.sprite.AbstractGroup):
+    def __init__(self, pos: List[int], *groups: pygame.sprite.AbstractGroup, data: Optional[DataModel] = None):
         super().__init__(*groups)
 
         MainChar._counter += 1
         self.id = MainChar._counter
 
-        self.image = pygame.image.load(Path.cwd() / 'resources' / 'img' / 'chars' / self.IMAGENAME)
+        ANIMATION_CACHE.warm(self.ANIMATION_SHEET)
+        self.animator = Animator(self, self.ANIMATION_SHEET)
 
         self.rect = self.image.get_rect()
         self.rect.x = pos[0]
         self.rect.y = pos[1]
+        self._last_position = (self.rect.x, self.rect.y)
+        # set from the snapshots in client mode, they do not arrive every frame. None follows the rect
+        self.moving: Optional[bool] = None
 
         self._walk_direction = WalkDirection.NONE
         self.movement_type = MovementType.WALK
         self.image_flipped = False
-        self.data = load_data()
+        # the players on a server share the data of the server, every load adds its items to the item store
+        self.data = data if data is not None else load_data()
 
     @property
     def walk_direction(self) -> WalkDirection:
@@ -216,66 +432,113 @@ class MainChar(pygame.sprite.Sprite):
     def walk_down(self) -> None:
         self.rect.y = self.rect.y + self.get_current_speed()
 
-    def solve_for_walking(self, name: str, game_world: GameWorld) -> None:
+    def solve_for_walking(self, name: str, game_world: GameWorld, pressed: KeyState = None) -> None:
         """method to find and execute the right walking method based on input"""
-        if self.wall_collision_check(game_world):
+        if self.wall_collision_check(game_world, pressed):
             return None
         do = f"walk_{name}"
         if hasattr(self, do) and callable(func := getattr(self, do)):
             func()
 
-    def wall_collision_check(self, game_world: GameWorld) -> bool:
+    def wall_collision_check(self, game_world: GameWorld, pressed: KeyState = None) -> bool:
         """ if next move will hit a wall, return true """
+        if pressed is None:
+            pressed = KeyState.from_pygame()
         speed = self.get_current_speed()
 
-        if self.rect.bottomright[0] + speed > SCREEN_SIZE[0] and pygame.key.get_pressed()[K_d]:
+        stage_size = game_world.current_stage.size
+
+        if self.rect.bottomright[0] + speed > stage_size[0] and pressed[K_d]:
             if game_world.current_stage.right_stage:
                 game_world.current_stage = game_world.current_stage.right_stage
                 self.rect.x = 0
+                self.rect.update(game_world.current_stage.clamp(self.rect))
             return True
-        if self.rect.bottomright[1] + speed > SCREEN_SIZE[1] and pygame.key.get_pressed()[K_s]:
+        if self.rect.bottomright[1] + speed > stage_size[1] and pressed[K_s]:
             if game_world.current_stage.bottom_stage:
                 game_world.current_stage = game_world.current_stage.bottom_stage
                 self.rect.y = 0
+                self.rect.update(game_world.current_stage.clamp(self.rect))
             return True
-        if self.rect.x - speed < 0 and pygame.key.get_pressed()[K_a]:
+        if self.rect.x - speed < 0 and pressed[K_a]:
             if game_world.current_stage.left_stage:
                 game_world.current_stage = game_world.current_stage.left_stage
-                self.rect.x = SCREEN_SIZE[0] - self.rect.width
+                self.rect.x = game_world.current_stage.size[0] - self.rect.width
+                self.rect.update(game_world.current_stage.clamp(self.rect))
             return True
-        if self.rect.y - speed < 0 and pygame.key.get_pressed()[K_w]:
+        if self.rect.y - speed < 0 and pressed[K_w]:
             if game_world.current_stage.top_stage:
                 game_world.current_stage = game_world.current_stage.top_stage
-                self.rect.y = SCREEN_SIZE[1] - self.rect.height
+                self.rect.y = game_world.current_stage.size[1] - self.rect.height
+                self.rect.update(game_world.current_stage.clamp(self.rect))
             return True
         return False
 
     def flip_image_x(self) -> None:
-        """Flips the main char image horizontally based on the walk_direction"""
+        """Flips the main char image and mask horizontally based on the walk_direction"""
         if self.walk_direction is WalkDirection.LEFT and not self.image_flipped:
-            self.image = pygame.transform.flip(self.image, True, False)
             self.image_flipped = True
-        if self.walk_direction is WalkDirection.RIGHT and self.image_flipped:
-            self.image = pygame.transform.flip(self.image, True, False)
+        elif self.walk_direction is WalkDirection.RIGHT and self.image_flipped:
             self.image_flipped = False
+        else:
+            return
+        self.animator.play(self.animator.cycle_name, self.image_flipped)
+
+    def update(self, dt: float = 0.0) -> None:
+        """
+        advances the animation by `dt` seconds. idle, walk or sprint follows from `moving` or the
+        movement since the last update and the `movement_type`, the direction from `image_flipped`
+        """
+        position = (self.rect.x, self.rect.y)
+        moving = position != self._last_position if self.moving is None else self.moving
+        if not moving:
+            cycle_name = CYCLE_IDLE
+        elif self.movement_type is MovementType.SPRINT:
+            cycle_name = CYCLE_SPRINT
+        else:
+            cycle_name = CYCLE_WALK
+        self._last_position = position
+        self.animator.play(cycle_name, self.image_flipped)
+        self.animator.update(dt)
 
 
 class MainCharGroup(pygame.sprite.GroupSingle):
     sprite: MainChar
 
+    def __init__(self, sprite: Optional[MainChar] = None):
+        self._sprites: List[MainChar] = []
+        super().__init__(sprite)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self._sprites = [self.sprite]
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self._sprites = [self.sprite] if self.sprite is not None else []
+
     def sprites(self) -> List[MainChar]:
-        return [self.sprite]
+        """the same list every call, it is drawn every frame. do not change it"""
+        return self._sprites
+
+
+@lru_cache(maxsize=None)
+def get_font(name: str, size: int) -> pygame.font.Font:
+    """returns the system font, looked up only once per name and size"""
+    return pygame.font.SysFont(name, size)
 
 
 def create_stages() -> Tuple[GameStage, ...]:
     """Creates the stages for the game"""
     main_char_group = create_main_char_group()
+    meadow = load_tilemap("meadow")
+    plains = load_tilemap("plains")
 
-    start_stage = GameStage(main_char_group, "Start Level")
-    right_stage = GameStage(main_char_group, "Right Level")
-    top_stage = GameStage(main_char_group, "Top Level")
-    left_stage = GameStage(main_char_group, "Left Level")
-    bottom_stage = GameStage(main_char_group, "Bottom Level")
+    start_stage = GameStage(main_char_group, "Start Level", meadow)
+    right_stage = GameStage(main_char_group, "Right Level", meadow)
+    top_stage = GameStage(main_char_group, "Top Level", meadow)
+    left_stage = GameStage(main_char_group, "Left Level", meadow)
+    bottom_stage = GameStage(main_char_group, "Bottom Level", plains)
 
     start_stage.right_stage = right_stage
     start_stage.top_stage = top_stage
@@ -285,14 +548,26 @@ def create_stages() -> Tuple[GameStage, ...]:
     return start_stage, right_stage, top_stage, left_stage, bottom_stage
 
 
-def create_game_world() -> GameWorld:
-    stages = create_stages()
+def create_generated_stages(seed: int, width: int, height: int) -> Tuple[GameStage, ...]:
+    """Creates the stages of a procedural world, see worldgen.py"""
+    from worldgen import build_stages, get_world_links
+
+    links = get_world_links(seed, width, height)
+    return build_stages(links, width, create_main_char_group(), load_tilemap("meadow"))
+
+
+def create_game_world(world_size: Optional[Tuple[int, int]] = None, seed: int = 0) -> GameWorld:
+    """with `world_size` a procedural world of that many stages is generated from `seed`"""
+    if world_size is None:
+        return GameWorld(create_stages())
 
-    return GameWorld(stages)
+    stages = create_generated_stages(normalize_seed(seed), *world_size)
+    return GameWorld(stages, world_size)
 
 
-def create_map(game_world: GameWorld) -> Map:
-    return Map(game_world)
+def create_map(game_world: GameWorld, exploration: Optional[ExplorationMap] = None,
+               router: Optional[StageRouter] = None) -> Map:
+    return Map(game_world, exploration, router)
 
 
 def create_main_char() -> MainChar:
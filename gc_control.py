@@ -0,0 +1,92 @@
+"""
+Garbage collection in the idle time of a frame.
+
+The automatic collector runs whenever enough container objects were allocated, in the middle of
+any frame. `GcController` turns it off and runs the same collections as a task of the
+`FrameScheduler`, after the frame is drawn. Only if the idle time is missing for too long, a young
+generation collection runs at the end of the frame anyway.
+
+`freeze_startup_objects` moves everything created during the start (stages, tilemaps, models)
+into the permanent generation, so a full collection does not traverse it again.
+"""
+import gc
+import time
+from typing import List
+
+from scheduler import FrameScheduler
+
+GC_PRIORITY = 20  # after all other tasks
+GC_BUDGET = 0.001  # seconds
+# allocations over the gen 0 threshold that are tolerated without idle time
+GC_OVERDUE_FACTOR = 10
+
+
+def freeze_startup_objects() -> int:
+    """collects once and freezes all remaining objects. returns the number of frozen objects"""
+    gc.collect()
+    gc.freeze()
+    return gc.get_freeze_count()
+
+
+class GcController:
+    """Runs the collections of the cyclic garbage collector in idle frame time"""
+
+    def __init__(self, scheduler: FrameScheduler):
+        self.thresholds = gc.get_threshold()
+        self.collections = [0, 0, 0]
+        # collections per generation that ran at the end of a frame without idle time
+        self.overdue_collections = [0, 0, 0]
+        self.max_pause = 0.0
+        self.was_enabled = gc.isenabled()
+        gc.disable()
+        self.task = scheduler.add_task("gc", self.collect_idle, GC_PRIORITY, period=0.0, budget=GC_BUDGET)
+
+    def due_generation(self) -> int:
+        """the generation the automatic collector would collect now, -1 if none"""
+        count = gc.get_count()
+        if count[0] < self.thresholds[0]:
+            return -1
+        if count[2] >= self.thresholds[2] and count[1] >= self.thresholds[1]:
+            return 2
+        if count[1] >= self.thresholds[1]:
+            return 1
+        return 0
+
+    def collect(self, generation: int) -> None:
+        start = time.perf_counter()
+        gc.collect(generation)
+        self.max_pause = max(self.max_pause, time.perf_counter() - start)
+        self.collections[generation] += 1
+
+    def collect_idle(self) -> None:
+        """task of the scheduler, runs only when the frame has time left"""
+        generation = self.due_generation()
+        if generation >= 0:
+            self.collect(generation)
+
+    def collect_overdue(self) -> None:
+        """
+        call at the end of every frame, runs the due collection when idle time was missing too long.
+        the older generations are collected as well, on slow machines the idle task may never run
+        """
+        if gc.get_count()[0] >= self.thresholds[0] * GC_OVERDUE_FACTOR:
+            generation = max(0, self.due_generation())
+            self.collect(generation)
+            self.overdue_collections[generation] += 1
+
+    def close(self) -> None:
+        self.task.cancelled = True
+        if self.was_enabled:
+            gc.enable()
+
+    def debug_rows(self) -> List[dict]:
+        """returns the collection stats in the format of `Debug.display_debug_output`"""
+        return [
+            {"name": "GC Collections", "text": f"{self.collections} ({self.overdue_collections} overdue)"},
+            {"name": "GC Max Pause", "text": f"{self.max_pause * 1000:.2f} ms"},
+            {"name": "GC Frozen Objects", "text": gc.get_freeze_count()},
+        ]
+
+
+def create_gc_controller(scheduler: FrameScheduler) -> GcController:
+    return GcController(scheduler)
@@ -0,0 +1,195 @@
+"""
+Hot reload of the data files for development (`--hot-reload`).
+
+`DataWatcher.poll` only compares modification time and size of the data files, so it can run
+every few frames. A changed file is parsed and its records are matched with the loaded models by
+`id`. Existing models are updated in place, so every reference to them (inventory, combat, the
+main char) sees the new values, and only the inventory rows of changed items get re-rendered.
+A file that can not be applied is kept as it is, the error is shown in the debug overlay.
+"""
+import os
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from inventory import Inventory
+from models import BaseModel, DataModel, ItemModel, load_data_from_json_file, resolve_to_n_data
+
+HOT_RELOAD_INTERVAL = 0.5  # seconds between two polls
+# the fields of the records by data model attribute: field -> (type, required)
+RECORD_FIELDS = {
+    "items": {"id": (int, True), "name": (str, True), "damage": (int, False)},
+    "mainchar": {"id": (int, True), "name": (str, False), "damage": (int, False), "hp": (int, False),
+                 "current_item": (int, False), "items": (list, False)},
+}
+# numbers are stored in `array('l')` columns, which are 32 bits on some platforms
+RECORD_INT_RANGE = (-2 ** 31, 2 ** 31 - 1)
+
+
+class RecordDiff(NamedTuple):
+    added: List[dict]
+    # id -> changed fields with their new values
+    changed: Dict[int, dict]
+    removed: List[int]
+
+
+def check_int(value, name: str) -> None:
+    # a bool is an int, but no valid id or damage
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TypeError(f"{name} is {type(value).__name__}, expected int")
+    if not RECORD_INT_RANGE[0] <= value <= RECORD_INT_RANGE[1]:
+        raise TypeError(f"{name} is out of range: {value}")
+
+
+def check_records(records, fields: Dict[str, Tuple[type, bool]]) -> None:
+    """
+    raises a TypeError or KeyError, if `records` is not a list of records with `fields` of the right
+    types. called before any model changes, so a bad edit never leaves half applied models
+    """
+    if not isinstance(records, list):
+        raise TypeError(f"expected a list of records, got {type(records).__name__}")
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise TypeError(f"record {index} is {type(record).__name__}, expected an object")
+        for field, (field_type, required) in fields.items():
+            if field not in record:
+                if required:
+                    raise KeyError(f"record {index} has no {field!r}")
+                continue
+            value = record[field]
+            if field_type is int:
+                check_int(value, f"{field!r} of record {index}")
+            elif field_type is list:
+                if not isinstance(value, list):
+                    raise TypeError(f"{field!r} of record {index} is {type(value).__name__}, expected a list")
+                for item_id in value:
+                    check_int(item_id, f"an id in {field!r} of record {index}")
+            elif not isinstance(value, field_type):
+                raise TypeError(f"{field!r} of record {index} is {type(value).__name__}, "
+                                f"expected {field_type.__name__}")
+
+
+def diff_records(models: Dict[int, BaseModel], records: List[dict], fields: Sequence[str]) -> RecordDiff:
+    """compares the `fields` of the loaded `models` by id with the `records` of a data file"""
+    record_ids = set()
+    added = []
+    changed = {}
+    for record in records:
+        record_ids.add(record['id'])
+        model = models.get(record['id'])
+        if model is None:
+            added.append(record)
+            continue
+        changed_fields = {
+            field: record[field] for field in fields
+            if field in record and record[field] != getattr(model, field)
+        }
+        if changed_fields:
+            changed[record['id']] = changed_fields
+    removed = [model_id for model_id in models if model_id not in record_ids]
+    return RecordDiff(added, changed, removed)
+
+
+class DataWatcher:
+    """
+    Polls the files of `DataModel.PATHS` and applies their changes to `data_model` and `inventory`.
+
+    ## Arguments
+    - `paths`, data file by data model attribute, defaults to `DataModel.PATHS`
+    """
+
+    def __init__(self, data_model: DataModel, inventory: Inventory, paths: Optional[Dict[str, Path]] = None):
+        self.data_model = data_model
+        self.inventory = inventory
+        self.paths = dict(paths or DataModel.PATHS)
+        self.reloads = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self._file_states: Dict[str, Optional[Tuple[int, int]]] = {
+            name: self.file_state(path) for name, path in self.paths.items()
+        }
+
+    @staticmethod
+    def file_state(path: Path) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def poll(self) -> List[str]:
+        """reloads the changed files and returns their names"""
+        changed_files = []
+        for name, path in self.paths.items():
+            file_state = self.file_state(path)
+            if file_state == self._file_states[name] or file_state is None:
+                continue
+            self._file_states[name] = file_state
+            try:
+                records = load_data_from_json_file(path)
+                check_records(records, RECORD_FIELDS[name])
+            except (OSError, ValueError, KeyError, TypeError) as error:
+                # editors may save a file in several steps, the next change gets loaded again
+                self.report_error(f"Could not reload {path.name}: {error}")
+                continue
+            if name == "items":
+                self.reload_items(records)
+            elif name == "mainchar":
+                self.reload_mainchar(records)
+            changed_files.append(name)
+            self.reloads += 1
+        return changed_files
+
+    def report_error(self, message: str) -> None:
+        self.errors += 1
+        self.last_error = message
+
+    def debug_rows(self) -> List[dict]:
+        """returns the reload stats and the last error in the format of `Debug.display_debug_output`"""
+        return [
+            {"name": "Hot Reloads", "text": f"{self.reloads} ({self.errors} failed)"},
+            {"name": "Last Reload Error", "text": self.last_error or "-"},
+        ]
+
+    def reload_items(self, records: List[dict]) -> RecordDiff:
+        data_model = self.data_model
+        items = {item.id: item for item in data_model.items}
+        diff = diff_records(items, records, ("name", "damage"))
+        for item_id, changed_fields in diff.changed.items():
+            for field, value in changed_fields.items():
+                items[item_id][field] = value
+        removed = set(diff.removed)
+        data_model.items = [item for item in data_model.items if item.id not in removed]
+        data_model.items.extend(
+            ItemModel(record['name'], record.get('damage', 5), id=record['id']) for record in diff.added
+        )
+
+        renamed = {item_id for item_id, changed_fields in diff.changed.items() if "name" in changed_fields}
+        self.inventory.update_item_rows(data_model, renamed)
+        return diff
+
+    def reload_mainchar(self, records: List[dict]) -> Optional[RecordDiff]:
+        mainchar = self.data_model.mainchar
+        diff = diff_records({mainchar.id: mainchar}, records, ("name", "damage", "hp"))
+        record = next((record for record in records if record['id'] == mainchar.id), None)
+        if record is None:
+            return None
+        for field, value in diff.changed.get(mainchar.id, {}).items():
+            mainchar[field] = value
+
+        item_ids = record.get('items', [])
+        loaded_item_ids = [item[0].id if isinstance(item, list) and item else getattr(item, 'id', None)
+                           for item in mainchar.items]
+        if item_ids != loaded_item_ids and item_ids:
+            if item_ids[0] not in {item.id for item in self.data_model.items}:
+                self.report_error(f"Could not reload the items of {mainchar.name}: there is no item {item_ids[0]}")
+                return diff
+            # resolved like in `DataModel.load_mainchar`, the first item becomes the current item
+            mainchar.items = item_ids
+            mainchar.current_item = item_ids[0]
+            resolve_to_n_data([mainchar], self.data_model.items, ['current_item', 'items'])
+            self.inventory.update_current_item(self.data_model)
+        return diff
+
+
+def create_data_watcher(data_model: DataModel, inventory: Inventory) -> DataWatcher:
+    return DataWatcher(data_model, inventory)
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import pygame
+
+from assets import load_image
+
+# PATHS
+CHAR_IMAGE_PATH = Path.cwd() / 'resources' / 'img' / 'chars'
+
+
+class CachedImage(NamedTuple):
+    surface: pygame.Surface
+    mask: pygame.mask.Mask
+
+
+class ImageCache:
+    """
+    Loads every image once and keeps it together with its collision mask.
+    Flipped variants and frames of an atlas (`area`) are cached the same way,
+    so flipping a sprite never creates a new surface or mask.
+    Scaled copies for a lower render resolution are kept for the `SCALED_CACHE_SIZE` surfaces
+    drawn last.
+    """
+    SCALED_CACHE_SIZE = 1024
+
+    def __init__(self):
+        self._sources: Dict[Path, pygame.Surface] = {}
+        self._images: Dict[Tuple[Path, Optional[Tuple[int, int, int, int]], bool], CachedImage] = {}
+        # (id of the source surface, scale) -> (source surface, scaled surface)
+        self._scaled: OrderedDict[Tuple[int, float], Tuple[pygame.Surface, pygame.Surface]] = OrderedDict()
+
+    def load_source(self, path: Path) -> pygame.Surface:
+        if path not in self._sources:
+            surface = load_image(path)
+            if pygame.display.get_surface() is not None:
+                surface = surface.convert_alpha()
+            self._sources[path] = surface
+        return self._sources[path]
+
+    def get(self, path: Path, flipped: bool = False, area: Optional[pygame.Rect] = None) -> CachedImage:
+        """returns the image at `path` (or the `area` of it), horizontally flipped if `flipped`"""
+        area_key = tuple(area) if area is not None else None
+        key = (path, area_key, flipped)
+        if key not in self._images:
+            if flipped:
+                surface = pygame.transform.flip(self.get(path, False, area).surface, True, False)
+            elif area is not None:
+                surface = self.load_source(path).subsurface(area)
+            else:
+                surface = self.load_source(path)
+            self._images[key] = CachedImage(surface, pygame.mask.from_surface(surface))
+        return self._images[key]
+
+    def get_scaled(self, surface: pygame.Surface, scale: float) -> pygame.Surface:
+        """returns a copy of `surface` scaled by `scale`, for drawing at a lower render resolution"""
+        key = (id(surface), scale)
+        cached = self._scaled.get(key)
+        # the source is kept in the cache, so its id is not reused by another surface
+        if cached is None or cached[0] is not surface:
+            size = (max(1, round(surface.get_width() * scale)), max(1, round(surface.get_height() * scale)))
+            cached = self._scaled[key] = (surface, pygame.transform.scale(surface, size))
+            if len(self._scaled) > self.SCALED_CACHE_SIZE:
+                self._scaled.popitem(last=False)
+        else:
+            self._scaled.move_to_end(key)
+        return cached[1]
+
+    def clear_scaled(self) -> None:
+        """drops the scaled copies, e.g. when the render scale changed"""
+        self._scaled.clear()
+
+    def surfaces(self) -> List[pygame.Surface]:
+        """all cached surfaces, sources and variants"""
+        return (list(self._sources.values()) + [image.surface for image in self._images.values()]
+                + [scaled for _, scaled in self._scaled.values()])
+
+    def clear(self) -> None:
+        self._sources.clear()
+        self._images.clear()
+        self._scaled.clear()
+
+
+IMAGE_CACHE = ImageCache()
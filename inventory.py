@@ -1,9 +1,9 @@
-from typing import List
+from typing import List, Optional, Set
 
 import pygame
 
 from menu import GAME_WINDOW
-from models import DataModel
+from models import DataModel, ItemModel
 
 
 class Inventory:
@@ -21,8 +21,47 @@ class Inventory:
         self.current_item_fonts = current_item_fonts
         self.all_item_fonts = all_item_fonts
         self.font_surface_header = set_font("Inventory", self.HEADER_SIZE)
+        self.rendered_rows = 0
         print(self.all_item_fonts, all_item_fonts)
 
+    def update_item_rows(self, data: DataModel, renamed_item_ids: Set[int]) -> None:
+        """
+        matches the item rows with `data.items` after a reload. only the rows of new and renamed
+        items get rendered, the other rows are just moved to their new position
+        """
+        rows = {sprite.item.id: sprite for sprite in self.all_item_fonts if sprite.item is not None}
+        item_ids = {item.id for item in data.items}
+        for item_id, row in rows.items():
+            if item_id not in item_ids:
+                row.kill()
+
+        top_position = self.TEXT_TOP_POSITION + self.TEST_PADDING
+        for item in data.items:
+            row = rows.get(item.id)
+            if row is None:
+                self.all_item_fonts.add(create_item_row(item, top_position))
+                self.rendered_rows += 1
+            else:
+                row.item = item
+                if item.id in renamed_item_ids:
+                    row.image = set_font(item.name, self.TEST_SIZE, self.TEST_COLOR)
+                    row.rect.size = row.image.get_size()
+                    self.rendered_rows += 1
+                row.rect.top = top_position
+            top_position = top_position + self.TEST_SIZE
+
+        if data.mainchar.current_item.id in renamed_item_ids:
+            self.update_current_item(data)
+
+    def update_current_item(self, data: DataModel) -> None:
+        """renders the row of the current item again"""
+        for sprite in self.current_item_fonts:
+            if sprite.item is not None:
+                sprite.item = data.mainchar.current_item
+                sprite.image = set_font(sprite.item.name, self.TEST_SIZE, self.TEST_COLOR)
+                sprite.rect.size = sprite.image.get_size()
+                self.rendered_rows += 1
+
     def draw_page_name(self) -> None:
         """Draws the page name on top of the window"""
         GAME_WINDOW.blit(
@@ -37,9 +76,11 @@ class Inventory:
 class InventoryText(pygame.sprite.Sprite):
     """Class for drawing Header and normal text in the Inventory"""
 
-    def __init__(self, font: pygame.Surface, pos: List[int]):
+    def __init__(self, font: pygame.Surface, pos: List[int], item: Optional[ItemModel] = None):
         pygame.sprite.Sprite.__init__(self)
 
+        # the item of an item row, to find the rows to update after a hot reload
+        self.item = item
         self.image = font
         self.rect = self.image.get_rect()
         self.rect.left = pos[0]
@@ -66,16 +107,21 @@ def create_inventory_item_fonts(data: DataModel) -> List[InventoryText]:
     )]
     top_position = top_position + Inventory.TEST_PADDING
     for item in items:
-        item_text_font_surface = set_font(item.name, Inventory.TEST_SIZE, Inventory.TEST_COLOR)
-        fonts.append(InventoryText(
-            item_text_font_surface,
-            [200, top_position])
-        )
+        fonts.append(create_item_row(item, top_position))
         top_position = top_position + Inventory.TEST_SIZE
 
     return fonts
 
 
+def create_item_row(item: ItemModel, top_position: int) -> InventoryText:
+    item_text_font_surface = set_font(item.name, Inventory.TEST_SIZE, Inventory.TEST_COLOR)
+    return InventoryText(
+        item_text_font_surface,
+        [Inventory.LEFT_CONTAINER_TEXT_MARGIN, top_position],
+        item
+    )
+
+
 def create_inventory_current_item_fonts(data: DataModel) -> List[InventoryText]:
     current_item = data.mainchar.current_item
     top_position = Inventory.TEXT_TOP_POSITION
@@ -93,7 +139,8 @@ def create_inventory_current_item_fonts(data: DataModel) -> List[InventoryText]:
             Inventory.TEST_SIZE,
             Inventory.TEST_COLOR
         ),
-        [Inventory.RIGHT_CONTAINER_TEXT_MARGIN, top_position]
+        [Inventory.RIGHT_CONTAINER_TEXT_MARGIN, top_position],
+        current_item
     ))
 
     return fonts
@@ -0,0 +1,209 @@
+"""
+Sprite layers of a stage.
+
+Every stage draws its sprites in the layers of `LAYER_SETTINGS`, in that order: the static decor
+of the background, the actors, the effects and the ui in window coordinates. A layer only updates
+its awake sprites, the ones near the camera viewport every `period` seconds and the distant ones
+every `distant_period` seconds. A layer without a period, e.g. the decor, never updates.
+A sprite that reports `is_idle()` after its update falls asleep and is skipped until `wake_sprite`
+is called for it, so the update cost of a frame follows the awake sprites, not all sprites.
+Sleeping sprites are still drawn.
+"""
+import heapq
+import itertools
+import math
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import pygame
+
+from camera import Camera
+
+# LAYERS
+LAYER_BACKGROUND = "background"
+LAYER_ACTORS = "actors"
+LAYER_EFFECTS = "effects"
+LAYER_UI = "ui"
+
+DISTANT_MARGIN = 256  # pixels around the viewport, sprites in it still update at the near period
+PHASE_SLOTS = 16  # distant updates are spread over this many parts of the period
+DISTANT_RECHECK = 0.25  # seconds between two looks at a distant sprite of a layer without distant updates
+
+
+class LayerSettings(NamedTuple):
+    period: Optional[float]  # seconds between two updates near the viewport, 0 every frame, None never
+    distant_period: Optional[float]  # the same outside of the viewport and its `DISTANT_MARGIN`
+    screen_space: bool = False  # sprites in window coordinates, drawn on top of the scaled world
+
+
+LAYER_SETTINGS: Dict[str, LayerSettings] = {
+    LAYER_BACKGROUND: LayerSettings(None, None),
+    LAYER_ACTORS: LayerSettings(0.0, 0.25),
+    LAYER_EFFECTS: LayerSettings(0.0, None),
+    LAYER_UI: LayerSettings(0.0, 0.0, True),
+}
+
+
+class SpriteLayer(pygame.sprite.Group):
+    """
+    A group that updates its awake sprites by its `LayerSettings`. The awake sprites wait in a heap
+    by the time of their next update, a frame only touches the due ones: the near sprites and a part
+    of the distant ones. `update(dt, near)` passes every sprite the seconds since its own last update.
+    A distant sprite notices that it came near at its next update, `DISTANT_MARGIN` covers the delay.
+
+    ## Arguments
+    - `name`, a key of `LAYER_SETTINGS`
+    - `settings`, the update periods of the layer
+    """
+
+    def __init__(self, name: str, settings: LayerSettings):
+        self.name = name
+        self.settings = settings
+        self.time = 0.0  # seconds of all `update` calls
+        # sprite -> [time of its last update, time of its next update, phase of its distant updates]
+        self.awake: Dict[pygame.sprite.Sprite, List[float]] = {}
+        self.updated = 0  # sprite updates of the last `update`
+        # (time of the next update, order of scheduling, sprite), entries of sleeping sprites stay until they are due
+        self._schedule: List[Tuple[float, int, pygame.sprite.Sprite]] = []
+        self._order = itertools.count()
+        self._near: Optional[pygame.Rect] = None
+        self._phase = 0
+        self._sprites: List[pygame.sprite.Sprite] = []
+        super().__init__()
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self._sprites = list(self.spritedict)
+        self.wake(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self._sprites = list(self.spritedict)
+        self.awake.pop(sprite, None)
+
+    def sprites(self) -> List[pygame.sprite.Sprite]:
+        """the same list until a sprite is added or removed, it is drawn every frame. do not change it"""
+        return self._sprites
+
+    def is_near(self, sprite: pygame.sprite.Sprite) -> bool:
+        """near the viewport of the last `update`, before the first one all sprites are"""
+        return self._near is None or self.settings.screen_space or self._near.colliderect(sprite.rect)
+
+    def schedule(self, sprite: pygame.sprite.Sprite, timer: List[float], due_time: float) -> None:
+        timer[1] = due_time
+        heapq.heappush(self._schedule, (due_time, next(self._order), sprite))
+
+    def wake(self, sprite: pygame.sprite.Sprite) -> None:
+        if sprite in self.awake or sprite not in self.spritedict or self.settings.period is None:
+            return
+        self._phase = (self._phase + 1) % PHASE_SLOTS
+        timer = self.awake[sprite] = [self.time, 0.0, self._phase / PHASE_SLOTS]
+        if self.is_near(sprite):
+            self.schedule(sprite, timer, self.time)
+        else:
+            self.schedule(sprite, timer, self.distant_time(timer, self.settings.distant_period or DISTANT_RECHECK))
+
+    def distant_time(self, timer: List[float], period: float) -> float:
+        """
+        the time of the next distant update, always at the phase of the sprite in the period,
+        so distant sprites are spread over the frames of a period and never update in the same frame
+        """
+        return (math.floor(self.time / period - timer[2]) + 1 + timer[2]) * period
+
+    def sleep(self, sprite: pygame.sprite.Sprite) -> None:
+        self.awake.pop(sprite, None)
+
+    def update(self, dt: float, near: Optional[pygame.Rect] = None) -> int:
+        """
+        updates the due awake sprites. sprites that collide with `near` (stage coordinates) use the
+        near period, without `near` all do. returns the number of updated sprites
+        """
+        self.time += dt
+        self._near = near
+        period, distant_period, _ = self.settings
+        schedule = self._schedule
+        # a bit of slack, so the float sums of the frame times do not push an update into the next frame
+        now = self.time + 1e-6
+        due = []
+        while schedule and schedule[0][0] <= now:
+            due.append(heapq.heappop(schedule))
+        updated = 0
+        for due_time, _, sprite in due:
+            timer = self.awake.get(sprite)
+            if timer is None or timer[1] != due_time:
+                # asleep, removed or woken again with a new entry
+                continue
+            near_sprite = self.is_near(sprite)
+            if not near_sprite and distant_period is None:
+                # distant sprites of this layer do not update, only check again later
+                self.schedule(sprite, timer, self.distant_time(timer, DISTANT_RECHECK))
+                continue
+            # updates may kill sprites or put them to sleep
+            sprite.update(self.time - timer[0])
+            updated += 1
+            if sprite not in self.awake:
+                continue
+            timer[0] = self.time
+            is_idle = getattr(sprite, "is_idle", None)
+            if is_idle is not None and is_idle():
+                del self.awake[sprite]
+            elif near_sprite:
+                self.schedule(sprite, timer, self.time + period)
+            else:
+                self.schedule(sprite, timer, self.distant_time(timer, distant_period))
+        self.updated = updated
+        return updated
+
+
+class StageLayers:
+    """The sprite layers of a stage, in drawing order"""
+
+    def __init__(self, settings: Optional[Dict[str, LayerSettings]] = None):
+        settings = LAYER_SETTINGS if settings is None else settings
+        self.layers: Dict[str, SpriteLayer] = {name: SpriteLayer(name, layer) for name, layer in settings.items()}
+
+    def __getitem__(self, name: str) -> SpriteLayer:
+        return self.layers[name]
+
+    def add(self, sprite: pygame.sprite.Sprite, layer_name: str = LAYER_ACTORS) -> None:
+        self.layers[layer_name].add(sprite)
+
+    def update(self, dt: float, viewport: Optional[pygame.Rect] = None) -> int:
+        """updates the awake sprites of all layers. returns the number of updated sprites"""
+        near = viewport.inflate(2 * DISTANT_MARGIN, 2 * DISTANT_MARGIN) if viewport is not None else None
+        return sum(layer.update(dt, near) for layer in self.layers.values())
+
+    def draw(self, camera: Camera, surface: pygame.Surface) -> int:
+        """draws the visible sprites of the layers in stage coordinates. returns the number of drawn sprites"""
+        return sum(camera.draw_group(layer, surface) for layer in self.layers.values()
+                   if layer and not layer.settings.screen_space)
+
+    def draw_screen(self, surface: pygame.Surface) -> None:
+        """draws the layers in window coordinates"""
+        for layer in self.layers.values():
+            if layer and layer.settings.screen_space:
+                layer.draw(surface)
+
+    def sprite_count(self) -> int:
+        return sum(len(layer) for layer in self.layers.values())
+
+    def awake_count(self) -> int:
+        return sum(len(layer.awake) for layer in self.layers.values())
+
+    def debug_rows(self) -> List[dict]:
+        """returns the sprite counts in the format of `Debug.display_debug_output`"""
+        updated = sum(layer.updated for layer in self.layers.values())
+        return [
+            {"name": "Stage Sprites", "text": f"{self.awake_count()} awake of {self.sprite_count()}"},
+            {"name": "Sprite Updates", "text": updated},
+        ]
+
+
+def wake_sprite(sprite: pygame.sprite.Sprite) -> None:
+    """wakes `sprite` in all layers it is in, e.g. after its animation changed"""
+    for group in sprite.groups():
+        if isinstance(group, SpriteLayer):
+            group.wake(sprite)
+
+
+def create_stage_layers() -> StageLayers:
+    return StageLayers()
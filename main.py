@@ -1,13 +1,36 @@
+import argparse
+import time
 from enum import Enum, auto
-from typing import NamedTuple
+from functools import partial
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
 
 import pygame
 from pygame.locals import *
 
+from combat import CombatEngine, create_combat_engine
 from debug import Debug
-from game_world import MainChar, MovementType, create_game_world, GameWorld, create_map, Map
+from exploration import create_exploration_map, exploration_file
+from gc_control import GcController, create_gc_controller, freeze_startup_objects
+from game_world import MainChar, MovementType, create_game_world, GameWorld, create_map, Map, GAME_FPS
+from hot_reload import DataWatcher, HOT_RELOAD_INTERVAL, create_data_watcher
 from inventory import Inventory, create_inventory
 from menu import Menu, create_menu, GAME_WINDOW, GAME_DISPLAY, GAME_CLOCK
+from memory import MemoryTracker, create_memory_tracker, start_python_tracing
+from network import NetworkClient, create_network_client, create_network_server, parse_address
+from particles import GameParticles, create_game_particles
+from profiler import FrameProfiler, create_frame_profiler, PROFILE_FRAMES, PROFILE_MODES, PROFILE_PATH
+from prefetch import StagePrefetcher, create_stage_prefetcher
+from routing import create_stage_router
+from render_scale import RENDER_SCALES, WorldRenderer, create_world_renderer, parse_render_scale
+from scheduler import FrameScheduler, create_frame_scheduler, FRAME_DEADLINE_MARGIN
+from simulation import StageSimulator, create_stage_simulator
+from user_input import InputSource, KeyState, LiveInputSource, RecordingInputSource, ReplayInputSource
+from worldgen import parse_world_size
+
+
+MEMORY_REPORT_PERIOD = 1.0  # seconds
+ROUTE_LANDMARKS = 8  # landmarks of the router in generated worlds, the few hand made stages need none
 
 
 class GameState(Enum):
@@ -20,25 +43,38 @@ class GameState(Enum):
 class Game:
     def __init__(self, game_state: GameState = GameState.GAME):
         self.game_state = game_state
+        self.show_debug = False
+        self.profile_requested = False
+        # window position of the last click on the map, the map picks its route target there
+        self.map_click: Optional[Tuple[int, int]] = None
         self.game_state_events = {
             GameState.GAME: [
                 handle_pause_event,
                 handle_map_event,
-                handle_inventory_event
+                handle_inventory_event,
+                handle_debug_event,
+                handle_profile_event
             ],
             GameState.MAP: [
                 handle_pause_event,
                 handle_map_event,
-                handle_inventory_event
+                handle_map_click_event,
+                handle_inventory_event,
+                handle_debug_event,
+                handle_profile_event
             ],
             GameState.MENU: [
                 menu_click_events,
-                handle_pause_event
+                handle_pause_event,
+                handle_debug_event,
+                handle_profile_event
             ],
             GameState.Inventory: [
                 handle_pause_event,
                 handle_map_event,
-                handle_inventory_event
+                handle_inventory_event,
+                handle_debug_event,
+                handle_profile_event
             ],
         }
 
@@ -50,6 +86,18 @@ class GameComponents(NamedTuple):
     menu: Menu
     debug: Debug
     inventory: Inventory
+    input_source: InputSource
+    scheduler: FrameScheduler
+    simulation: Optional[StageSimulator] = None
+    prefetcher: Optional[StagePrefetcher] = None
+    memory: Optional[MemoryTracker] = None
+    profiler: Optional[FrameProfiler] = None
+    combat: Optional[CombatEngine] = None
+    renderer: Optional[WorldRenderer] = None
+    data_watcher: Optional[DataWatcher] = None
+    gc_controller: Optional[GcController] = None
+    network: Optional[NetworkClient] = None
+    particles: Optional[GameParticles] = None
 
 
 def menu_click_events(event, game: Game, menu: Menu):
@@ -80,49 +128,70 @@ def handle_map_event(event, game: Game, menu: Menu) -> None:
         set_game_state(game, GameState.MAP)
 
 
+def handle_map_click_event(event, game: Game, menu: Menu) -> None:
+    if event.type == MOUSEBUTTONUP and event.button == 1:
+        game.map_click = event.pos
+
+
 def handle_inventory_event(event, game: Game, menu: Menu) -> None:
     if event.type == KEYDOWN and event.key == K_i:
         set_game_state(game, GameState.Inventory)
 
 
-def handle_keyboard_events(game_world: GameWorld, game: Game) -> None:
+def handle_debug_event(event, game: Game, menu: Menu) -> None:
+    if event.type == KEYDOWN and event.key == K_F3:
+        game.show_debug = not game.show_debug
+
+
+def handle_profile_event(event, game: Game, menu: Menu) -> None:
+    if event.type == KEYDOWN and event.key == K_F9:
+        game.profile_requested = True
+
+
+def handle_keyboard_events(game_world: GameWorld, game: Game, pressed: KeyState) -> None:
     if game.game_state == GameState.GAME:
-        handle_walking(game_world)
+        handle_walking(game_world, pressed)
 
 
-def handle_walking(game_world: GameWorld) -> None:
+def handle_walking(game_world: GameWorld, pressed: KeyState) -> None:
     main_sprite = game_world.current_stage.sprite_group.sprite
-    if pygame.key.get_pressed()[K_LSHIFT]:
+    if pressed[K_LSHIFT]:
         main_sprite.movement_type = MovementType.SPRINT
     else:
         main_sprite.movement_type = MovementType.WALK
-    [
-        main_sprite.solve_for_walking(MainChar.MAPPED_WALKING[key], game_world)
-        for key, key_active in enumerate(pygame.key.get_pressed())
-        if key_active and key in MainChar.MAPPED_WALKING
-    ]
+    for key, name in MainChar.MAPPED_WALKING.items():
+        if pressed[key]:
+            main_sprite.solve_for_walking(name, game_world, pressed)
 
 
 def handle_mouse_events(event, menu: Menu) -> None:
     if event.type == MOUSEBUTTONDOWN:
         for button in menu.current_page.button_group:
-            if button.rect.collidepoint(pygame.mouse.get_pos()[0], pygame.mouse.get_pos()[1]):
+            if button.rect.collidepoint(event.pos[0], event.pos[1]):
                 button.focus = True
     if event.type == MOUSEBUTTONUP:
         for button in menu.current_page.button_group:
-            if button.rect.collidepoint(pygame.mouse.get_pos()[0], pygame.mouse.get_pos()[1]) and button.focus:
+            if button.rect.collidepoint(event.pos[0], event.pos[1]) and button.focus:
                 button.on_click(menu)
             button.focus = False
 
 
 def check_user_action(game_components: GameComponents) -> bool:
-    """Check User Action. return false on quit events from user"""
-    for event in pygame.event.get():
+    """Check User Action. return false on quit events from user or when the input source has run out"""
+    frame = game_components.input_source.next_frame()
+    if frame is None:
+        return False
+    for event in frame.events:
         for event_function in game_components.game.game_state_events[game_components.game.game_state]:
             event_function(event, game_components.game, game_components.menu)
         if not handle_game_close_events(event):
             return False
-    handle_keyboard_events(game_components.game_world, game_components.game)
+    if game_components.network:
+        # the server walks the main char, keys only count in the game state like in `handle_keyboard_events`
+        in_game = game_components.game.game_state == GameState.GAME
+        game_components.network.send_input(frame.pressed if in_game else KeyState())
+    else:
+        handle_keyboard_events(game_components.game_world, game_components.game, frame.pressed)
     return True
 
 
@@ -133,10 +202,22 @@ def draw_sprites(game_components: GameComponents) -> None:
         game_components.menu.current_page.sprite_group.draw(GAME_WINDOW)
         game_components.menu.current_page.sprite_group.update(surface=GAME_WINDOW)
         game_components.menu.current_page.draw_page_name()
+        if game_components.particles:
+            game_components.particles.screen.draw(GAME_WINDOW)
 
     if game_components.game.game_state == GameState.GAME:
-        game_components.game_world.current_stage.sprite_group.draw(GAME_WINDOW)
-        game_components.game_world.current_stage.draw_page_name()
+        stage = game_components.game_world.current_stage
+        camera = game_components.game_world.camera
+        camera.follow(stage.sprite_group.sprite.rect, stage.size)
+        surface = game_components.renderer.begin() if game_components.renderer else GAME_WINDOW
+        stage.draw_background(camera, surface)
+        stage.draw_sprites(camera, surface)
+        if game_components.particles:
+            game_components.particles.world.draw(surface, camera.offset, camera.scale)
+        if game_components.renderer:
+            game_components.renderer.present(surface)
+        stage.layers.draw_screen(GAME_WINDOW)
+        stage.draw_page_name()
 
     if game_components.game.game_state == GameState.MAP:
         game_components.map.draw_map()
@@ -147,49 +228,329 @@ def draw_sprites(game_components: GameComponents) -> None:
         game_components.inventory.draw_page_name()
 
 
-def loop(game_components: GameComponents) -> None:
-    """Running the pygame loop. set different stuff for window each loop"""
+def draw_debug_output(game_components: GameComponents) -> None:
+    """Draws the debug overlay, toggled with F3"""
+    rows = [{"name": "Game State", "text": game_components.game.game_state}]
+    rows.extend(game_components.scheduler.debug_rows())
+    rows.extend(game_components.game_world.current_stage.layers.debug_rows())
+    if game_components.prefetcher:
+        rows.extend(game_components.prefetcher.debug_rows())
+    if game_components.renderer:
+        rows.extend(game_components.renderer.debug_rows())
+    if game_components.memory:
+        rows.extend(game_components.memory.debug_rows())
+    if game_components.gc_controller:
+        rows.extend(game_components.gc_controller.debug_rows())
+    if game_components.network:
+        rows.extend(game_components.network.debug_rows())
+    if game_components.data_watcher:
+        rows.extend(game_components.data_watcher.debug_rows())
+    if game_components.profiler:
+        rows.extend(game_components.profiler.debug_rows())
+    if game_components.particles:
+        rows.extend(game_components.particles.debug_rows())
+    game_components.debug.display_debug_output(rows)
+
+
+def update_memory_report(game: Game, memory: MemoryTracker) -> None:
+    """task of the scheduler, collects the memory report while the debug overlay is shown"""
+    if game.show_debug:
+        memory.update()
+
+
+def update_game(game_components: GameComponents, dt: float) -> None:
+    """Runs the game logic of one frame. `dt` is the time of the last frame in seconds"""
+    game_world = game_components.game_world
+    if game_components.network:
+        game_components.network.update(game_world, dt)
+    if game_components.simulation:
+        game_components.simulation.tick(dt)
+    # only the awake sprites of the current stage update, see layers.py
+    game_world.current_stage.layers.update(dt, game_world.camera.viewport)
+    if game_components.particles:
+        game_components.particles.update(dt, game_world.current_stage.sprite_group.sprite)
+    if game_components.combat and game_components.combat.pending_attacks:
+        game_components.combat.resolve()
+    if game_components.prefetcher:
+        game_components.prefetcher.update(dt)
+    if game_components.game.map_click is not None:
+        game_components.map.select_route_target(game_components.game.map_click)
+        game_components.game.map_click = None
+
+
+def get_frame_tag(game_components: GameComponents) -> str:
+    """game state and stage name, to tag the profiler samples of a frame"""
+    return f"{game_components.game.game_state.name}/{game_components.game_world.current_stage.name}"
+
+
+def begin_profiled_frame(game_components: GameComponents) -> None:
+    if not game_components.profiler:
+        return
+    if game_components.game.profile_requested:
+        game_components.game.profile_requested = False
+        game_components.profiler.start()
+    game_components.profiler.begin_frame(get_frame_tag(game_components))
+
+
+def end_profiled_frame(game_components: GameComponents) -> None:
+    if game_components.profiler:
+        game_components.profiler.end_frame()
+
+
+def close_game(game_components: GameComponents, memory_report: Optional[Path] = None) -> None:
+    if game_components.profiler:
+        game_components.profiler.stop()
+    if memory_report and game_components.memory:
+        game_components.memory.export_json(memory_report)
+    game_components.input_source.close()
+    # a replay never saves, its exploration would overwrite the save of the player
+    if game_components.map.exploration and not isinstance(game_components.input_source, ReplayInputSource):
+        game_components.map.exploration.save()
+    if game_components.simulation:
+        game_components.simulation.close()
+    if game_components.gc_controller:
+        game_components.gc_controller.close()
+    if game_components.network:
+        game_components.network.close()
+
+
+def print_profile_files(game_components: GameComponents) -> None:
+    if game_components.profiler and game_components.profiler.written_files:
+        print("Profile written to", ", ".join(str(file) for file in game_components.profiler.written_files))
+
+
+def loop(game_components: GameComponents, frame_rate: int = GAME_FPS, memory_report: Optional[Path] = None) -> None:
+    """
+    Running the pygame loop. set different stuff for window each loop. `frame_rate` 0 runs uncapped.
+    with `memory_report` the memory report gets written to this file on quit
+    """
     while True:
+        frame_start = time.perf_counter()
+        begin_profiled_frame(game_components)
         # Überprüfen, ob Nutzer eine Aktion durchgeführt hat
         if not check_user_action(game_components):
+            close_game(game_components, memory_report)
             pygame.quit()
             break
 
         # Spiellogik
+        update_game(game_components, GAME_CLOCK.get_time() / 1000)
 
         # Spielfeld löschen
         GAME_WINDOW.fill(pygame.color.Color("grey"))
 
         # Spielfeld/figuren zeichnen
         draw_sprites(game_components)
-        # game_components.debug.display_debug_output(
-        #     [
-        #         {"name": "Game State", "text": game_components.game.game_state},
-        #         {"name": "Main Char Stats", "text": mainchar.data}
-        #     ]
-        # )
+        if game_components.game.show_debug:
+            draw_debug_output(game_components)
 
         # Fenster aktualisieren
         GAME_DISPLAY.flip()
-        GAME_CLOCK.tick(60)
-
-
-def main() -> None:
-    pygame.init()
-
-    game_world = create_game_world()
-    game_map = create_map(game_world)
+        work_time = time.perf_counter() - frame_start
+        if game_components.prefetcher:
+            game_components.prefetcher.end_frame(work_time)
+        if game_components.renderer:
+            game_components.renderer.end_frame(work_time)
+
+        # Hintergrundaufgaben in der restlichen Zeit des Frames
+        deadline = None
+        if frame_rate:
+            deadline = frame_start + 1 / frame_rate - FRAME_DEADLINE_MARGIN
+        game_components.scheduler.run(deadline)
+        if game_components.gc_controller:
+            game_components.gc_controller.collect_overdue()
+        end_profiled_frame(game_components)
+        GAME_CLOCK.tick(frame_rate)
+
+
+class ReplayResult(NamedTuple):
+    frames: int
+    seconds: float
+    trace: List[Tuple[str, int, int]]
+
+
+def replay(game_components: GameComponents, render: bool = True,
+           memory_report: Optional[Path] = None) -> ReplayResult:
+    """
+    Feeds the recorded input of `game_components.input_source` through the game handlers
+    without frame cap. The game logic gets the time of a frame at `GAME_FPS`, so it runs
+    the same as in the recording. Returns stage name and main char position of every frame.
+    """
+    trace = []
+    start = time.perf_counter()
+    while True:
+        frame_start = time.perf_counter()
+        begin_profiled_frame(game_components)
+        if not check_user_action(game_components):
+            break
+        update_game(game_components, 1 / GAME_FPS)
+        main_char = game_components.game_world.current_stage.sprite_group.sprite
+        trace.append((game_components.game_world.current_stage.name, main_char.rect.x, main_char.rect.y))
+        if render:
+            GAME_WINDOW.fill(pygame.color.Color("grey"))
+            draw_sprites(game_components)
+            GAME_DISPLAY.flip()
+            if game_components.prefetcher:
+                game_components.prefetcher.end_frame(time.perf_counter() - frame_start)
+            game_components.scheduler.run(None)
+        if game_components.gc_controller:
+            game_components.gc_controller.collect_overdue()
+        end_profiled_frame(game_components)
+    seconds = time.perf_counter() - start
+    close_game(game_components, memory_report)
+    return ReplayResult(len(trace), seconds, trace)
+
+
+def create_input_source(record: Optional[Path] = None, replay_path: Optional[Path] = None) -> InputSource:
+    if replay_path:
+        return ReplayInputSource(replay_path)
+    if record:
+        return RecordingInputSource(LiveInputSource(), record)
+    return LiveInputSource()
+
+
+def create_game_components(input_source: InputSource, simulation_workers: int = 0,
+                           prefetch: bool = True, trace_memory: bool = False,
+                           profiler: Optional[FrameProfiler] = None,
+                           world_size: Optional[Tuple[int, int]] = None, world_seed: int = 0,
+                           render_scale: Optional[float] = 1.0, hot_reload: bool = False,
+                           network: Optional[NetworkClient] = None) -> GameComponents:
+    """
+    with `render_scale` None the render scale follows the frame time.
+    with `hot_reload` changes of the data files are applied while the game runs.
+    with `network` the main char is walked by the server the client is connected to
+    """
+    game_world = create_game_world(world_size, world_seed)
+    scheduler = create_frame_scheduler()
+    # the graph of the router is built in idle frame time, the map shows routes once it is done
+    router = create_stage_router(game_world, ROUTE_LANDMARKS if world_size else 0, scheduler)
+    game_map = create_map(game_world, create_exploration_map(game_world, exploration_file(game_world, world_seed)),
+                          router)
     inventory = create_inventory(game_world.current_stage.sprite_group.sprite.data)
+    menu = create_menu()
+    particles = create_game_particles(world_seed)
+    game_world.stage_change_listeners.append(particles.on_stage_change)
+    menu.action_listeners.append(particles.on_menu_action)
+    simulation = None
+    if simulation_workers:
+        simulation = create_stage_simulator(game_world, simulation_workers)
 
     game_components = GameComponents(
         Game(),
         game_world,
         game_map,
-        create_menu(),
+        menu,
         Debug(screen=GAME_WINDOW),
-        inventory
+        inventory,
+        input_source,
+        scheduler,
+        simulation,
+        create_stage_prefetcher(game_world, scheduler, prefetch),
+        combat=create_combat_engine(world_seed),
+        renderer=create_world_renderer(GAME_WINDOW, game_world.camera, render_scale, 1 / GAME_FPS)
+    )
+    memory = create_memory_tracker(game_components, trace_memory)
+    # the report of a running game is only shown in the debug overlay, `--memory-report` collects it on quit
+    scheduler.add_task("memory report", partial(update_memory_report, game_components.game, memory),
+                       priority=10, period=MEMORY_REPORT_PERIOD)
+    data_watcher = None
+    if hot_reload:
+        data_watcher = create_data_watcher(game_world.current_stage.sprite_group.sprite.data, inventory)
+        scheduler.add_task("hot reload", data_watcher.poll, priority=5, period=HOT_RELOAD_INTERVAL)
+    return game_components._replace(memory=memory, profiler=profiler, data_watcher=data_watcher, network=network,
+                                     particles=particles)
+
+
+def serve(address: Tuple[str, int], world_size: Optional[Tuple[int, int]], world_seed: int) -> None:
+    """runs a multiplayer server until ctrl+c, prints the tick rate and bandwidth every second"""
+    server = create_network_server(create_game_world(world_size, world_seed), address, world_size, world_seed,
+                                   report=print)
+    print(f"Serving on {server.address[0]}:{server.address[1]}")
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="GenericRpgV2")
+    parser.add_argument("--record", type=Path, help="writes the input of every frame to this file")
+    parser.add_argument("--replay", type=Path, help="replays an input file at uncapped speed")
+    parser.add_argument("--simulation-workers", type=int, default=0,
+                        help="simulates the stages that are not visible in this many processes (0 = off)")
+    parser.add_argument("--memory-report", type=Path,
+                        help="traces python allocations and writes a memory report as json on quit")
+    parser.add_argument("--profile", action="store_true",
+                        help="profiles the first frames, later captures are started with F9")
+    parser.add_argument("--profile-frames", type=int, default=PROFILE_FRAMES, help="frames per profile capture")
+    parser.add_argument("--profile-mode", choices=PROFILE_MODES, default="sample",
+                        help="sample: collapsed stacks for flame graphs, cprofile: pstats per game state and stage")
+    parser.add_argument("--profile-path", type=Path, default=PROFILE_PATH, help="directory of the profile files")
+    parser.add_argument("--no-prefetch", action="store_true",
+                        help="does not warm up the next stage, the transition frame times are still reported")
+    parser.add_argument("--world-size", type=parse_world_size, metavar="WIDTHxHEIGHT",
+                        help="generates a world of this many stages instead of the default stages")
+    parser.add_argument("--render-scale", type=parse_render_scale, default=1.0,
+                        help=f"resolution of the stage drawing, one of {RENDER_SCALES} or auto (follows the frame time)")
+    parser.add_argument("--hot-reload", action="store_true",
+                        help="applies changes of the data files while the game runs")
+    parser.add_argument("--no-gc-control", action="store_true",
+                        help="keeps the automatic garbage collection instead of collecting in idle frame time")
+    parser.add_argument("--world-seed", type=int, default=0, help="seed of the generated world")
+    parser.add_argument("--serve", type=parse_address, metavar="[HOST:]PORT",
+                        help="runs a multiplayer server for the world instead of the game, "
+                             "set SDL_VIDEODRIVER=dummy to run it without window")
+    parser.add_argument("--connect", type=parse_address, metavar="[HOST:]PORT",
+                        help="plays on a multiplayer server, the world comes from the server")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.memory_report:
+        start_python_tracing()
+    pygame.init()
+    if args.serve:
+        serve(args.serve, args.world_size, args.world_seed)
+        pygame.quit()
+        return
+
+    network = None
+    world_size, world_seed = args.world_size, args.world_seed
+    if args.connect:
+        network = create_network_client(args.connect)
+        welcome = network.connect()
+        world_size, world_seed = welcome.generated_world_size, welcome.world_seed
+        print(f"Connected to {args.connect[0]}:{args.connect[1]} as player {welcome.player_id}")
+
+    game_components = create_game_components(
+        create_input_source(args.record, args.replay),
+        args.simulation_workers,
+        not args.no_prefetch,
+        args.memory_report is not None,
+        create_frame_profiler(args.profile_mode, args.profile_frames, args.profile_path),
+        world_size,
+        world_seed,
+        args.render_scale,
+        args.hot_reload,
+        network
     )
-    loop(game_components)
+    if not args.no_gc_control:
+        # everything created so far lives until the game ends
+        freeze_startup_objects()
+        game_components = game_components._replace(gc_controller=create_gc_controller(game_components.scheduler))
+    game_components.game.profile_requested = args.profile
+    if args.replay:
+        result = replay(game_components, memory_report=args.memory_report)
+        pygame.quit()
+        print(f"Replayed {result.frames} frames in {result.seconds:.3f}s "
+              f"({result.frames / max(result.seconds, 1e-9):.0f} frames/s)")
+        print_profile_files(game_components)
+        return
+    loop(game_components, memory_report=args.memory_report)
+    print_profile_files(game_components)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,161 @@
+"""
+Memory accounting per subsystem.
+
+Pixel data of surfaces and samples of sounds are allocated by SDL and are invisible to
+`tracemalloc`, so they are computed from their size and format. The python objects of every
+subsystem are measured with `tracemalloc` snapshots, grouped by the module that allocated them.
+"""
+import json
+import tracemalloc
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import pygame
+
+# modules that allocate the python objects of a subsystem
+SUBSYSTEM_MODULES = {
+    "stages": ("game_world.py", "tilemap.py", "camera.py", "simulation.py", "routing.py"),
+    "sprites": ("images.py", "layers.py"),
+    "menu": ("menu.py",),
+    "inventory": ("inventory.py",),
+    "sounds": ("mixer.py",),
+    "data": ("models.py",),
+}
+
+TRACEMALLOC_FRAMES = 1
+
+
+def surface_bytes(surface: pygame.Surface) -> int:
+    """bytes of the pixel data of `surface`. subsurfaces share the pixels of their parent"""
+    if surface.get_parent() is not None:
+        return 0
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+
+def sound_bytes(sound: pygame.mixer.Sound) -> int:
+    """bytes of the decoded samples of `sound`"""
+    mixer_settings = pygame.mixer.get_init()
+    if not mixer_settings:
+        return 0
+    frequency, sample_format, channels = mixer_settings
+    return int(sound.get_length() * frequency) * channels * abs(sample_format) // 8
+
+
+def sum_surfaces(surfaces: Iterable[Optional[pygame.Surface]]) -> dict:
+    counted = {}
+    for surface in surfaces:
+        # subsurfaces (frames of a sprite sheet) share the pixels of their parent
+        if surface is not None and surface.get_parent() is None:
+            counted[id(surface)] = surface_bytes(surface)
+    return {"count": len(counted), "bytes": sum(counted.values())}
+
+
+def collect_surfaces(game_components) -> Dict[str, dict]:
+    """count and bytes of the cached surfaces of the game, menu, inventory and map"""
+    from game_world import titled_stages
+    from images import IMAGE_CACHE
+    from tilemap import loaded_tilemaps
+
+    # only stages with a page name have surfaces, looking at all stages of a big world takes frames
+    stage_surfaces = [stage.font_surface for stage in titled_stages()]
+    for tilemap in loaded_tilemaps():
+        stage_surfaces.extend(tilemap.chunks.values())
+        stage_surfaces.extend(scaled for _, scaled in tilemap.scaled_chunks.values())
+
+    menu_surfaces = []
+    for page in game_components.menu.pages.values():
+        menu_surfaces.append(page.font_surface)
+        for button in page.button_group:
+            menu_surfaces.extend((button.image, button.font_surface))
+        menu_surfaces.extend(sprite.image for sprite in page.sprite_group)
+
+    inventory = game_components.inventory
+    inventory_surfaces = [inventory.font_surface_header]
+    inventory_surfaces.extend(sprite.image for sprite in inventory.all_item_fonts)
+    inventory_surfaces.extend(sprite.image for sprite in inventory.current_item_fonts)
+
+    return {
+        "stages": sum_surfaces(stage_surfaces),
+        "sprites": sum_surfaces(IMAGE_CACHE.surfaces()),
+        "menu": sum_surfaces(menu_surfaces),
+        "inventory": sum_surfaces(inventory_surfaces),
+        # the map draws directly into the window and caches no surfaces
+        "map": sum_surfaces([]),
+    }
+
+
+def collect_sounds() -> Dict[str, dict]:
+    from mixer import BASS_HIT_SOUND
+
+    sounds = [BASS_HIT_SOUND]
+    return {"mixer": {"count": len(sounds), "bytes": sum(sound_bytes(sound) for sound in sounds)}}
+
+
+def start_python_tracing() -> None:
+    """starts `tracemalloc`. call it before the game components get created, to see their allocations"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+
+
+class MemoryTracker:
+    """
+    Collects the memory report of the game. With `trace_python` the python allocations
+    are traced with `tracemalloc`, which slows the game down.
+    """
+
+    def __init__(self, game_components, trace_python: bool = False):
+        self.game_components = game_components
+        if trace_python:
+            start_python_tracing()
+        self.report: dict = {}
+
+    def python_allocations(self) -> Dict[str, int]:
+        """bytes of live python objects per subsystem from a `tracemalloc` snapshot"""
+        if not tracemalloc.is_tracing():
+            return {}
+        allocations = {subsystem: 0 for subsystem in SUBSYSTEM_MODULES}
+        allocations["other"] = 0
+        for statistic in tracemalloc.take_snapshot().statistics('filename'):
+            filename = statistic.traceback[0].filename
+            subsystem = next(
+                (name for name, modules in SUBSYSTEM_MODULES.items()
+                 if any(filename.endswith(module) for module in modules)),
+                "other"
+            )
+            allocations[subsystem] += statistic.size
+        return allocations
+
+    def update(self) -> dict:
+        """collects a new report"""
+        from models import ITEM_STORE
+
+        self.report = {
+            "surfaces": collect_surfaces(self.game_components),
+            "sounds": collect_sounds(),
+            "item_store": {"count": len(ITEM_STORE), "bytes": ITEM_STORE.nbytes()},
+            "python": self.python_allocations(),
+        }
+        return self.report
+
+    def export_json(self, path: Path) -> None:
+        with open(path, 'w') as fp:
+            json.dump(self.update(), fp, indent=2)
+
+    def debug_rows(self) -> List[dict]:
+        """returns the last report in the format of `Debug.display_debug_output`"""
+        rows = []
+        for group in ("surfaces", "sounds"):
+            for name, counted in self.report.get(group, {}).items():
+                rows.append({
+                    "name": f"Memory {name} {group}",
+                    "text": f"{counted['count']} / {counted['bytes'] / 1024:.0f} KiB"
+                })
+        if "item_store" in self.report:
+            rows.append({"name": "Memory item store", "text": f"{self.report['item_store']['bytes'] / 1024:.1f} KiB"})
+        for name, size in self.report.get("python", {}).items():
+            rows.append({"name": f"Memory {name} python", "text": f"{size / 1024:.0f} KiB"})
+        return rows
+
+
+def create_memory_tracker(game_components, trace_python: bool = False) -> MemoryTracker:
+    return MemoryTracker(game_components, trace_python)
@@ -1,15 +1,20 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Callable
+from typing import Dict, Callable, List, Optional
 
 import pygame
 
 from mixer import load_menu_background_music, add_music_volume, sub_music_volume, play_menu_button_action_sound
+from processes import is_worker_bootstrap
 
 pygame.font.init()
 SCREEN_SIZE = [1300, 900]
 GAME_DISPLAY = pygame.display
-GAME_DISPLAY.set_caption("GenericRpgV2")
-GAME_WINDOW = GAME_DISPLAY.set_mode(SCREEN_SIZE)
+if is_worker_bootstrap():
+    # worker processes import the game modules again, they never open a window
+    GAME_WINDOW = pygame.Surface(SCREEN_SIZE)
+else:
+    GAME_DISPLAY.set_caption("GenericRpgV2")
+    GAME_WINDOW = GAME_DISPLAY.set_mode(SCREEN_SIZE)
 GAME_CLOCK = pygame.time.Clock()
 
 
@@ -32,7 +37,8 @@ class MenuPage:
 
     def draw_page_name(self) -> None:
         """Draws the page name on top of the window"""
-        self.font_surface = self.set_font()
+        if self.font_surface is None:
+            self.font_surface = self.set_font()
 
         GAME_WINDOW.blit(
             self.font_surface,
@@ -47,6 +53,8 @@ class Menu:
     def __init__(self, pages: Dict[str, MenuPage]):
         self.pages = pages
         self.current_page = self.pages['page1']
+        # called with the rect of an action button, whenever its action sound plays
+        self.action_listeners: List[Callable[[pygame.Rect], None]] = []
 
 
 class MenuButton(ABC, pygame.sprite.Sprite):
@@ -166,6 +174,11 @@ class ProgressBar(ABC, pygame.sprite.Sprite):
         self.rect.x = pos[0]
         self.rect.y = pos[1]
 
+        self._value_percent = -1
+        self._font_surface = None
+        self._outer_rect = pygame.Rect(0, 0, 0, 0)
+        self._inner_rect = pygame.Rect(0, 0, 0, 0)
+
     def calculate_inner_bar_width(self, percent: int) -> int:
         """A function that calculates the progress width"""
         return int(percent * self.outer_size[0] / 100)
@@ -177,16 +190,16 @@ class ProgressBar(ABC, pygame.sprite.Sprite):
 
     def update(self, **kwargs):
         value_percent = self.calculate_inner_bar_percent()
-        value_text = str(value_percent) + "%"
-        font_surface = self.FONT.render(value_text, True, self.TEXT_COLOR)
-
-        progress_bar_outer_rect = pygame.Rect(
-            self.rect.x,
-            self.rect.y,
-            self.outer_size[0],
-            self.outer_size[1]
-        )
-        progress_bar_inner_rect = pygame.Rect(
+        # the text and the rects are only created again when the value changes
+        if value_percent != self._value_percent or self._font_surface is None:
+            self._value_percent = value_percent
+            self._font_surface = self.FONT.render(str(value_percent) + "%", True, self.TEXT_COLOR)
+        font_surface = self._font_surface
+
+        progress_bar_outer_rect = self._outer_rect
+        progress_bar_outer_rect.update(self.rect.x, self.rect.y, self.outer_size[0], self.outer_size[1])
+        progress_bar_inner_rect = self._inner_rect
+        progress_bar_inner_rect.update(
             self.rect.x + 1,
             self.rect.y + 1,
             self.calculate_inner_bar_width(value_percent),
@@ -228,8 +241,11 @@ class ActionButton(MenuButton):
         MenuButton.__init__(self, pos, size, text, color)
         self.action = action
 
-    def on_click(self, *args, **kwargs):
+    def on_click(self, menu: Optional[Menu] = None, *args, **kwargs):
         play_menu_button_action_sound()
+        if menu is not None:
+            for listener in menu.action_listeners:
+                listener(self.rect)
         self.action()
 
     @staticmethod
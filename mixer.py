@@ -2,8 +2,12 @@ from pathlib import Path
 
 import pygame
 
+from assets import load_sound
+from processes import is_worker_bootstrap
 
-pygame.mixer.init()
+# worker processes import the game modules again, they never open the audio device
+if not is_worker_bootstrap():
+    pygame.mixer.init()
 
 # PATHS
 MUSIC_PATH = Path.cwd() / 'resources' / 'music'
@@ -13,7 +17,7 @@ SOUND_PATH = Path.cwd() / 'resources' / 'sound'
 BASS_HIT = "bass-hit-rhythm.ogg"
 
 # PYGAME SOUNDS
-BASS_HIT_SOUND = pygame.mixer.Sound(SOUND_PATH / BASS_HIT)
+BASS_HIT_SOUND = load_sound(SOUND_PATH / BASS_HIT) if pygame.mixer.get_init() else None
 
 
 def load_menu_background_music() -> None:
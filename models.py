@@ -1,51 +1,167 @@
-import dataclasses
+from __future__ import annotations
+
 import inspect
 import json
-from dataclasses import dataclass, field
+from array import array
+from functools import total_ordering
 from pathlib import Path
 
-from typing import List, Union, NewType
+from typing import List, Optional, Tuple, Union, NewType
 
 
-@dataclass
 class BaseModel:
-    id: int = field(init=False, default=0)
+    """Base class of the slotted models. `FIELDS` are the public fields in repr and `to_dict` order"""
+    __slots__ = ()
+    FIELDS: Tuple[str, ...] = ()
 
     def __setitem__(self, key, value):
         setattr(self, key, value)
 
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.FIELDS)
+
+    __hash__ = None
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.FIELDS)
+        return f"{self.__class__.__name__}({values})"
+
+
+class ItemStore:
+    """
+    Columnar storage for items. Every column is an `array`, the names are stored utf-8 encoded
+    in one `bytearray` and referenced by offset and length.
+    Items are addressed by their row index, `ItemModel` is a view on one row. Every id has one row,
+    loading the same items again reuses their rows instead of growing the store.
+    """
+
+    def __init__(self):
+        self.ids = array('q')
+        self.damages = array('l')
+        self.name_offsets = array('q')
+        self.name_lengths = array('l')
+        self.names = bytearray()
+        self._counter = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, name: str, damage: int, item_id: Optional[int] = None) -> int:
+        """
+        adds an item with `item_id` or the next free id and returns its row index.
+        an existing `item_id` gets the new name and damage in its row
+        """
+        if item_id is None:
+            item_id = self._counter + 1
+        elif item_id <= self._counter:
+            # ids above the counter are new, the others may have a row already
+            try:
+                index = self.ids.index(item_id)
+            except ValueError:
+                pass
+            else:
+                self.set_name(index, name)
+                self.damages[index] = damage
+                return index
+        self._counter = max(self._counter, item_id)
+        encoded_name = name.encode()
+        self.ids.append(item_id)
+        self.damages.append(damage)
+        self.name_offsets.append(len(self.names))
+        self.name_lengths.append(len(encoded_name))
+        self.names += encoded_name
+        return len(self.ids) - 1
+
+    def get_name(self, index: int) -> str:
+        offset = self.name_offsets[index]
+        return self.names[offset:offset + self.name_lengths[index]].decode()
+
+    def set_name(self, index: int, name: str) -> None:
+        """overwrites the name in place, if it fits, otherwise appends it to the name buffer"""
+        encoded_name = name.encode()
+        if len(encoded_name) <= self.name_lengths[index]:
+            offset = self.name_offsets[index]
+            self.names[offset:offset + len(encoded_name)] = encoded_name
+        else:
+            self.name_offsets[index] = len(self.names)
+            self.names += encoded_name
+        self.name_lengths[index] = len(encoded_name)
+
+    def nbytes(self) -> int:
+        """bytes used by the columns and the name buffer"""
+        columns = (self.ids, self.damages, self.name_offsets, self.name_lengths)
+        return sum(column.buffer_info()[1] * column.itemsize for column in columns) + len(self.names)
+
 
-@dataclass
 class ItemModel(BaseModel):
-    _counter: int = field(init=False, repr=False, default=0)
-    name: str
-    damage: int = 5
+    """Lightweight view on one row of an `ItemStore`"""
+    __slots__ = ("store", "index")
+    FIELDS = ("id", "name", "damage")
+
+    def __init__(self, name: str, damage: int = 5, store: Optional[ItemStore] = None, id: Optional[int] = None):
+        self.store = store if store is not None else ITEM_STORE
+        self.index = self.store.append(name, damage, id)
+
+    @property
+    def id(self) -> int:
+        return self.store.ids[self.index]
+
+    @property
+    def name(self) -> str:
+        return self.store.get_name(self.index)
+
+    @name.setter
+    def name(self, name: str):
+        self.store.set_name(self.index, name)
 
-    def __post_init__(self):
-        ItemModel._counter += 1
-        self.id = ItemModel._counter
+    @property
+    def damage(self) -> int:
+        return self.store.damages[self.index]
 
+    @damage.setter
+    def damage(self, damage: int):
+        self.store.damages[self.index] = damage
 
-@dataclass(order=True)
+
+ITEM_STORE = ItemStore()
+
+
+@total_ordering
 class MainCharModel(BaseModel):
-    sort_index: int = field(init=False, repr=False)
-    _counter: int = field(init=False, repr=False, default=0)
-    current_item: ItemModel = field(init=False)
-    name: str
-    damage: int = 2
-    hp: int = 10
-    items: List[ItemModel] = field(default_factory=list)
-
-    def __post_init__(self):
-        self.sort_index = self.hp
-        MainCharModel._counter += 1
-        self.id = MainCharModel._counter
+    __slots__ = ("id", "current_item", "name", "damage", "hp", "items")
+    FIELDS = ("id", "current_item", "name", "damage", "hp", "items")
+    _counter = 0
+
+    def __init__(self, name: str, damage: int = 2, hp: int = 10, items: Optional[List[ItemModel]] = None,
+                 id: Optional[int] = None):
+        self.name = name
+        self.damage = damage
+        self.hp = hp
+        self.items = items if items is not None else []
+        if id is None:
+            id = MainCharModel._counter + 1
+        MainCharModel._counter = max(MainCharModel._counter, id)
+        self.id = id
 
         if not len(self.items):
             self.current_item = ItemModel(name="Hand")
         else:
             self.current_item = self.items[0]
 
+    @property
+    def sort_index(self) -> int:
+        return self.hp
+
+    def __lt__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.sort_index < other.sort_index
+
 
 class DataModel:
     PATHS = {
@@ -86,7 +202,7 @@ def load_data_from_json_file(path: Path) -> List[dict]:
         return json.load(fp)
 
 
-def create_dataclasses_from_json_data(datacls: dataclass, data: List[dict]) -> List[ModelUnion]:
+def create_dataclasses_from_json_data(datacls: type, data: List[dict]) -> List[ModelUnion]:
     """ returns a list of initialized dataclasses from json data"""
     return [from_dict_to_dataclass(datacls, data_row) for data_row in data]
 
@@ -100,8 +216,8 @@ def resolve_to_n_data(
     this allows the creation of 1:n data that gets resolved here
     """
     for dataclass_to_resolve in dataclasses_to_resolve:
-        for key, val in dataclasses.asdict(dataclass_to_resolve).items():
-            if key in field_names:
+        for key, val in dataclass_to_resolve.to_dict().items():
+            if key in field_names and not isinstance(val, BaseModel):
                 if isinstance(val, list):
                     resolve_list = []
                     for id in range(len(val)):
@@ -0,0 +1,742 @@
+"""
+Client/server multiplayer over UDP.
+
+The server is authoritative: it owns a `GameWorld`, moves one `MainChar` per client with the
+pressed keys the client sends and simulates the entities of the stages near a player. Every
+tick each client gets a snapshot of the entities in its current stage and the neighbor stages
+(interest management), nothing of the rest of the world.
+
+Snapshots are delta compressed: a client acknowledges the newest snapshot it decoded with
+every input packet, the server encodes the next snapshot against that one and leaves out the
+unchanged entities. Positions are quantized to `POSITION_QUANTUM` pixels, small moves take one
+byte per axis. Without an acknowledged snapshot the server sends a full one.
+
+Packets (little endian):
+- hello, client -> server: type, protocol version
+- welcome, server -> client: type, player entity id, world width, world height, world seed, tick rate
+- input, client -> server: type, input sequence, acknowledged snapshot tick, pressed key bits
+- snapshot, server -> client: type, tick, baseline tick (0 = full), last input sequence,
+  entity count, removed count, removed ids, entity records. Ids are sorted and sent as varint
+  differences to the previous id, a record is id, changed fields and the changed fields, the
+  stage index as varint
+- bye: type, either direction
+"""
+from __future__ import annotations
+
+import random
+import select
+import socket
+import struct
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import pygame
+
+from animation import CYCLE_IDLE, CYCLE_SPRINT, CYCLE_WALK, create_animated_sprite
+from game_world import GameStage, GameWorld, MainChar, MovementType, WalkDirection, load_data
+from layers import LAYER_ACTORS, wake_sprite
+from models import DataModel
+from pool import ObjectPool, create_sprite_pool
+from seeds import normalize_seed
+from simulation import ENTITY_FIELDS, MAX_STAGE_ENTITIES, STATE_ENTITY_COUNT, STATE_HEADER_FIELDS, \
+    add_stage_entity, step_stage_state
+from user_input import KeyState
+
+Address = Tuple[str, int]
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 47800
+PROTOCOL_VERSION = 1
+SERVER_TICK_RATE = 60  # ticks per second, the same as `GAME_FPS`, so walking has the same speed
+SNAPSHOT_INTERVAL = 1  # ticks between two snapshots
+SNAPSHOT_HISTORY = 64  # sent snapshots kept per client as possible baselines
+CLIENT_TIMEOUT = 5.0  # seconds without a packet until a client is dropped
+CONNECT_TIMEOUT = 5.0
+CONNECT_RETRY = 0.25
+METRICS_PERIOD = 1.0  # seconds per metrics window
+RECEIVE_BUFFER = 65536
+
+# PACKETS
+PACKET_HELLO = 1
+PACKET_WELCOME = 2
+PACKET_INPUT = 3
+PACKET_SNAPSHOT = 4
+PACKET_BYE = 5
+
+HELLO = struct.Struct("<BH")
+WELCOME = struct.Struct("<BIIIQH")
+INPUT = struct.Struct("<BIIB")
+SNAPSHOT_HEADER = struct.Struct("<BIIIHH")
+
+# ENTITY FIELDS
+FIELD_KIND = 1
+FIELD_STAGE = 2
+FIELD_POSITION = 4
+FIELD_SMALL_MOVE = 8  # position as difference to the baseline, one signed byte per axis
+FIELD_FLAGS = 16
+FIELDS_FULL = FIELD_KIND | FIELD_STAGE | FIELD_POSITION | FIELD_FLAGS
+
+FIELD_KIND_FORMAT = struct.Struct("<B")
+FIELD_POSITION_FORMAT = struct.Struct("<HH")
+FIELD_SMALL_MOVE_FORMAT = struct.Struct("<bb")
+FIELD_FLAGS_FORMAT = struct.Struct("<B")
+
+POSITION_QUANTUM = 0.25  # pixels, positions up to 16383 pixels fit into 16 bits
+MAX_QUANTIZED_POSITION = 0xFFFF
+
+# ENTITIES
+KIND_PLAYER = 0
+KIND_NPC = 1
+FLAG_FLIPPED = 1
+FLAG_SPRINT = 2
+NPC_ID_BASE = 1 << 24  # npc ids follow from stage index and slot, player ids count up from 1
+NPCS_PER_STAGE = 4
+NPC_SPEED = 60.0  # pixels per second
+KIND_SHEETS = {KIND_PLAYER: 'main_char', KIND_NPC: 'monster'}
+
+
+class EntityState(NamedTuple):
+    """quantized state of an entity as it is sent to the clients"""
+    kind: int
+    stage: int
+    x: int
+    y: int
+    flags: int
+
+
+class Welcome(NamedTuple):
+    player_id: int
+    # (0, 0) for the default stages
+    world_size: Tuple[int, int]
+    world_seed: int
+    tick_rate: int
+
+    @property
+    def generated_world_size(self) -> Optional[Tuple[int, int]]:
+        """the `world_size` argument of `create_game_world`"""
+        return self.world_size if self.world_size[0] and self.world_size[1] else None
+
+
+class Snapshot(NamedTuple):
+    tick: int
+    baseline_tick: int
+    last_input: int
+    entities: Dict[int, EntityState]
+
+
+def quantize(position: float) -> int:
+    return min(max(round(position / POSITION_QUANTUM), 0), MAX_QUANTIZED_POSITION)
+
+
+def dequantize(value: int) -> float:
+    return value * POSITION_QUANTUM
+
+
+def pack_varint(value: int, out: bytearray) -> None:
+    """appends `value` with 7 bits per byte, small numbers take one byte"""
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def unpack_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    """returns the value and the offset after it"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def encode_snapshot(tick: int, last_input: int, entities: Dict[int, EntityState],
+                    baseline_tick: int = 0, baseline: Optional[Dict[int, EntityState]] = None) -> bytes:
+    """encodes `entities`, only their changes to `baseline` if there is one"""
+    if baseline is None:
+        baseline = {}
+        baseline_tick = 0
+    out = bytearray(SNAPSHOT_HEADER.size)
+    removed = sorted(entity_id for entity_id in baseline if entity_id not in entities)
+    previous_id = 0
+    for entity_id in removed:
+        pack_varint(entity_id - previous_id, out)
+        previous_id = entity_id
+
+    count = 0
+    previous_id = 0
+    for entity_id in sorted(entities):
+        entity = entities[entity_id]
+        previous = baseline.get(entity_id)
+        if previous == entity:
+            continue
+        count += 1
+        if previous is None:
+            mask = FIELDS_FULL
+        else:
+            mask = 0
+            if previous.stage != entity.stage:
+                mask |= FIELD_STAGE | FIELD_POSITION
+            elif previous.x != entity.x or previous.y != entity.y:
+                dx = entity.x - previous.x
+                dy = entity.y - previous.y
+                mask |= FIELD_SMALL_MOVE if -128 <= dx < 128 and -128 <= dy < 128 else FIELD_POSITION
+            if previous.flags != entity.flags:
+                mask |= FIELD_FLAGS
+        pack_varint(entity_id - previous_id, out)
+        previous_id = entity_id
+        out.append(mask)
+        if mask & FIELD_KIND:
+            out += FIELD_KIND_FORMAT.pack(entity.kind)
+        if mask & FIELD_STAGE:
+            pack_varint(entity.stage, out)
+        if mask & FIELD_POSITION:
+            out += FIELD_POSITION_FORMAT.pack(entity.x, entity.y)
+        if mask & FIELD_SMALL_MOVE:
+            out += FIELD_SMALL_MOVE_FORMAT.pack(entity.x - previous.x, entity.y - previous.y)
+        if mask & FIELD_FLAGS:
+            out += FIELD_FLAGS_FORMAT.pack(entity.flags)
+    SNAPSHOT_HEADER.pack_into(out, 0, PACKET_SNAPSHOT, tick, baseline_tick, last_input, count, len(removed))
+    return bytes(out)
+
+
+def decode_snapshot(data: bytes, baselines: Dict[int, Dict[int, EntityState]]) -> Optional[Snapshot]:
+    """decodes a snapshot against its baseline in `baselines`. returns None, if the baseline is unknown"""
+    _, tick, baseline_tick, last_input, count, removed_count = SNAPSHOT_HEADER.unpack_from(data)
+    if baseline_tick:
+        if baseline_tick not in baselines:
+            return None
+        entities = dict(baselines[baseline_tick])
+    else:
+        entities = {}
+    offset = SNAPSHOT_HEADER.size
+    entity_id = 0
+    for _ in range(removed_count):
+        id_difference, offset = unpack_varint(data, offset)
+        entity_id += id_difference
+        entities.pop(entity_id, None)
+
+    entity_id = 0
+    for _ in range(count):
+        id_difference, offset = unpack_varint(data, offset)
+        entity_id += id_difference
+        mask = data[offset]
+        offset += 1
+        kind, stage, x, y, flags = entities.get(entity_id, (0, 0, 0, 0, 0))
+        if mask & FIELD_KIND:
+            kind = data[offset]
+            offset += FIELD_KIND_FORMAT.size
+        if mask & FIELD_STAGE:
+            stage, offset = unpack_varint(data, offset)
+        if mask & FIELD_POSITION:
+            x, y = FIELD_POSITION_FORMAT.unpack_from(data, offset)
+            offset += FIELD_POSITION_FORMAT.size
+        if mask & FIELD_SMALL_MOVE:
+            dx, dy = FIELD_SMALL_MOVE_FORMAT.unpack_from(data, offset)
+            x += dx
+            y += dy
+            offset += FIELD_SMALL_MOVE_FORMAT.size
+        if mask & FIELD_FLAGS:
+            flags = data[offset]
+            offset += FIELD_FLAGS_FORMAT.size
+        entities[entity_id] = EntityState(kind, stage, x, y, flags)
+    return Snapshot(tick, baseline_tick, last_input, entities)
+
+
+def parse_address(text: str) -> Address:
+    """parses `HOST:PORT`, `:PORT` or `PORT`"""
+    host, _, port = text.rpartition(":")
+    return host or DEFAULT_HOST, int(port)
+
+
+class TrafficMeter:
+    """Counts the sent and received bytes. The rates are those of the last finished `METRICS_PERIOD`"""
+
+    def __init__(self):
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.packets_sent = 0
+        self.packets_received = 0
+        self.sent_rate = 0.0
+        self.received_rate = 0.0
+        self._window_start = time.perf_counter()
+        self._window_sent = 0
+        self._window_received = 0
+
+    def count_sent(self, size: int) -> None:
+        self.bytes_sent += size
+        self.packets_sent += 1
+
+    def count_received(self, size: int) -> None:
+        self.bytes_received += size
+        self.packets_received += 1
+
+    def update(self, now: float) -> Optional[float]:
+        """finishes the window, if it is over. returns its length in seconds"""
+        seconds = now - self._window_start
+        if seconds < METRICS_PERIOD:
+            return None
+        self.sent_rate = (self.bytes_sent - self._window_sent) / seconds
+        self.received_rate = (self.bytes_received - self._window_received) / seconds
+        self._window_start = now
+        self._window_sent = self.bytes_sent
+        self._window_received = self.bytes_received
+        return seconds
+
+
+class ClientConnection:
+    """
+    A client on the server and its player. The connection has a `current_stage`
+    like a `GameWorld`, so `MainChar.solve_for_walking` moves the player through the stages.
+    The player uses the `data` of the server
+    """
+
+    def __init__(self, player_id: int, address: Address, stage: GameStage, now: float, data: DataModel):
+        self.player_id = player_id
+        self.address = address
+        self.current_stage = stage
+        self.sprite = MainChar([0, 200], data=data)
+        self.pressed = KeyState()
+        self.last_input = 0
+        self.acked_tick = 0
+        self.last_seen = now
+        # tick -> entities of the snapshot sent in that tick
+        self.sent_snapshots: Dict[int, Dict[int, EntityState]] = {}
+        self.bytes_sent = 0
+
+
+class NetworkServer:
+    """
+    Authoritative server for the stages of `game_world`.
+
+    ## Arguments
+    - `address`, host and port to listen on, port 0 picks a free port
+    - `world_size`, `world_seed`, told to the clients, so they create the same world
+    - `report`, called with the connects, disconnects and the metrics of every `METRICS_PERIOD`
+    """
+
+    def __init__(self, game_world: GameWorld, address: Address = (DEFAULT_HOST, DEFAULT_PORT),
+                 world_size: Optional[Tuple[int, int]] = None, world_seed: int = 0,
+                 tick_rate: int = SERVER_TICK_RATE, snapshot_interval: int = SNAPSHOT_INTERVAL,
+                 report: Optional[Callable[[str], None]] = None):
+        self.game_world = game_world
+        self.report = report
+        self.world_size = world_size or (0, 0)
+        # the welcome packet stores the seed unsigned
+        self.world_seed = normalize_seed(world_seed)
+        self.tick_rate = tick_rate
+        self.tick_interval = 1 / tick_rate
+        self.snapshot_interval = snapshot_interval
+        self.stage_indices = {id(stage): index for index, stage in enumerate(game_world.stages)}
+        # loaded once for all players, a connect reads no files and adds no items
+        self.data = load_data()
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(address)
+        self.socket.setblocking(False)
+        self.address: Address = self.socket.getsockname()
+
+        self.clients: Dict[Address, ClientConnection] = {}
+        self._next_player_id = 1
+        self.tick = 0
+        self.traffic = TrafficMeter()
+        self.full_snapshots = 0
+        self.delta_snapshots = 0
+        self.snapshot_entities = 0
+        self.tick_time_total = 0.0
+        self.tick_time_max = 0.0
+        self.measured_tick_rate = 0.0
+        self._window_tick = 0
+
+    def send(self, data: bytes, address: Address) -> None:
+        try:
+            self.socket.sendto(data, address)
+        except OSError:
+            # a full send buffer drops the packet like the network would, the client catches up
+            return
+        self.traffic.count_sent(len(data))
+
+    def receive(self) -> None:
+        """handles all waiting packets"""
+        now = time.perf_counter()
+        while True:
+            try:
+                data, address = self.socket.recvfrom(RECEIVE_BUFFER)
+            except (BlockingIOError, ConnectionResetError):
+                return
+            self.traffic.count_received(len(data))
+            if not data:
+                continue
+            packet_type = data[0]
+            client = self.clients.get(address)
+            if packet_type == PACKET_HELLO and len(data) == HELLO.size:
+                if HELLO.unpack(data)[1] != PROTOCOL_VERSION:
+                    continue
+                if client is None:
+                    client = self.connect(address, now)
+                self.send(WELCOME.pack(PACKET_WELCOME, client.player_id, *self.world_size,
+                                       self.world_seed, self.tick_rate), address)
+            elif client is None:
+                continue
+            elif packet_type == PACKET_INPUT and len(data) == INPUT.size:
+                _, sequence, acked_tick, key_bits = INPUT.unpack(data)
+                client.last_seen = now
+                # udp may reorder packets, older inputs and acks are ignored
+                if sequence > client.last_input:
+                    client.last_input = sequence
+                    client.pressed = KeyState(key_bits)
+                if acked_tick > client.acked_tick:
+                    client.acked_tick = acked_tick
+            elif packet_type == PACKET_BYE:
+                self.disconnect(client)
+
+    def connect(self, address: Address, now: float) -> ClientConnection:
+        client = ClientConnection(self._next_player_id, address, self.game_world.stages[0], now, self.data)
+        self._next_player_id += 1
+        self.clients[address] = client
+        if self.report:
+            self.report(f"Player {client.player_id} connected from {address[0]}:{address[1]}")
+        return client
+
+    def disconnect(self, client: ClientConnection) -> None:
+        del self.clients[client.address]
+        if self.report:
+            self.report(f"Player {client.player_id} disconnected")
+
+    def move_players(self) -> None:
+        """walks the players like `handle_walking` does in single player"""
+        for client in self.clients.values():
+            sprite = client.sprite
+            sprite.movement_type = MovementType.SPRINT if client.pressed[pygame.K_LSHIFT] else MovementType.WALK
+            for key, name in MainChar.MAPPED_WALKING.items():
+                if client.pressed[key]:
+                    sprite.solve_for_walking(name, client, client.pressed)
+
+    def interest_stages(self, stage: GameStage) -> List[GameStage]:
+        """the stages a player in `stage` gets the entities of"""
+        return [
+            neighbor for neighbor in (
+                stage, stage.top_stage, stage.bottom_stage, stage.left_stage, stage.right_stage
+            ) if neighbor is not None
+        ]
+
+    def populate_stage(self, stage: GameStage) -> None:
+        """adds the npcs of a stage when a player comes near it the first time"""
+        rng = random.Random(self.world_seed * 1_000_003 + self.stage_indices[id(stage)])
+        for _ in range(NPCS_PER_STAGE):
+            add_stage_entity(
+                stage.state,
+                (rng.uniform(0, stage.size[0]), rng.uniform(0, stage.size[1])),
+                (rng.uniform(-NPC_SPEED, NPC_SPEED), rng.uniform(-NPC_SPEED, NPC_SPEED))
+            )
+
+    def simulate_stages(self, stages: Set[GameStage]) -> None:
+        for stage in stages:
+            if not stage.has_state:
+                self.populate_stage(stage)
+            step_stage_state(stage.state, self.tick_interval, stage.size)
+
+    def stage_entities(self, stage: GameStage, players: Dict[int, List[ClientConnection]]) -> Dict[int, EntityState]:
+        stage_index = self.stage_indices[id(stage)]
+        entities = {}
+        for client in players.get(stage_index, ()):
+            sprite = client.sprite
+            flags = (FLAG_FLIPPED if sprite.image_flipped else 0) | \
+                    (FLAG_SPRINT if sprite.movement_type is MovementType.SPRINT else 0)
+            entities[client.player_id] = EntityState(
+                KIND_PLAYER, stage_index, quantize(sprite.rect.x), quantize(sprite.rect.y), flags
+            )
+        if stage.has_state:
+            state = stage.state
+            first_id = NPC_ID_BASE + stage_index * MAX_STAGE_ENTITIES
+            for slot in range(int(state[STATE_ENTITY_COUNT])):
+                offset = STATE_HEADER_FIELDS + slot * ENTITY_FIELDS
+                flags = FLAG_FLIPPED if state[offset + 2] < 0 else 0
+                entities[first_id + slot] = EntityState(
+                    KIND_NPC, stage_index, quantize(state[offset]), quantize(state[offset + 1]), flags
+                )
+        return entities
+
+    def send_snapshots(self) -> None:
+        players: Dict[int, List[ClientConnection]] = {}
+        for client in self.clients.values():
+            players.setdefault(self.stage_indices[id(client.current_stage)], []).append(client)
+        # every stage is collected once per tick, even if several players see it
+        stage_entities: Dict[int, Dict[int, EntityState]] = {}
+        for client in self.clients.values():
+            entities = {}
+            for stage in self.interest_stages(client.current_stage):
+                stage_index = self.stage_indices[id(stage)]
+                if stage_index not in stage_entities:
+                    stage_entities[stage_index] = self.stage_entities(stage, players)
+                entities.update(stage_entities[stage_index])
+
+            baseline = client.sent_snapshots.get(client.acked_tick)
+            data = encode_snapshot(self.tick, client.last_input, entities, client.acked_tick, baseline)
+            self.send(data, client.address)
+            client.bytes_sent += len(data)
+            if baseline is None:
+                self.full_snapshots += 1
+            else:
+                self.delta_snapshots += 1
+            self.snapshot_entities += len(entities)
+
+            client.sent_snapshots[self.tick] = entities
+            # older snapshots than the acknowledged one are never a baseline again
+            for tick in [tick for tick in client.sent_snapshots
+                         if tick < client.acked_tick or tick <= self.tick - SNAPSHOT_HISTORY]:
+                del client.sent_snapshots[tick]
+
+    def step(self) -> None:
+        """runs one tick: moves the players, simulates the stages near them and sends the snapshots"""
+        tick_start = time.perf_counter()
+        self.tick += 1
+        for client in [client for client in self.clients.values()
+                       if tick_start - client.last_seen > CLIENT_TIMEOUT]:
+            self.disconnect(client)
+        self.move_players()
+        self.simulate_stages({
+            stage for client in self.clients.values() for stage in self.interest_stages(client.current_stage)
+        })
+        if self.tick % self.snapshot_interval == 0:
+            self.send_snapshots()
+        tick_time = time.perf_counter() - tick_start
+        self.tick_time_total += tick_time
+        self.tick_time_max = max(self.tick_time_max, tick_time)
+
+    def update_metrics(self, now: float) -> bool:
+        """returns true, when a metrics window is finished"""
+        seconds = self.traffic.update(now)
+        if seconds is None:
+            return False
+        self.measured_tick_rate = (self.tick - self._window_tick) / seconds
+        self._window_tick = self.tick
+        return True
+
+    def metrics_text(self) -> str:
+        snapshots = self.full_snapshots + self.delta_snapshots
+        return (
+            f"tick {self.tick} at {self.measured_tick_rate:.1f}/s "
+            f"(avg {self.tick_time_total / max(self.tick, 1) * 1000:.2f} ms, max {self.tick_time_max * 1000:.2f} ms), "
+            f"clients {len(self.clients)}, "
+            f"out {self.traffic.sent_rate / 1024:.1f} KiB/s, in {self.traffic.received_rate / 1024:.1f} KiB/s, "
+            f"snapshots {self.delta_snapshots} delta / {self.full_snapshots} full, "
+            f"avg {self.snapshot_entities / max(snapshots, 1):.1f} entities"
+        )
+
+    def run(self, ticks: Optional[int] = None) -> None:
+        """
+        runs ticks at `tick_rate` and handles the packets in between.
+        runs forever without `ticks`, the metrics go to `report` every `METRICS_PERIOD`
+        """
+        next_tick = time.perf_counter()
+        while ticks is None or self.tick < ticks:
+            self.receive()
+            self.step()
+            next_tick += self.tick_interval
+            now = time.perf_counter()
+            if next_tick < now - self.tick_interval:
+                # the server fell behind, it does not try to catch up with a burst of ticks
+                next_tick = now
+            while now < next_tick:
+                select.select([self.socket], [], [], next_tick - now)
+                self.receive()
+                now = time.perf_counter()
+            if self.update_metrics(now) and self.report:
+                self.report(self.metrics_text())
+
+    def close(self) -> None:
+        for client in list(self.clients.values()):
+            self.send(bytes([PACKET_BYE]), client.address)
+        self.clients.clear()
+        self.socket.close()
+
+
+class NetworkClient:
+    """
+    Sends the pressed keys to a `NetworkServer` and decodes its snapshots.
+    `update` applies the newest snapshot to a `GameWorld` and keeps a sprite for every
+    other entity in the current stage in `remote_sprites`, they are actors of the stage layers.
+    """
+
+    def __init__(self, server_address: Address):
+        self.server_address = server_address
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.connect(server_address)
+        self.socket.setblocking(False)
+        self.welcome: Optional[Welcome] = None
+        self.input_sequence = 0
+        self.snapshot: Optional[Snapshot] = None
+        # tick -> entities, the possible baselines of the next snapshots
+        self.received_snapshots: Dict[int, Dict[int, EntityState]] = {}
+        self.traffic = TrafficMeter()
+        self.snapshots = 0
+        self.dropped_snapshots = 0
+        self.round_trip_time = 0.0
+        self._input_times: Dict[int, float] = {}
+        self._applied_tick = 0
+        self._window_snapshots = 0
+        self.snapshot_rate = 0.0
+
+        self.remote_sprites = pygame.sprite.Group()
+        self._sprite_pool: ObjectPool = create_sprite_pool(create_animated_sprite)
+        self._entity_sprites: Dict[int, pygame.sprite.Sprite] = {}
+        self._sprite_stage = -1
+
+    @property
+    def player_id(self) -> int:
+        return self.welcome.player_id if self.welcome else 0
+
+    def send(self, data: bytes) -> None:
+        try:
+            self.socket.send(data)
+        except OSError:
+            return
+        self.traffic.count_sent(len(data))
+
+    def connect(self, timeout: float = CONNECT_TIMEOUT) -> Welcome:
+        """says hello until the server answers"""
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            self.send(HELLO.pack(PACKET_HELLO, PROTOCOL_VERSION))
+            select.select([self.socket], [], [], CONNECT_RETRY)
+            self.receive()
+            if self.welcome:
+                return self.welcome
+        raise ConnectionError(f"no answer from {self.server_address[0]}:{self.server_address[1]}")
+
+    def receive(self) -> bool:
+        """handles all waiting packets. returns true, if there is a newer snapshot"""
+        newer = False
+        while True:
+            try:
+                data = self.socket.recv(RECEIVE_BUFFER)
+            except (BlockingIOError, ConnectionRefusedError, ConnectionResetError):
+                return newer
+            self.traffic.count_received(len(data))
+            if not data:
+                continue
+            if data[0] == PACKET_WELCOME and len(data) == WELCOME.size:
+                _, player_id, width, height, seed, tick_rate = WELCOME.unpack(data)
+                self.welcome = Welcome(player_id, (width, height), seed, tick_rate)
+            elif data[0] == PACKET_SNAPSHOT:
+                newer = self.handle_snapshot(data) or newer
+            elif data[0] == PACKET_BYE:
+                self.welcome = None
+
+    def handle_snapshot(self, data: bytes) -> bool:
+        snapshot = decode_snapshot(data, self.received_snapshots)
+        if snapshot is None:
+            self.dropped_snapshots += 1
+            return False
+        self.snapshots += 1
+        self.received_snapshots[snapshot.tick] = snapshot.entities
+        # the server never goes back to an older baseline than the one it used
+        for tick in [tick for tick in self.received_snapshots
+                     if tick < snapshot.baseline_tick or tick <= snapshot.tick - SNAPSHOT_HISTORY]:
+            del self.received_snapshots[tick]
+        sent_time = self._input_times.pop(snapshot.last_input, None)
+        if sent_time is not None:
+            self.round_trip_time = time.perf_counter() - sent_time
+        if self.snapshot is not None and snapshot.tick <= self.snapshot.tick:
+            return False
+        self.snapshot = snapshot
+        return True
+
+    def send_input(self, pressed: KeyState) -> None:
+        """sends the pressed keys of a frame and acknowledges the newest snapshot"""
+        self.input_sequence += 1
+        acked_tick = self.snapshot.tick if self.snapshot else 0
+        self.send(INPUT.pack(PACKET_INPUT, self.input_sequence, acked_tick, pressed.bits))
+        self._input_times[self.input_sequence] = time.perf_counter()
+        if len(self._input_times) > SNAPSHOT_HISTORY:
+            del self._input_times[min(self._input_times)]
+
+    def update(self, game_world: Optional[GameWorld] = None, dt: float = 0.0) -> None:
+        """receives the snapshots and applies the newest one to `game_world`"""
+        if self.receive() and game_world is not None:
+            self.apply_snapshot(game_world)
+        now = time.perf_counter()
+        seconds = self.traffic.update(now)
+        if seconds is not None:
+            self.snapshot_rate = (self.snapshots - self._window_snapshots) / seconds
+            self._window_snapshots = self.snapshots
+
+    def apply_snapshot(self, game_world: GameWorld) -> None:
+        """moves the main char to its server position and updates the sprites of the other entities"""
+        if self.snapshot.tick == self._applied_tick:
+            return
+        self._applied_tick = self.snapshot.tick
+        entities = self.snapshot.entities
+        player = entities.get(self.player_id)
+        if player is not None:
+            game_world.current_stage = game_world.stages[player.stage]
+            main_char = game_world.current_stage.sprite_group.sprite
+            position = (round(dequantize(player.x)), round(dequantize(player.y)))
+            # the walk cycle runs on until a snapshot without movement, not only in the frames of snapshots
+            main_char.moving = position != (main_char.rect.x, main_char.rect.y)
+            main_char.rect.x, main_char.rect.y = position
+            flipped = bool(player.flags & FLAG_FLIPPED)
+            if flipped != main_char.image_flipped:
+                main_char.walk_direction = WalkDirection.LEFT if flipped else WalkDirection.RIGHT
+            main_char.movement_type = MovementType.SPRINT if player.flags & FLAG_SPRINT else MovementType.WALK
+
+        stage_index = player.stage if player is not None else -1
+        if stage_index != self._sprite_stage:
+            # the sprites are actors of the layers of the stage they were created in
+            self._sprite_pool.release_all(self._entity_sprites.values())
+            self._entity_sprites.clear()
+            self._sprite_stage = stage_index
+        visible = {
+            entity_id: entity for entity_id, entity in entities.items()
+            if entity.stage == stage_index and entity_id != self.player_id
+        }
+        for entity_id in [entity_id for entity_id in self._entity_sprites if entity_id not in visible]:
+            self._sprite_pool.release(self._entity_sprites.pop(entity_id))
+        for entity_id, entity in visible.items():
+            x = round(dequantize(entity.x))
+            y = round(dequantize(entity.y))
+            sprite = self._entity_sprites.get(entity_id)
+            moving = sprite is not None and (x, y) != (sprite.rect.x, sprite.rect.y)
+            if sprite is None:
+                sprite = self._entity_sprites[entity_id] = self._sprite_pool.acquire()
+                self.remote_sprites.add(sprite)
+                game_world.current_stage.layers.add(sprite, LAYER_ACTORS)
+            if not moving:
+                cycle_name = CYCLE_IDLE
+            elif entity.flags & FLAG_SPRINT:
+                cycle_name = CYCLE_SPRINT
+            else:
+                cycle_name = CYCLE_WALK
+            sprite.animator.play(cycle_name, bool(entity.flags & FLAG_FLIPPED), KIND_SHEETS[entity.kind])
+            sprite.rect.size = sprite.image.get_size()
+            sprite.rect.x = x
+            sprite.rect.y = y
+            wake_sprite(sprite)
+
+    def close(self) -> None:
+        self.send(bytes([PACKET_BYE]))
+        self.socket.close()
+
+    def debug_rows(self) -> List[dict]:
+        """returns the network stats in the format of `Debug.display_debug_output`"""
+        return [
+            {"name": "Player", "text": self.player_id},
+            {"name": "Snapshots", "text": f"{self.snapshot_rate:.0f}/s ({self.dropped_snapshots} dropped)"},
+            {"name": "Network In/Out",
+             "text": f"{self.traffic.received_rate / 1024:.1f} / {self.traffic.sent_rate / 1024:.1f} KiB/s"},
+            {"name": "Round Trip", "text": f"{self.round_trip_time * 1000:.1f} ms"},
+            {"name": "Entities", "text": len(self.snapshot.entities) if self.snapshot else 0},
+        ]
+
+
+def create_network_server(game_world: GameWorld, address: Address, world_size: Optional[Tuple[int, int]],
+                          world_seed: int, report: Optional[Callable[[str], None]] = None) -> NetworkServer:
+    return NetworkServer(game_world, address, world_size, world_seed, report=report)
+
+
+def create_network_client(server_address: Address) -> NetworkClient:
+    return NetworkClient(server_address)
@@ -0,0 +1,236 @@
+"""
+Particle effects in NumPy arrays.
+
+A `ParticleSystem` keeps the live particles packed at the front of fixed size arrays and moves,
+ages and removes all of them with a few array operations per frame. Drawing blends all pixels
+with one gather and one scatter over the pixel buffer of the surface (the buffer `pygame.surfarray`
+wraps), whole 32 bit pixels or single bytes for other depths. No particle is a sprite or a surface.
+Both the live particles (`MAX_PARTICLES`) and the particles emitted per frame (`EMIT_BUDGET`) are
+capped, emitting over the budget drops the rest of the burst.
+"""
+import sys
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pygame
+
+from animation import CYCLE_SPRINT
+from seeds import normalize_seed
+
+MAX_PARTICLES = 8192
+EMIT_BUDGET = 2048  # new particles per frame and system
+SPRINT_DUST_RATE = 60.0  # particles per second while sprinting
+
+
+class ParticleEffect(NamedTuple):
+    count: int
+    speed: Tuple[float, float]  # pixels per second
+    lifetime: Tuple[float, float]  # seconds
+    color: Tuple[int, int, int]
+    # direction range in radians, 0 is right and pi / 2 is down
+    angle: Tuple[float, float] = (0.0, 2 * np.pi)
+    gravity: float = 0.0  # pixels per second squared, downwards
+    drag: float = 0.0  # part of the speed lost per second
+    size: int = 2  # square particles of 1 or 2 pixels
+
+
+# EFFECTS
+HIT_SPARKS = ParticleEffect(48, (150.0, 420.0), (0.15, 0.4), (255, 210, 90), gravity=600.0, drag=2.0)
+SPRINT_DUST = ParticleEffect(1, (20.0, 60.0), (0.3, 0.7), (170, 150, 120), (np.pi, 2 * np.pi), -20.0, 3.0)
+MENU_CLICK = ParticleEffect(96, (80.0, 260.0), (0.2, 0.5), (210, 255, 210), drag=4.0, size=1)
+
+
+class ParticleSystem:
+    """
+    Particles in one coordinate space, stage coordinates for the world or window coordinates.
+
+    ## Arguments
+    - `capacity`, the most live particles
+    - `emit_budget`, the most new particles per frame
+    - `seed`, seed of the random directions, speeds and lifetimes
+    """
+
+    def __init__(self, capacity: int = MAX_PARTICLES, emit_budget: int = EMIT_BUDGET, seed: Optional[int] = None):
+        self.capacity = capacity
+        self.emit_budget = emit_budget
+        # numpy seeds are never negative, the world seed may be
+        self.rng = np.random.default_rng(normalize_seed(seed) if seed is not None else None)
+        self.count = 0
+        self.dropped = 0
+        self._emitted = 0
+
+        self.position = np.zeros((capacity, 2), np.float32)
+        self.velocity = np.zeros((capacity, 2), np.float32)
+        self.life = np.zeros(capacity, np.float32)
+        self.lifetime = np.ones(capacity, np.float32)
+        self.gravity = np.zeros(capacity, np.float32)
+        self.drag = np.zeros(capacity, np.float32)
+        self.color = np.zeros((capacity, 3), np.uint8)
+        self.size = np.zeros(capacity, np.uint8)
+        self._arrays = (self.position, self.velocity, self.life, self.lifetime, self.gravity, self.drag,
+                        self.color, self.size)
+
+    def emit(self, effect: ParticleEffect, pos: Sequence[float], count: Optional[int] = None) -> int:
+        """adds a burst of `effect` at `pos`. returns the number of particles that fit into the budgets"""
+        requested = effect.count if count is None else count
+        n = max(0, min(requested, self.capacity - self.count, self.emit_budget - self._emitted))
+        self.dropped += requested - n
+        if not n:
+            return 0
+        self._emitted += n
+        new = slice(self.count, self.count + n)
+        angle = self.rng.uniform(effect.angle[0], effect.angle[1], n)
+        speed = self.rng.uniform(effect.speed[0], effect.speed[1], n)
+        self.position[new] = pos
+        self.velocity[new, 0] = np.cos(angle) * speed
+        self.velocity[new, 1] = np.sin(angle) * speed
+        self.life[new] = self.lifetime[new] = self.rng.uniform(effect.lifetime[0], effect.lifetime[1], n)
+        self.gravity[new] = effect.gravity
+        self.drag[new] = effect.drag
+        self.color[new] = effect.color
+        self.size[new] = effect.size
+        self.count += n
+        return n
+
+    def update(self, dt: float) -> None:
+        """moves and ages all particles by `dt` seconds, removes the dead ones and opens the emit budget"""
+        self._emitted = 0
+        n = self.count
+        if not n:
+            return
+        velocity = self.velocity[:n]
+        velocity[:, 1] += self.gravity[:n] * dt
+        velocity *= np.maximum(1 - self.drag[:n] * dt, 0)[:, None]
+        self.position[:n] += velocity * dt
+        life = self.life[:n]
+        life -= dt
+
+        alive = life > 0
+        alive_count = int(np.count_nonzero(alive))
+        if alive_count < n:
+            # compaction keeps the live particles in the first `count` slots
+            for array in self._arrays:
+                array[:alive_count] = array[:n][alive]
+            self.count = alive_count
+
+    def clear(self) -> None:
+        self.count = 0
+
+    def draw(self, surface: pygame.Surface, offset: Sequence[int] = (0, 0), scale: float = 1.0) -> int:
+        """
+        blends the particles into `surface`, they fade out over their lifetime. `offset` and `scale`
+        map the particle positions to the surface like `Camera.offset` and `Camera.scale`.
+        returns the number of drawn particles
+        """
+        n = self.count
+        if not n:
+            return 0
+        width, height = surface.get_size()
+        x = (self.position[:n, 0] * scale + offset[0]).astype(np.intp)
+        y = (self.position[:n, 1] * scale + offset[1]).astype(np.intp)
+        inside = (x >= 0) & (x < width - 1) & (y >= 0) & (y < height - 1)
+        bytesize = surface.get_bytesize()
+        pitch = surface.get_pitch()
+        pixel_offsets = y[inside] * pitch + x[inside] * bytesize
+        alpha = (self.life[:n] / self.lifetime[:n] * 256).astype(np.int16)[inside]
+        color = self.color[:n][inside].astype(np.int16)
+        drawn = len(pixel_offsets)
+
+        # the other three pixels of the 2x2 particles
+        large = self.size[:n][inside] > 1
+        if large.any():
+            large_offsets = pixel_offsets[large]
+            pixel_offsets = np.concatenate(
+                (pixel_offsets, large_offsets + bytesize, large_offsets + pitch, large_offsets + pitch + bytesize)
+            )
+            alpha = np.concatenate((alpha, np.tile(alpha[large], 3)))
+            color = np.concatenate((color, np.tile(color[large], (3, 1))))
+
+        pixels = np.asarray(surface.get_view("0"))
+        try:
+            if bytesize == 4:
+                blend_pixels(pixels.view(np.uint32), pixel_offsets >> 2, color, alpha, surface.get_shifts()[:3])
+            else:
+                blend_bytes(pixels, pixel_offsets, color, alpha, channel_offsets(surface))
+        finally:
+            # the surface stays locked while the pixel array exists
+            del pixels
+        return drawn
+
+
+def blend_pixels(pixels: np.ndarray, indices: np.ndarray, color: np.ndarray, alpha: np.ndarray,
+                 shifts: Sequence[int]) -> None:
+    """blends `color` into the 32 bit `pixels` at `indices`, with `alpha` from 0 to 256"""
+    background = pixels[indices]
+    blended = background.copy()
+    alpha = alpha.astype(np.int32)
+    for channel, shift in enumerate(shifts):
+        value = (background >> shift & 0xFF).astype(np.int32)
+        value += (color[:, channel] - value) * alpha >> 8
+        blended &= ~np.uint32(0xFF << shift)
+        blended |= value.astype(np.uint32) << shift
+    pixels[indices] = blended
+
+
+def blend_bytes(pixels: np.ndarray, pixel_offsets: np.ndarray, color: np.ndarray, alpha: np.ndarray,
+                offsets: np.ndarray) -> None:
+    """like `blend_pixels` for the raw bytes of surfaces with other pixel sizes"""
+    indices = (pixel_offsets[:, None] + offsets).ravel()
+    background = pixels[indices].astype(np.int32)
+    pixels[indices] = background + ((color.ravel() - background) * alpha.astype(np.int32).repeat(3) >> 8)
+
+
+def channel_offsets(surface: pygame.Surface) -> np.ndarray:
+    """byte offsets of red, green and blue in a pixel of `surface`"""
+    shifts = np.array(surface.get_shifts()[:3]) // 8
+    if sys.byteorder == "big":
+        shifts = surface.get_bytesize() - 1 - shifts
+    return shifts
+
+
+class GameParticles:
+    """
+    The particle effects of the game: hit sparks and sprint dust in the stage, click effects on
+    the menu buttons in window coordinates.
+    """
+
+    def __init__(self, capacity: int = MAX_PARTICLES, seed: Optional[int] = None):
+        self.world = ParticleSystem(capacity, seed=seed)
+        self.screen = ParticleSystem(capacity // 4, seed=seed)
+        self._dust_time = 0.0
+
+    def emit_hit_sparks(self, pos: Sequence[float]) -> int:
+        """sparks at `pos` in stage coordinates"""
+        return self.world.emit(HIT_SPARKS, pos)
+
+    def on_menu_action(self, rect: pygame.Rect) -> None:
+        """listener of `Menu.action_listeners`, bursts around the clicked button"""
+        self.screen.emit(MENU_CLICK, rect.center)
+
+    def on_stage_change(self, previous_stage, new_stage) -> None:
+        """the world particles belong to the stage they were emitted in"""
+        self.world.clear()
+
+    def update(self, dt: float, main_char: Optional[pygame.sprite.Sprite] = None) -> None:
+        """emits the dust of a sprinting `main_char` and moves all particles"""
+        if main_char is not None and main_char.animator.cycle_name == CYCLE_SPRINT:
+            self._dust_time += dt
+            dust_count = int(self._dust_time * SPRINT_DUST_RATE)
+            if dust_count:
+                self._dust_time -= dust_count / SPRINT_DUST_RATE
+                self.world.emit(SPRINT_DUST, main_char.rect.midbottom, dust_count)
+        else:
+            self._dust_time = 0.0
+        self.world.update(dt)
+        self.screen.update(dt)
+
+    def debug_rows(self) -> List[dict]:
+        """returns the particle counts in the format of `Debug.display_debug_output`"""
+        return [
+            {"name": "Particles", "text": f"{self.world.count} world, {self.screen.count} screen"},
+            {"name": "Particles Dropped", "text": self.world.dropped + self.screen.dropped},
+        ]
+
+
+def create_game_particles(seed: Optional[int] = None) -> GameParticles:
+    return GameParticles(seed=seed)
@@ -0,0 +1,61 @@
+from typing import Callable, Generic, Iterable, List, Optional, TypeVar
+
+import pygame
+
+T = TypeVar("T")
+
+DEFAULT_POOL_SIZE = 1024
+
+
+class ObjectPool(Generic[T]):
+    """
+    Keeps released objects for reuse, so short lived objects (projectiles, particles, sprites)
+    do not allocate new python objects every frame and do not trigger the cyclic garbage collector.
+
+    ## Arguments
+    - `factory`, creates a new object when the pool is empty
+    - `reset`, called with every released object, e.g. to remove a sprite from its groups
+    - `max_size`, released objects beyond this size are dropped
+    """
+
+    def __init__(self, factory: Callable[[], T], reset: Optional[Callable[[T], None]] = None,
+                 max_size: int = DEFAULT_POOL_SIZE):
+        self.factory = factory
+        self.reset = reset
+        self.max_size = max_size
+        self.free: List[T] = []
+        self.created = 0
+        self.reused = 0
+
+    def __len__(self) -> int:
+        return len(self.free)
+
+    def acquire(self) -> T:
+        if self.free:
+            self.reused += 1
+            return self.free.pop()
+        self.created += 1
+        return self.factory()
+
+    def release(self, obj: T) -> None:
+        if self.reset is not None:
+            self.reset(obj)
+        if len(self.free) < self.max_size:
+            self.free.append(obj)
+
+    def release_all(self, objects: Iterable[T]) -> None:
+        for obj in objects:
+            self.release(obj)
+
+    def prefill(self, count: int) -> None:
+        """creates `count` objects up front, e.g. during loading instead of the first fight"""
+        for _ in range(min(count, self.max_size) - len(self.free)):
+            self.created += 1
+            self.free.append(self.factory())
+
+
+def create_sprite_pool(factory: Callable[[], pygame.sprite.Sprite] = pygame.sprite.Sprite,
+                       max_size: int = DEFAULT_POOL_SIZE) -> ObjectPool:
+    """a pool of sprites, released sprites are removed from all their groups"""
+    return ObjectPool(factory, pygame.sprite.Sprite.kill, max_size)
+
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+import pygame
+
+from camera import Camera
+from game_world import GameStage, GameWorld
+from scheduler import FrameScheduler, ScheduledTask
+
+PREFETCH_LEAD_TIME = 0.75  # seconds before the character reaches a stage edge
+PREFETCH_PRIORITY = -10
+PREFETCH_BUDGET = 0.004  # seconds per frame
+
+
+class StagePrefetcher:
+    """
+    Watches position and velocity of the main char and warms up the neighbor stage it will
+    enter within `lead_time` seconds. The warm up runs as a task of the `FrameScheduler`,
+    so it only uses idle frame time.
+    Also measures the frame times, to compare the frames with a stage change to all others.
+
+    ## Arguments
+    - `enabled`, with false only the frame times get measured
+    """
+
+    def __init__(self, game_world: GameWorld, scheduler: FrameScheduler,
+                 lead_time: float = PREFETCH_LEAD_TIME, enabled: bool = True):
+        self.game_world = game_world
+        self.scheduler = scheduler
+        self.lead_time = lead_time
+        self.enabled = enabled
+        self.camera = Camera(game_world.camera.viewport.size)
+        self.tasks: Dict[int, ScheduledTask] = {}
+        self.prefetches = 0
+
+        self._last_position: Optional[tuple] = None
+        self._stage_changed = False
+        self.transition_frame_times: List[float] = []
+        self.frame_count = 0
+        self.frame_time_total = 0.0
+
+        game_world.stage_change_listeners.append(self.on_stage_change)
+
+    def on_stage_change(self, previous_stage: GameStage, new_stage: GameStage) -> None:
+        self._stage_changed = True
+        self._last_position = None
+        # every neighbor gets warmed up at most once per visit of a stage
+        self.tasks.clear()
+
+    def update(self, dt: float) -> None:
+        """checks every edge the main char is moving towards. `dt` is the last frame time in seconds"""
+        rect = self.game_world.current_stage.sprite_group.sprite.rect
+        position = (rect.x, rect.y)
+        last_position, self._last_position = self._last_position, position
+        if not self.enabled or last_position is None or dt <= 0:
+            return
+        velocity_x = (position[0] - last_position[0]) / dt
+        velocity_y = (position[1] - last_position[1]) / dt
+        stage = self.game_world.current_stage
+
+        if velocity_x > 0 and stage.right_stage:
+            self.prefetch_in_time(
+                (stage.size[0] - rect.right) / velocity_x, stage.right_stage, rect.move(-rect.x, 0)
+            )
+        if velocity_x < 0 and stage.left_stage:
+            self.prefetch_in_time(
+                rect.x / -velocity_x, stage.left_stage,
+                rect.move(stage.left_stage.size[0] - rect.width - rect.x, 0)
+            )
+        if velocity_y > 0 and stage.bottom_stage:
+            self.prefetch_in_time(
+                (stage.size[1] - rect.bottom) / velocity_y, stage.bottom_stage, rect.move(0, -rect.y)
+            )
+        if velocity_y < 0 and stage.top_stage:
+            self.prefetch_in_time(
+                rect.y / -velocity_y, stage.top_stage,
+                rect.move(0, stage.top_stage.size[1] - rect.height - rect.y)
+            )
+
+    def prefetch_in_time(self, time_to_edge: float, stage: GameStage, entry_rect: pygame.Rect) -> None:
+        if time_to_edge <= self.lead_time:
+            self.prefetch(stage, entry_rect)
+
+    def prefetch(self, stage: GameStage, entry_rect: pygame.Rect) -> None:
+        """
+        schedules the warm up of `stage` for a main char entering at `entry_rect`. the entry is
+        moved inside `stage` like the main char, when the stages differ in size
+        """
+        if id(stage) in self.tasks:
+            return
+        self.camera.follow(stage.clamp(entry_rect), stage.size)
+        viewport = self.camera.viewport.copy()
+        scale = self.game_world.camera.scale
+        self.tasks[id(stage)] = self.scheduler.add_task(
+            f"prefetch {stage.name}",
+            lambda: stage.warm_up(viewport, scale),
+            PREFETCH_PRIORITY,
+            budget=PREFETCH_BUDGET
+        )
+        self.prefetches += 1
+
+    def end_frame(self, frame_time: float) -> None:
+        """records the work time of a frame, in seconds"""
+        self.frame_count += 1
+        self.frame_time_total += frame_time
+        if self._stage_changed:
+            self.transition_frame_times.append(frame_time)
+            self._stage_changed = False
+
+    def debug_rows(self) -> List[dict]:
+        """returns the frame time stats in the format of `Debug.display_debug_output`"""
+        worst = max(self.transition_frame_times, default=0.0)
+        average = self.frame_time_total / self.frame_count if self.frame_count else 0.0
+        return [
+            {"name": "Prefetches", "text": self.prefetches},
+            {"name": "Stage Transitions", "text": len(self.transition_frame_times)},
+            {"name": "Worst Transition Frame", "text": f"{worst * 1000:.2f} ms"},
+            {"name": "Average Frame", "text": f"{average * 1000:.2f} ms"},
+        ]
+
+
+def create_stage_prefetcher(game_world: GameWorld, scheduler: FrameScheduler, enabled: bool = True) -> StagePrefetcher:
+    return StagePrefetcher(game_world, scheduler, enabled=enabled)
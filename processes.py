@@ -0,0 +1,26 @@
+"""
+Worker processes of the stage simulation and the world generation.
+
+The workers only run functions of modules without pygame (simulation.py, worldgen.py), but
+`forkserver` and `spawn` import the main module of the game once more in a new process. The
+modules with side effects at import time (the window in menu.py, the audio device in mixer.py)
+skip them while `is_worker_bootstrap` is true.
+"""
+import multiprocessing
+from multiprocessing.context import BaseContext
+
+
+def worker_context() -> BaseContext:
+    """
+    forkserver where the platform has it, else spawn. never fork, the game process runs SDL threads.
+    a forkserver imports the main module once, its workers are forks of it
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def is_worker_bootstrap() -> bool:
+    """true while a new worker process (or the forkserver) imports the main module of the game"""
+    # set by multiprocessing for exactly this import, the same check guards against starting processes in it
+    return getattr(multiprocessing.current_process(), "_inheriting", False)
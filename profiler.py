@@ -0,0 +1,160 @@
+"""
+On demand profiling of the game loop.
+
+A capture records the next `frames` frames and writes them to `PROFILE_PATH`:
+- `sample`: a thread samples the stack of the game loop every `SAMPLE_INTERVAL` seconds and
+  writes a collapsed stack file (`.folded`) for flame graph tools. The first frame of every
+  stack is the tag of the game frame (game state and stage name)
+- `cprofile`: `cProfile` with one profile per tag, written as `.pstats` files
+"""
+import cProfile
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROFILE_PATH = Path.cwd() / 'profiles'
+PROFILE_FRAMES = 300
+SAMPLE_INTERVAL = 0.001  # seconds
+PROFILE_MODES = ("sample", "cprofile")
+
+
+def format_code_frame(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """Samples the stack of the thread `thread_id` and counts the collapsed stacks per tag"""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name="StackSampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.tag = ""
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(format_code_frame(frame))
+                frame = frame.f_back
+            stack.append(self.tag)
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class FrameProfiler:
+    """
+    Profiles the frames between `begin_frame` and `end_frame` while a capture is running.
+
+    ## Arguments
+    - `mode`, one of `PROFILE_MODES`
+    - `frames`, number of frames of a capture
+    - `path`, directory of the written files
+    """
+
+    def __init__(self, mode: str = "sample", frames: int = PROFILE_FRAMES, path: Path = PROFILE_PATH):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"unknown profile mode {mode}, use one of {PROFILE_MODES}")
+        self.mode = mode
+        self.frames = frames
+        self.path = Path(path)
+        self.remaining_frames = 0
+        self.captures = 0
+        self.written_files: List[Path] = []
+
+        self._tag = ""
+        self._sampler: Optional[StackSampler] = None
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        self._current_profile: Optional[cProfile.Profile] = None
+
+    @property
+    def running(self) -> bool:
+        return self.remaining_frames > 0
+
+    def start(self) -> None:
+        """starts a capture of the next `frames` frames. does nothing while a capture is running"""
+        if self.running:
+            return
+        self.remaining_frames = self.frames
+        self._profiles = {}
+        if self.mode == "sample":
+            self._sampler = StackSampler(threading.get_ident())
+            self._sampler.start()
+
+    def begin_frame(self, tag: str) -> None:
+        if not self.running:
+            return
+        self._tag = tag
+        if self._sampler:
+            self._sampler.tag = tag
+        else:
+            self._current_profile = self._profiles.setdefault(tag, cProfile.Profile())
+            self._current_profile.enable()
+
+    def end_frame(self) -> None:
+        if not self.running:
+            return
+        if self._current_profile:
+            self._current_profile.disable()
+            self._current_profile = None
+        self.remaining_frames -= 1
+        if not self.running:
+            self.write()
+
+    def stop(self) -> None:
+        """ends a running capture early and writes it"""
+        if self.running:
+            if self._current_profile:
+                self._current_profile.disable()
+                self._current_profile = None
+            self.remaining_frames = 0
+            self.write()
+
+    def write(self) -> List[Path]:
+        """writes the capture and returns the written files"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.captures += 1
+        now = time.time()
+        # milliseconds and the capture count, so captures in the same second never overwrite each other
+        prefix = self.path / (time.strftime("profile_%Y%m%d_%H%M%S", time.localtime(now))
+                              + f"_{int(now * 1000) % 1000:03d}_{self.captures}")
+        files = []
+        if self._sampler:
+            self._sampler.stop()
+            file = prefix.with_suffix(".folded")
+            with open(file, 'w') as fp:
+                for stack, count in sorted(self._sampler.stacks.items()):
+                    fp.write(f"{stack} {count}\n")
+            files.append(file)
+            self._sampler = None
+        for tag, profile in self._profiles.items():
+            file = prefix.with_name(f"{prefix.name}_{re.sub(r'[^A-Za-z0-9_-]+', '_', tag)}.pstats")
+            profile.dump_stats(file)
+            files.append(file)
+        self._profiles = {}
+        self.written_files.extend(files)
+        return files
+
+    def debug_rows(self) -> List[dict]:
+        """returns the capture state and the last written files in the format of `Debug.display_debug_output`"""
+        last_file = self.written_files[-1].name if self.written_files else "-"
+        return [
+            {"name": "Profile Captures", "text": f"{self.captures} ({self.remaining_frames} frames left)"},
+            {"name": "Last Profile", "text": last_file},
+        ]
+
+
+def create_frame_profiler(mode: str = "sample", frames: int = PROFILE_FRAMES,
+                          path: Path = PROFILE_PATH) -> FrameProfiler:
+    return FrameProfiler(mode, frames, path)
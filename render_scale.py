@@ -0,0 +1,163 @@
+"""
+Dynamic resolution scaling of the world.
+
+The stage (tiles and sprites) is drawn into an offscreen surface at `scale` times the window
+size and scaled up into the window. Page names, menus, map, inventory and the debug overlay
+are drawn afterwards at the native resolution.
+"""
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pygame
+
+from camera import Camera
+from images import IMAGE_CACHE
+
+# every scale times `tilemap.CHUNK_SIZE` must be a whole number, so the chunks have no seams.
+# a scale of 0.75 is not faster than 1 with the software blitters of pygame, whole number factors are
+RENDER_SCALES = (1.0, 0.5)
+
+# CONTROLLER
+CONTROLLER_WINDOW = 30  # frames per decision
+LOWER_THRESHOLD = 0.9  # lower the scale above this part of the target frame time
+RAISE_THRESHOLD = 0.7  # raise the scale, if the predicted frame time stays below this part
+USELESS_LOWERING_WINDOWS = 20  # windows without lowering again, after lowering did not help
+
+BACKGROUND_COLOR = pygame.color.Color("grey")
+
+
+class ResolutionController:
+    """
+    Picks the render scale from the measured frame times.
+    Every `window` frames the average is compared to the target frame time. The scale is lowered
+    above `LOWER_THRESHOLD` and raised, if the frame time at the higher scale stays below
+    `RAISE_THRESHOLD`. The frame time at the higher scale is predicted from the speed up measured
+    when the scale was lowered, before that from the pixel count. The gap between both thresholds keeps the scale
+    from flipping back and forth. The window after a change is skipped, it contains the frames
+    that scale the assets for the new scale.
+    Scaling the world into the window costs time itself. If a lower scale is not faster, the
+    controller goes back and does not try again for `USELESS_LOWERING_WINDOWS` windows.
+
+    ## Arguments
+    - `target_frame_time`, in seconds
+    - `scales`, the allowed scales from high to low
+    """
+
+    def __init__(self, target_frame_time: float, scales: Sequence[float] = RENDER_SCALES,
+                 window: int = CONTROLLER_WINDOW):
+        self.target_frame_time = target_frame_time
+        self.scales = tuple(scales)
+        self.level = 0
+        self.changes = 0
+        self.last_average = 0.0
+        self._frame_times: deque = deque(maxlen=window)
+        self._skip_window = False
+        self._average_before_lowering: Optional[float] = None
+        self._lowering_blocked_windows = 0
+        # frame time at a level divided by the frame time at the next lower level
+        self._speed_ups = [(high / low) ** 2 for high, low in zip(self.scales, self.scales[1:])]
+
+    @property
+    def scale(self) -> float:
+        return self.scales[self.level]
+
+    def record(self, frame_time: float) -> bool:
+        """adds the work time of a frame in seconds. returns true, if the scale changed"""
+        self._frame_times.append(frame_time)
+        if len(self._frame_times) < self._frame_times.maxlen:
+            return False
+        average = sum(self._frame_times) / len(self._frame_times)
+        self._frame_times.clear()
+        if self._skip_window:
+            self._skip_window = False
+            return False
+        self.last_average = average
+        average_before_lowering, self._average_before_lowering = self._average_before_lowering, None
+        if self._lowering_blocked_windows:
+            self._lowering_blocked_windows -= 1
+
+        if average_before_lowering is not None:
+            if average >= average_before_lowering:
+                self._lowering_blocked_windows = USELESS_LOWERING_WINDOWS
+                return self._change_level(self.level - 1)
+            self._speed_ups[self.level - 1] = average_before_lowering / average
+        if average > self.target_frame_time * LOWER_THRESHOLD:
+            if self.level < len(self.scales) - 1 and not self._lowering_blocked_windows:
+                self._average_before_lowering = average
+                return self._change_level(self.level + 1)
+        elif self.level > 0:
+            predicted = average * self._speed_ups[self.level - 1]
+            if predicted < self.target_frame_time * RAISE_THRESHOLD:
+                return self._change_level(self.level - 1)
+        return False
+
+    def _change_level(self, level: int) -> bool:
+        self.level = level
+        self.changes += 1
+        self._skip_window = True
+        return True
+
+
+class WorldRenderer:
+    """
+    Gives the stage drawing a surface at the current render scale and scales it into `window`.
+    Without `controller` the scale stays fixed.
+    """
+
+    def __init__(self, window: pygame.Surface, camera: Camera, scale: float = 1.0,
+                 controller: Optional[ResolutionController] = None):
+        self.window = window
+        self.camera = camera
+        self.controller = controller
+        self.scale = controller.scale if controller else scale
+        self._surfaces: Dict[Tuple[int, int], pygame.Surface] = {}
+
+    def begin(self) -> pygame.Surface:
+        """returns the surface to draw the stage into"""
+        self.camera.scale = self.scale
+        if self.scale == 1.0:
+            return self.window
+        size = (round(self.window.get_width() * self.scale), round(self.window.get_height() * self.scale))
+        if size not in self._surfaces:
+            self._surfaces[size] = pygame.Surface(size, 0, self.window)
+        surface = self._surfaces[size]
+        surface.fill(BACKGROUND_COLOR)
+        return surface
+
+    def present(self, surface: pygame.Surface) -> None:
+        """scales the stage drawing into the window"""
+        if surface is not self.window:
+            pygame.transform.scale(surface, self.window.get_size(), self.window)
+
+    def end_frame(self, frame_time: float) -> None:
+        """passes the work time of a frame to the controller"""
+        if self.controller and self.controller.record(frame_time):
+            self.scale = self.controller.scale
+            # the copies of the old scale are not drawn anymore
+            IMAGE_CACHE.clear_scaled()
+
+    def debug_rows(self) -> List[dict]:
+        """returns the render scale in the format of `Debug.display_debug_output`"""
+        rows = [{"name": "Render Scale", "text": f"{self.scale:.2f}"}]
+        if self.controller:
+            rows.append({"name": "Scale Changes", "text": self.controller.changes})
+            rows.append({"name": "Scaled Frame Time", "text": f"{self.controller.last_average * 1000:.2f} ms"})
+        return rows
+
+
+def parse_render_scale(text: str) -> Optional[float]:
+    """parses `auto` (None) or one of `RENDER_SCALES`"""
+    if text == "auto":
+        return None
+    scale = float(text)
+    if scale not in RENDER_SCALES:
+        raise ValueError(f"render scale {scale} is not one of {RENDER_SCALES}")
+    return scale
+
+
+def create_world_renderer(window: pygame.Surface, camera: Camera, scale: Optional[float],
+                          target_frame_time: float) -> WorldRenderer:
+    """with `scale` None the scale follows the frame time"""
+    if scale is None:
+        return WorldRenderer(window, camera, controller=ResolutionController(target_frame_time))
+    return WorldRenderer(window, camera, scale)
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import heapq
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, Generator, List, Optional, Tuple
+
+from game_world import GameStage, GameWorld
+from scheduler import FrameScheduler, ScheduledTask
+
+NEIGHBOR_ATTRIBUTES = ("_top_stage", "_bottom_stage", "_right_stage", "_left_stage")
+NO_STAGE = -1
+
+# REBUILD
+REBUILD_STEP_STAGES = 512  # stages per step of a rebuild in the scheduler, about a millisecond
+REBUILD_CHECK_INTERVAL = 1.0  # seconds between two looks at the topology in the scheduler
+REBUILD_PRIORITY = 10
+
+
+class StageRouter:
+    """
+    Shortest routes between the stages of a `GameWorld` (every neighbor link costs 1).
+
+    Uses A* with the distance of the stage `coordinates` as heuristic. In large worlds with
+    long detours (walls, rivers) the coordinates underestimate a lot, there the heuristic can be
+    sharpened with precomputed landmark distances (ALT). Routes are cached until the topology
+    of the stages changes.
+
+    A route needs the graph of the current topology. The first `route` after a change blocks until
+    the graph is rebuilt, that takes seconds for 10^6 stages. `schedule_rebuild` builds the graph
+    in the idle time of the frames instead, a `route` during it only finishes the running rebuild.
+
+    ## Arguments
+    - `game_world`, the world to route in
+    - `landmark_count`, number of landmarks, 0 routes with the coordinates only
+    """
+    ROUTE_CACHE_SIZE = 4096
+
+    def __init__(self, game_world: GameWorld, landmark_count: int = 0):
+        self.game_world = game_world
+        self.landmark_count = landmark_count
+        self.route_cache: OrderedDict[Tuple[int, int], Optional[Tuple[int, ...]]] = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self._stages: Tuple[GameStage, ...] = ()
+        self._topology_version = -1
+        self._stage_indices: Dict[int, int] = {}
+        self._neighbors = array('l')
+        self._x = array('l')
+        self._y = array('l')
+        self._landmarks: List[array] = []
+        self._undirected = True
+        self._rebuild: Optional[Generator[None, None, None]] = None
+
+    def is_current(self) -> bool:
+        """true if the graph matches the topology of the stages"""
+        return self._topology_version == GameStage.topology_version and self._stages is self.game_world.stages
+
+    def refresh(self) -> None:
+        """
+        rebuilds the graph and landmarks and clears the cache, if the topology has changed.
+        blocks until the graph is current
+        """
+        for _ in self.rebuild():
+            pass
+
+    def rebuild(self) -> Generator[None, None, None]:
+        """
+        rebuilds the graph in steps of `REBUILD_STEP_STAGES` stages, until it matches the topology.
+        continues a rebuild that is already running, e.g. the task of `schedule_rebuild`
+        """
+        while self._rebuild is not None or not self.is_current():
+            if self._rebuild is None:
+                self._rebuild = self._build()
+            try:
+                next(self._rebuild)
+            except StopIteration:
+                self._rebuild = None
+                continue
+            yield
+
+    def schedule_rebuild(self, scheduler: FrameScheduler) -> ScheduledTask:
+        """looks at the topology every `REBUILD_CHECK_INTERVAL` seconds and rebuilds the graph in idle frame time"""
+        return scheduler.add_task("stage router", self.rebuild, REBUILD_PRIORITY, period=REBUILD_CHECK_INTERVAL)
+
+    def _build(self) -> Generator[None, None, None]:
+        stages = self.game_world.stages
+        topology_version = GameStage.topology_version
+        slots = len(NEIGHBOR_ATTRIBUTES)
+        stage_indices = {}
+        for index, stage in enumerate(stages):
+            stage_indices[id(stage)] = index
+            if index % REBUILD_STEP_STAGES == REBUILD_STEP_STAGES - 1:
+                yield
+        neighbors = array('l', [NO_STAGE]) * (len(stages) * slots)
+        x = array('l', bytes(len(stages) * array('l').itemsize))
+        y = array('l', bytes(len(stages) * array('l').itemsize))
+        for index, stage in enumerate(stages):
+            for slot, attribute in enumerate(NEIGHBOR_ATTRIBUTES):
+                neighbor = getattr(stage, attribute)
+                if neighbor is not None:
+                    neighbors[index * slots + slot] = stage_indices[id(neighbor)]
+            x[index], y[index] = stage.coordinates
+            if index % REBUILD_STEP_STAGES == REBUILD_STEP_STAGES - 1:
+                yield
+        undirected = True
+        for index in range(len(stages)):
+            for neighbor in neighbors[index * slots:(index + 1) * slots]:
+                if neighbor != NO_STAGE and index not in neighbors[neighbor * slots:(neighbor + 1) * slots]:
+                    undirected = False
+            if not undirected:
+                break
+            if index % REBUILD_STEP_STAGES == REBUILD_STEP_STAGES - 1:
+                yield
+        landmarks = yield from self._select_landmarks(self.landmark_count, neighbors, len(stages))
+
+        self._stages = stages
+        self._topology_version = topology_version
+        self._stage_indices = stage_indices
+        self._neighbors = neighbors
+        self._undirected = undirected
+        self._x = x
+        self._y = y
+        self._landmarks = landmarks
+        self.route_cache.clear()
+
+    def route(self, start: GameStage, goal: GameStage) -> Optional[Tuple[GameStage, ...]]:
+        """returns the stages from `start` to `goal` (both included) or None, if there is no route"""
+        self.refresh()
+        key = (self._stage_indices[id(start)], self._stage_indices[id(goal)])
+        if key in self.route_cache:
+            self.cache_hits += 1
+            self.route_cache.move_to_end(key)
+            path = self.route_cache[key]
+        else:
+            self.cache_misses += 1
+            path = self._a_star(*key)
+            self.route_cache[key] = path
+            if len(self.route_cache) > self.ROUTE_CACHE_SIZE:
+                self.route_cache.popitem(last=False)
+        if path is None:
+            return None
+        return tuple(self._stages[index] for index in path)
+
+    def distance(self, start: GameStage, goal: GameStage) -> Optional[int]:
+        """returns the number of stage changes from `start` to `goal`"""
+        path = self.route(start, goal)
+        return None if path is None else len(path) - 1
+
+    def _heuristic(self, goal: int) -> Callable[[int], int]:
+        """returns the heuristic for routes to `goal`"""
+        x, y = self._x, self._y
+        goal_x, goal_y = x[goal], y[goal]
+        landmarks = [(distances, distances[goal]) for distances in self._landmarks if distances[goal] != NO_STAGE]
+        undirected = self._undirected
+
+        def estimate(index: int) -> int:
+            result = abs(x[index] - goal_x) + abs(y[index] - goal_y)
+            for distances, goal_distance in landmarks:
+                if distances[index] != NO_STAGE:
+                    difference = goal_distance - distances[index]
+                    result = max(result, abs(difference) if undirected else difference)
+            return result
+
+        return estimate
+
+    def _a_star(self, start: int, goal: int) -> Optional[Tuple[int, ...]]:
+        neighbors = self._neighbors
+        slots = len(NEIGHBOR_ATTRIBUTES)
+        heuristic = self._heuristic(goal)
+        came_from = {start: NO_STAGE}
+        costs = {start: 0}
+        # ties are broken towards the higher cost, i.e. the stage closer to the goal
+        open_heap = [(heuristic(start), 0, start)]
+        while open_heap:
+            _, negative_cost, index = heapq.heappop(open_heap)
+            cost = -negative_cost
+            if index == goal:
+                path = []
+                while index != NO_STAGE:
+                    path.append(index)
+                    index = came_from[index]
+                return tuple(reversed(path))
+            if cost > costs[index]:
+                continue
+            for neighbor in neighbors[index * slots:(index + 1) * slots]:
+                if neighbor == NO_STAGE:
+                    continue
+                neighbor_cost = cost + 1
+                if neighbor_cost < costs.get(neighbor, neighbor_cost + 1):
+                    costs[neighbor] = neighbor_cost
+                    came_from[neighbor] = index
+                    heapq.heappush(
+                        open_heap,
+                        (neighbor_cost + heuristic(neighbor), -neighbor_cost, neighbor)
+                    )
+        return None
+
+    @staticmethod
+    def _breadth_first_distances(start: int, neighbors: array, count: int) -> Generator[None, None, array]:
+        slots = len(NEIGHBOR_ATTRIBUTES)
+        distances = array('l', [NO_STAGE]) * count
+        distances[start] = 0
+        frontier = [start]
+        visited = 0
+        while frontier:
+            next_frontier = []
+            for index in frontier:
+                for neighbor in neighbors[index * slots:(index + 1) * slots]:
+                    if neighbor != NO_STAGE and distances[neighbor] == NO_STAGE:
+                        distances[neighbor] = distances[index] + 1
+                        next_frontier.append(neighbor)
+                visited += 1
+                if visited % REBUILD_STEP_STAGES == 0:
+                    yield
+            frontier = next_frontier
+        return distances
+
+    def _select_landmarks(self, count: int, neighbors: array, stage_count: int) -> Generator[None, None, List[array]]:
+        """picks landmarks far apart from each other and returns their distances to all stages"""
+        landmarks = []
+        if not count or not stage_count:
+            return landmarks
+        closest: Optional[array] = None
+        landmark = 0
+        for _ in range(min(count, stage_count)):
+            distances = yield from self._breadth_first_distances(landmark, neighbors, stage_count)
+            landmarks.append(distances)
+            if closest is None:
+                closest = array('l', distances)
+            # the next landmark is the stage farthest from all landmarks
+            farthest = NO_STAGE
+            for start in range(0, stage_count, REBUILD_STEP_STAGES):
+                stop = min(start + REBUILD_STEP_STAGES, stage_count)
+                closest[start:stop] = array('l', map(min, closest[start:stop], distances[start:stop]))
+                candidate = max(range(start, stop), key=closest.__getitem__)
+                if closest[candidate] > farthest:
+                    landmark, farthest = candidate, closest[candidate]
+                yield
+        return landmarks
+
+
+def create_stage_router(game_world: GameWorld, landmark_count: int = 0,
+                        scheduler: Optional[FrameScheduler] = None) -> StageRouter:
+    """with a `scheduler` the graph is built in idle frame time, without the first route builds it"""
+    router = StageRouter(game_world, landmark_count)
+    if scheduler is not None:
+        router.schedule_rebuild(scheduler)
+    return router
@@ -0,0 +1,158 @@
+import inspect
+import time
+from typing import Callable, Dict, Generator, List, Optional, Union
+
+DEFAULT_TASK_BUDGET = 0.002  # seconds per frame
+FRAME_DEADLINE_MARGIN = 0.001  # seconds kept free before the next frame
+# seconds a task may wait past its run time (or a whole period, if longer) before it runs in a late frame
+OVERDUE_TIME = 1.0
+
+TaskCallback = Callable[[], Union[None, Generator]]
+
+
+class ScheduledTask:
+    """
+    A recurring or deferred job for the `FrameScheduler`.
+
+    ## Arguments
+    - `callback`, a function. If it returns a generator, every `next()` is one step
+      and the job is spread over as many frames as it needs
+    - `priority`, lower values run first
+    - `period`, seconds between two runs, `None` runs the task once
+    - `budget`, maximum seconds the task may use per frame
+    """
+
+    def __init__(self, name: str, callback: TaskCallback, priority: int = 0,
+                 period: Optional[float] = None, budget: float = DEFAULT_TASK_BUDGET, next_run: float = 0.0):
+        self.name = name
+        self.callback = callback
+        self.priority = priority
+        self.period = period
+        self.budget = budget
+        self.next_run = next_run
+        self.cancelled = False
+        self.runs = 0
+        self._generator: Optional[Generator] = None
+
+    def step(self) -> bool:
+        """runs one step of the task. returns true, if the job is finished"""
+        if self._generator is None:
+            result = self.callback()
+            if not inspect.isgenerator(result):
+                return True
+            self._generator = result
+        try:
+            next(self._generator)
+        except StopIteration:
+            self._generator = None
+            return True
+        return False
+
+    def finish(self, now: float) -> None:
+        self.runs += 1
+        if self.period is None:
+            self.cancelled = True
+        else:
+            self.next_run = now + self.period
+
+
+class FrameScheduler:
+    """
+    Cooperative scheduler that runs tasks in the idle time before the next frame deadline
+    and counts the frames and tasks that missed their deadline. A frame that is already late
+    runs no tasks, except the one that is overdue the longest, so periodic tasks still run on
+    machines without idle time.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.tasks: List[ScheduledTask] = []
+        self.frames = 0
+        self.missed_frames = 0
+        self.task_overruns: Dict[str, int] = {}
+        self.task_time: Dict[str, float] = {}
+        # runs in frames that were already late
+        self.overdue_runs: Dict[str, int] = {}
+
+    def add_task(self, name: str, callback: TaskCallback, priority: int = 0, period: Optional[float] = None,
+                 budget: float = DEFAULT_TASK_BUDGET, delay: float = 0.0) -> ScheduledTask:
+        """adds a task that runs the first time after `delay` seconds"""
+        task = ScheduledTask(name, callback, priority, period, budget, self.clock() + delay)
+        self.tasks.append(task)
+        return task
+
+    def cancel(self, task: ScheduledTask) -> None:
+        task.cancelled = True
+
+    def run(self, deadline: Optional[float]) -> None:
+        """
+        runs the due tasks by priority until `deadline`. without a deadline (uncapped frame rate)
+        every due task gets its own budget
+        """
+        self.frames += 1
+        now = self.clock()
+        if deadline is not None and now > deadline:
+            self.missed_frames += 1
+            self.run_overdue(now)
+            return
+
+        for task in self.tasks:
+            if task.cancelled:
+                self.tasks = [task for task in self.tasks if not task.cancelled]
+                break
+        due_tasks = sorted(
+            (task for task in self.tasks if task.next_run <= now),
+            key=lambda task: (task.priority, task.next_run)
+        )
+        for task in due_tasks:
+            if deadline is not None and now >= deadline:
+                break
+            now = self.run_task(task, now, deadline)
+            if deadline is not None and now > deadline:
+                self.task_overruns[task.name] = self.task_overruns.get(task.name, 0) + 1
+
+        if deadline is not None and now > deadline:
+            self.missed_frames += 1
+
+    def run_task(self, task: ScheduledTask, now: float, deadline: Optional[float]) -> float:
+        """runs steps of `task` for its budget or until `deadline`. returns the time after the run"""
+        task_start = now
+        task_deadline = task_start + task.budget
+        if deadline is not None:
+            task_deadline = min(task_deadline, deadline)
+        finished = False
+        while not finished and now < task_deadline:
+            finished = task.step()
+            now = self.clock()
+        if finished:
+            task.finish(now)
+        self.task_time[task.name] = self.task_time.get(task.name, 0.0) + now - task_start
+        return now
+
+    def run_overdue(self, now: float) -> None:
+        """
+        runs the task that waits the longest with its budget, if it waits `OVERDUE_TIME` or a whole
+        period past its run time. called in late frames, so it adds to a frame that is late anyway
+        """
+        overdue_tasks = [
+            task for task in self.tasks
+            if not task.cancelled and now - task.next_run >= max(task.period or 0.0, OVERDUE_TIME)
+        ]
+        if not overdue_tasks:
+            return
+        task = min(overdue_tasks, key=lambda task: task.next_run)
+        self.run_task(task, now, None)
+        self.overdue_runs[task.name] = self.overdue_runs.get(task.name, 0) + 1
+
+    def debug_rows(self) -> List[dict]:
+        """returns the scheduler stats in the format of `Debug.display_debug_output`"""
+        return [
+            {"name": "Scheduler Tasks", "text": len(self.tasks)},
+            {"name": "Missed Frames", "text": f"{self.missed_frames}/{self.frames}"},
+            {"name": "Task Overruns", "text": self.task_overruns},
+            {"name": "Overdue Task Runs", "text": self.overdue_runs},
+        ]
+
+
+def create_frame_scheduler() -> FrameScheduler:
+    return FrameScheduler()
@@ -0,0 +1,12 @@
+"""
+Seeds of the seeded systems: world generation, combat and particles.
+
+A seed is any python int. The world files, the welcome packet and numpy store it as an
+unsigned 64 bit number, `normalize_seed` maps every seed to that range.
+"""
+SEED_MASK = (1 << 64) - 1
+
+
+def normalize_seed(seed: int) -> int:
+    """the seed as the unsigned 64 bit number it is stored as, so negative seeds work as well"""
+    return seed & SEED_MASK
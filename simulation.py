@@ -0,0 +1,261 @@
+"""
+Simulation of the stages the player is not in.
+
+Every stage with a state owns a fixed size block of doubles (`GameStage.state`). The blocks live
+in slots of one shared memory buffer, next to the bounds of their stage, so worker processes can
+tick the stages that are not visible without copying any state. The current stage is ticked in
+the main process and its block is synced back from / to the shared buffer when the player changes
+the stage.
+
+This module must not import pygame or the game modules, it is imported by the worker processes.
+"""
+from __future__ import annotations
+
+import os
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+from processes import worker_context
+
+if TYPE_CHECKING:
+    from game_world import GameStage, GameWorld
+
+OFFSCREEN_TICK_RATE = 10  # ticks per second for stages that are not visible
+
+# STATE LAYOUT
+STATE_ELAPSED = 0  # simulated seconds
+STATE_ENTITY_COUNT = 1
+STATE_HEADER_FIELDS = 2
+ENTITY_FIELDS = 4  # x, y, velocity x, velocity y
+MAX_STAGE_ENTITIES = 16
+STAGE_STATE_FIELDS = STATE_HEADER_FIELDS + MAX_STAGE_ENTITIES * ENTITY_FIELDS
+STAGE_STATE_BYTES = STAGE_STATE_FIELDS * array('d').itemsize
+
+# SLOT LAYOUT, a stage in the shared buffer: its bounds and its state block
+SLOT_WIDTH = 0
+SLOT_HEIGHT = 1
+SLOT_HEADER_FIELDS = 2
+SLOT_FIELDS = SLOT_HEADER_FIELDS + STAGE_STATE_FIELDS
+SLOT_BYTES = SLOT_FIELDS * array('d').itemsize
+INITIAL_SLOTS = 64  # the buffer doubles when a stage needs a slot beyond it
+
+# shared buffer of a worker process, set by `attach_shared_slots`
+_shared_memory: Optional[shared_memory.SharedMemory] = None
+_shared_slots: Optional[memoryview] = None
+
+
+def create_stage_state() -> array:
+    """returns an empty state block for a stage"""
+    return array('d', bytes(STAGE_STATE_BYTES))
+
+
+def add_stage_entity(state, pos: Sequence[float], velocity: Sequence[float]) -> bool:
+    """adds an entity to a stage state. returns false, if the stage is full"""
+    count = int(state[STATE_ENTITY_COUNT])
+    if count >= MAX_STAGE_ENTITIES:
+        return False
+    offset = STATE_HEADER_FIELDS + count * ENTITY_FIELDS
+    state[offset:offset + ENTITY_FIELDS] = array('d', [pos[0], pos[1], velocity[0], velocity[1]])
+    state[STATE_ENTITY_COUNT] = count + 1
+    return True
+
+
+def step_stage_state(state, dt: float, bounds: Tuple[float, float]) -> None:
+    """advances the timers and entities of one stage state by `dt` seconds"""
+    state[STATE_ELAPSED] += dt
+    for offset in range(
+            STATE_HEADER_FIELDS,
+            STATE_HEADER_FIELDS + int(state[STATE_ENTITY_COUNT]) * ENTITY_FIELDS,
+            ENTITY_FIELDS
+    ):
+        for axis in range(2):
+            position = state[offset + axis] + state[offset + axis + 2] * dt
+            if position < 0 or position > bounds[axis]:
+                state[offset + axis + 2] = -state[offset + axis + 2]
+                position = min(max(position, 0), bounds[axis])
+            state[offset + axis] = position
+
+
+def attach_shared_slots(name: str) -> None:
+    """maps the shared buffer `name` in a worker, the buffer of the simulator is replaced when it grows"""
+    global _shared_memory, _shared_slots
+    if _shared_memory is not None:
+        if _shared_memory.name == name:
+            return
+        _shared_slots.release()
+        _shared_memory.close()
+    _shared_memory = shared_memory.SharedMemory(name=name)
+    _shared_slots = _shared_memory.buf.cast('d')
+
+
+def simulate_slot_range(name: str, start: int, stop: int, skip: int, dt: float) -> int:
+    """ticks the slots `start` to `stop` of the shared buffer `name`, except `skip`. runs in a worker"""
+    attach_shared_slots(name)
+    ticked = 0
+    for index in range(start, stop):
+        if index == skip:
+            continue
+        offset = index * SLOT_FIELDS
+        bounds = (_shared_slots[offset + SLOT_WIDTH], _shared_slots[offset + SLOT_HEIGHT])
+        step_stage_state(_shared_slots[offset + SLOT_HEADER_FIELDS:offset + SLOT_FIELDS], dt, bounds)
+        ticked += 1
+    return ticked
+
+
+class StageSimulator:
+    """
+    Ticks the stages with a state that are not visible at `tick_rate` in a pool of `workers` processes.
+    Stages without a state have nothing to simulate and get no slot in the shared buffer.
+
+    ## Arguments
+    - `game_world`, the world whose stages get simulated
+    """
+
+    def __init__(
+            self,
+            game_world: GameWorld,
+            workers: Optional[int] = None,
+            tick_rate: float = OFFSCREEN_TICK_RATE
+    ):
+        self.game_world = game_world
+        self.workers = workers or os.cpu_count() or 1
+        self.tick_interval = 1 / tick_rate
+        # the stages with a slot, in slot order
+        self.slot_stages: List[GameStage] = []
+        self.slot_indices: Dict[int, int] = {}
+
+        self.shared_memory = shared_memory.SharedMemory(create=True, size=INITIAL_SLOTS * SLOT_BYTES)
+        self.slots = self.shared_memory.buf.cast('d')
+        self.capacity = INITIAL_SLOTS
+        for stage in game_world.stages:
+            if stage.has_state:
+                self.state_block(self.add_slot(stage))[:] = stage.state
+
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=worker_context())
+        self.pending: List[Future] = []
+        # stage changes that wait for the running batch, (previous stage, new stage)
+        self.handovers: List[Tuple[GameStage, GameStage]] = []
+        self._accumulated_time = 0.0
+        self._handover_time = 0.0
+        self.stage_ticks = 0
+
+        game_world.stage_change_listeners.append(self.on_stage_change)
+
+    def add_slot(self, stage: GameStage) -> int:
+        """gives `stage` the next slot, grows the buffer if it is full. only while no batch runs"""
+        index = len(self.slot_stages)
+        if index == self.capacity:
+            self.resize(2 * self.capacity)
+        self.slot_stages.append(stage)
+        self.slot_indices[id(stage)] = index
+        offset = index * SLOT_FIELDS
+        self.slots[offset + SLOT_WIDTH], self.slots[offset + SLOT_HEIGHT] = stage.size
+        return index
+
+    def resize(self, capacity: int) -> None:
+        """
+        moves the slots into a new buffer. the workers map the new one with their next batch,
+        the old one is freed when they let go of it
+        """
+        memory = shared_memory.SharedMemory(create=True, size=capacity * SLOT_BYTES)
+        slots = memory.buf.cast('d')
+        slots[:len(self.slots)] = self.slots
+        self.slots.release()
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+        self.shared_memory, self.slots, self.capacity = memory, slots, capacity
+
+    def state_block(self, index: int) -> memoryview:
+        """returns the state block of the slot `index` in the shared buffer"""
+        offset = index * SLOT_FIELDS
+        return self.slots[offset + SLOT_HEADER_FIELDS:offset + SLOT_FIELDS]
+
+    def collect(self, block: bool = False) -> None:
+        """collects finished batches. with `block` waits until all batches are done"""
+        if block:
+            wait(self.pending)
+        finished = [future for future in self.pending if future.done()]
+        for future in finished:
+            self.stage_ticks += future.result()
+        self.pending = [future for future in self.pending if not future.done()]
+
+    def apply_handovers(self) -> None:
+        """
+        hands the previous stages over to the workers and brings the states of the new stages
+        into the main process. only while no batch runs, so no worker writes these slots
+        """
+        for previous_stage, new_stage in self.handovers:
+            if previous_stage.has_state:
+                index = self.slot_indices.get(id(previous_stage))
+                if index is None:
+                    index = self.add_slot(previous_stage)
+                self.state_block(index)[:] = previous_stage.state
+            index = self.slot_indices.get(id(new_stage))
+            if index is not None:
+                new_stage.state = array('d', self.state_block(index))
+        self.handovers.clear()
+
+    def tick(self, dt: float) -> None:
+        """
+        ticks the current stage in the main process and starts a new batch for the other stages,
+        when the tick interval has passed and the last batch is done. never waits for the workers:
+        after a stage change during a batch the current stage pauses until the batch is done and
+        then catches up on the paused time
+        """
+        self._accumulated_time += dt
+        self.collect()
+        if self.handovers:
+            if self.pending:
+                self._handover_time += dt
+                return
+            self.apply_handovers()
+        stage = self.game_world.current_stage
+        step_stage_state(stage.state, dt + self._handover_time, stage.size)
+        self._handover_time = 0.0
+
+        if self.pending or self._accumulated_time < self.tick_interval or not self.slot_stages:
+            return
+        batch_dt = self._accumulated_time
+        self._accumulated_time = 0.0
+        skip = self.slot_indices.get(id(stage), -1)
+        slot_count = len(self.slot_stages)
+        workers = min(self.workers, slot_count)
+        self.pending = [
+            self.pool.submit(
+                simulate_slot_range,
+                self.shared_memory.name,
+                worker * slot_count // workers,
+                (worker + 1) * slot_count // workers,
+                skip,
+                batch_dt
+            )
+            for worker in range(workers)
+        ]
+
+    def on_stage_change(self, previous_stage: GameStage, new_stage: GameStage) -> None:
+        """
+        hands the stages over at once, or with the next `tick` after the running batch.
+        never waits for the workers
+        """
+        self.handovers.append((previous_stage, new_stage))
+        self.collect()
+        if not self.pending:
+            self.apply_handovers()
+
+    def close(self) -> None:
+        self.collect(block=True)
+        self.apply_handovers()
+        self.pool.shutdown()
+        self.game_world.stage_change_listeners.remove(self.on_stage_change)
+        for index, stage in enumerate(self.slot_stages):
+            if stage is not self.game_world.current_stage:
+                stage.state = array('d', self.state_block(index))
+        self.slots.release()
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+
+
+def create_stage_simulator(game_world: GameWorld, workers: Optional[int] = None) -> StageSimulator:
+    return StageSimulator(game_world, workers)
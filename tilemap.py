@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import json
+from array import array
+from pathlib import Path
+from typing import Dict, Generator, Iterator, List, Optional, Set, Tuple
+
+import pygame
+
+# PATHS
+TILEMAP_PATH = Path.cwd() / 'data' / 'tilemaps'
+
+# SIZES
+CHUNK_SIZE = 256
+DEFAULT_TILE_SIZE = 32
+
+# COLORS
+TILE_COLORS = {
+    0: pygame.color.Color("darkolivegreen3"),
+    1: pygame.color.Color("burlywood3"),
+    2: pygame.color.Color("steelblue3"),
+    3: pygame.color.Color("gray55"),
+}
+
+# loaded tilemaps by name, stages with the same layout share one tilemap and its chunks
+_tilemaps: Dict[str, TileMap] = {}
+
+
+class TileMap:
+    """
+    Background layer of a stage. The tiles are pre-rendered into chunk surfaces of
+    `CHUNK_SIZE` x `CHUNK_SIZE` pixels, so drawing costs a few chunk blits.
+    Changing a tile re-renders only its chunk, the next time it gets drawn.
+
+    ## Arguments
+    - `tiles`, rows of tile ids, see `TILE_COLORS`
+    - `tile_size`, width and height of a tile in pixels, must divide `CHUNK_SIZE`
+    """
+
+    def __init__(self, name: str, tiles: List[List[int]], tile_size: int = DEFAULT_TILE_SIZE):
+        if CHUNK_SIZE % tile_size:
+            raise ValueError(f"tile size {tile_size} does not divide the chunk size {CHUNK_SIZE}")
+        self.name = name
+        self.tile_size = tile_size
+        self.width = len(tiles[0]) if tiles else 0
+        self.height = len(tiles)
+        self.tiles = array('H', (tile for row in tiles for tile in row))
+        self.tiles_per_chunk = CHUNK_SIZE // tile_size
+        self.pixel_size = (self.width * tile_size, self.height * tile_size)
+        self.chunk_count = (
+            -(-self.pixel_size[0] // CHUNK_SIZE),
+            -(-self.pixel_size[1] // CHUNK_SIZE)
+        )
+
+        self.chunks: Dict[Tuple[int, int], pygame.Surface] = {}
+        # (scale, chunk x, chunk y) -> (chunk surface it was scaled from, scaled surface)
+        self.scaled_chunks: Dict[Tuple[float, int, int], Tuple[pygame.Surface, pygame.Surface]] = {}
+        self.dirty_chunks: Set[Tuple[int, int]] = set()
+        self.chunk_renders = 0
+
+    def get_tile(self, x: int, y: int) -> int:
+        return self.tiles[y * self.width + x]
+
+    def set_tile(self, x: int, y: int, tile: int) -> None:
+        """changes a tile and marks its chunk for re-rendering"""
+        if self.tiles[y * self.width + x] == tile:
+            return
+        self.tiles[y * self.width + x] = tile
+        self.dirty_chunks.add((x // self.tiles_per_chunk, y // self.tiles_per_chunk))
+
+    def get_chunk(self, chunk_x: int, chunk_y: int, scale: float = 1.0) -> pygame.Surface:
+        """
+        returns the cached chunk surface, renders it first if it is missing or dirty.
+        with `scale` a scaled copy is returned, it is scaled again when the chunk was re-rendered
+        """
+        key = (chunk_x, chunk_y)
+        if key not in self.chunks or key in self.dirty_chunks:
+            self.chunks[key] = self.render_chunk(chunk_x, chunk_y)
+            self.dirty_chunks.discard(key)
+        chunk = self.chunks[key]
+        if scale == 1.0:
+            return chunk
+
+        scaled_key = (scale, chunk_x, chunk_y)
+        cached = self.scaled_chunks.get(scaled_key)
+        if cached is None or cached[0] is not chunk:
+            size = (round(chunk.get_width() * scale), round(chunk.get_height() * scale))
+            cached = self.scaled_chunks[scaled_key] = (chunk, pygame.transform.scale(chunk, size))
+        return cached[1]
+
+    def render_chunk(self, chunk_x: int, chunk_y: int) -> pygame.Surface:
+        self.chunk_renders += 1
+        first_x = chunk_x * self.tiles_per_chunk
+        first_y = chunk_y * self.tiles_per_chunk
+        last_x = min(first_x + self.tiles_per_chunk, self.width)
+        last_y = min(first_y + self.tiles_per_chunk, self.height)
+
+        surface = pygame.Surface(((last_x - first_x) * self.tile_size, (last_y - first_y) * self.tile_size))
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert()
+        tile_rect = pygame.Rect(0, 0, self.tile_size, self.tile_size)
+        for y in range(first_y, last_y):
+            tile_rect.y = (y - first_y) * self.tile_size
+            for x in range(first_x, last_x):
+                tile_rect.x = (x - first_x) * self.tile_size
+                surface.fill(TILE_COLORS.get(self.tiles[y * self.width + x], TILE_COLORS[0]), tile_rect)
+        return surface
+
+    def chunks_in(self, area: pygame.Rect) -> Iterator[Tuple[int, int]]:
+        """returns the chunks that overlap `area` (tilemap pixels)"""
+        for chunk_y in range(max(0, area.top // CHUNK_SIZE), min(self.chunk_count[1], area.bottom // CHUNK_SIZE + 1)):
+            for chunk_x in range(max(0, area.left // CHUNK_SIZE), min(self.chunk_count[0], area.right // CHUNK_SIZE + 1)):
+                yield chunk_x, chunk_y
+
+    def warm_chunks(self, area: pygame.Rect, scale: float = 1.0) -> Generator[None, None, None]:
+        """renders the missing or dirty chunks in `area`, one chunk per step"""
+        for key in self.chunks_in(area):
+            if key not in self.chunks or key in self.dirty_chunks or (
+                    scale != 1.0 and (scale, *key) not in self.scaled_chunks):
+                self.get_chunk(*key, scale)
+                yield
+
+    def draw(self, surface: pygame.Surface, offset: Tuple[int, int] = (0, 0), scale: float = 1.0) -> None:
+        """
+        blits the chunks that overlap `surface`. `offset` is the top left tilemap pixel on screen.
+        with `scale` the scaled chunks are drawn, `CHUNK_SIZE * scale` must be a whole number
+        """
+        chunk_size = round(CHUNK_SIZE * scale)
+        first_x = max(0, -offset[0] // chunk_size)
+        first_y = max(0, -offset[1] // chunk_size)
+        last_x = min(self.chunk_count[0], (surface.get_width() - offset[0]) // chunk_size + 1)
+        last_y = min(self.chunk_count[1], (surface.get_height() - offset[1]) // chunk_size + 1)
+        surface.blits([
+            (self.get_chunk(chunk_x, chunk_y, scale), (offset[0] + chunk_x * chunk_size, offset[1] + chunk_y * chunk_size))
+            for chunk_y in range(first_y, last_y)
+            for chunk_x in range(first_x, last_x)
+        ], False)
+
+
+def load_tilemap(name: str, path: Optional[Path] = None) -> TileMap:
+    """loads the tilemap `name` from `TILEMAP_PATH` once and returns the shared instance"""
+    if name not in _tilemaps:
+        with open(path or TILEMAP_PATH / f"{name}.json", 'r') as fp:
+            data = json.load(fp)
+        _tilemaps[name] = TileMap(name, data['tiles'], data.get('tile_size', DEFAULT_TILE_SIZE))
+    return _tilemaps[name]
+
+
+def loaded_tilemaps() -> List[TileMap]:
+    return list(_tilemaps.values())
@@ -0,0 +1,164 @@
+import struct
+from pathlib import Path
+from typing import BinaryIO, List, NamedTuple, Optional, Tuple
+
+import pygame
+from pygame.locals import *
+
+# Keys that are sampled every frame. The bit position of a key is its index here.
+TRACKED_KEYS = (K_a, K_d, K_s, K_w, K_LSHIFT)
+TRACKED_KEY_BITS = {key: 1 << bit for bit, key in enumerate(TRACKED_KEYS)}
+
+# LOG FORMAT
+LOG_MAGIC = b"GRPGINP1"
+FRAME_HEADER = struct.Struct("<BH")  # pressed key bitmask, event count
+KEY_EVENT = struct.Struct("<Bi")  # event code, key
+MOUSE_EVENT = struct.Struct("<BBhh")  # event code, button, x, y
+
+# event codes used in the log
+EVENT_QUIT = 0
+EVENT_KEYDOWN = 1
+EVENT_KEYUP = 2
+EVENT_MOUSEBUTTONDOWN = 3
+EVENT_MOUSEBUTTONUP = 4
+
+EVENT_CODES = {
+    QUIT: EVENT_QUIT,
+    KEYDOWN: EVENT_KEYDOWN,
+    KEYUP: EVENT_KEYUP,
+    MOUSEBUTTONDOWN: EVENT_MOUSEBUTTONDOWN,
+    MOUSEBUTTONUP: EVENT_MOUSEBUTTONUP,
+}
+EVENT_TYPES = {code: event_type for event_type, code in EVENT_CODES.items()}
+
+
+class KeyState:
+    """
+    Pressed state of the `TRACKED_KEYS` for one frame, stored as a bitmask.
+    Can be indexed with pygame key constants like `pygame.key.get_pressed()`.
+    """
+    __slots__ = ("bits",)
+
+    def __init__(self, bits: int = 0):
+        self.bits = bits
+
+    def __getitem__(self, key: int) -> bool:
+        return bool(self.bits & TRACKED_KEY_BITS.get(key, 0))
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, KeyState) and self.bits == other.bits
+
+    def __repr__(self) -> str:
+        return f"KeyState({self.bits:#07b})"
+
+    @classmethod
+    def from_pygame(cls) -> "KeyState":
+        pressed = pygame.key.get_pressed()
+        bits = 0
+        for key, bit in TRACKED_KEY_BITS.items():
+            if pressed[key]:
+                bits |= bit
+        return cls(bits)
+
+
+class InputFrame(NamedTuple):
+    pressed: KeyState
+    events: List[pygame.event.Event]
+
+
+class InputSource:
+    """Delivers the user input for the game loop, one frame at a time"""
+
+    def next_frame(self) -> Optional[InputFrame]:
+        """returns the input of the next frame or None, if there is no more input"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class LiveInputSource(InputSource):
+    """Reads the input from pygame"""
+
+    def next_frame(self) -> Optional[InputFrame]:
+        events = [event for event in pygame.event.get() if event.type in EVENT_CODES]
+        return InputFrame(KeyState.from_pygame(), events)
+
+
+class RecordingInputSource(InputSource):
+    """
+    Passes the input of `source` through and writes every frame to a binary log.
+
+    A frame without events costs 3 bytes in the log.
+    """
+
+    def __init__(self, source: InputSource, path: Path):
+        self.source = source
+        self.path = Path(path)
+        self._fp: BinaryIO = open(self.path, "wb")
+        self._fp.write(LOG_MAGIC)
+        self.frame_count = 0
+
+    def next_frame(self) -> Optional[InputFrame]:
+        frame = self.source.next_frame()
+        if frame is not None:
+            self._fp.write(encode_frame(frame))
+            self.frame_count += 1
+        return frame
+
+    def close(self) -> None:
+        self.source.close()
+        if not self._fp.closed:
+            self._fp.close()
+
+
+class ReplayInputSource(InputSource):
+    """Reads the frames of a log written by `RecordingInputSource`"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._data = self.path.read_bytes()
+        if not self._data.startswith(LOG_MAGIC):
+            raise ValueError(f"{self.path} is not an input log")
+        self._offset = len(LOG_MAGIC)
+        self.frame_count = 0
+
+    def next_frame(self) -> Optional[InputFrame]:
+        if self._offset >= len(self._data):
+            return None
+        frame, self._offset = decode_frame(self._data, self._offset)
+        self.frame_count += 1
+        return frame
+
+
+def encode_frame(frame: InputFrame) -> bytes:
+    """packs the pressed keys and events of a frame into bytes"""
+    chunks = [FRAME_HEADER.pack(frame.pressed.bits, len(frame.events))]
+    for event in frame.events:
+        code = EVENT_CODES[event.type]
+        if code in (EVENT_MOUSEBUTTONDOWN, EVENT_MOUSEBUTTONUP):
+            chunks.append(MOUSE_EVENT.pack(code, event.button, *event.pos))
+        else:
+            chunks.append(KEY_EVENT.pack(code, getattr(event, "key", 0)))
+    return b"".join(chunks)
+
+
+def decode_frame(data: bytes, offset: int) -> Tuple[InputFrame, int]:
+    """unpacks the frame starting at `offset`, returns the frame and the offset of the next frame"""
+    bits, event_count = FRAME_HEADER.unpack_from(data, offset)
+    offset += FRAME_HEADER.size
+    events = []
+    for _ in range(event_count):
+        code = data[offset]
+        if code in (EVENT_MOUSEBUTTONDOWN, EVENT_MOUSEBUTTONUP):
+            _, button, x, y = MOUSE_EVENT.unpack_from(data, offset)
+            offset += MOUSE_EVENT.size
+            events.append(pygame.event.Event(EVENT_TYPES[code], button=button, pos=(x, y)))
+        else:
+            _, key = KEY_EVENT.unpack_from(data, offset)
+            offset += KEY_EVENT.size
+            if code == EVENT_QUIT:
+                events.append(pygame.event.Event(QUIT))
+            else:
+                events.append(pygame.event.Event(EVENT_TYPES[code], key=key))
+    return InputFrame(KeyState(bits), events), offset
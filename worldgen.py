@@ -0,0 +1,171 @@
+"""
+Seeded procedural generation of big stage grids.
+
+A world is a `width` x `height` grid of stages. Every cell stores its links to the right and to
+the bottom neighbor as bit flags. Each cell links right or down (a binary tree maze), so every
+stage can reach the last cell and the world is always connected; a few extra links add loops.
+The links of a cell only depend on the seed and the cell, so the rows are generated in
+parallel by region and the result is always the same.
+
+Generated worlds are stored in `WORLD_PATH`, later starts load the links instead of generating them.
+"""
+from __future__ import annotations
+
+import gc
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from processes import worker_context
+
+if TYPE_CHECKING:
+    from game_world import GameStage, MainCharGroup
+    from tilemap import TileMap
+
+WORLD_PATH = Path.cwd() / 'data' / 'worlds'
+WORLD_MAGIC = b"GRPGWLD1"
+WORLD_HEADER = struct.Struct("<8sQII")  # magic, seed, width, height
+
+# LINKS
+LINK_RIGHT = 1
+LINK_DOWN = 2
+EXTRA_LINK_CHANCE = 0.1  # chance of a cell to get both links
+
+# worlds with less cells are generated in the calling process
+PARALLEL_MIN_CELLS = 1 << 16
+REGION_ROWS = 64
+
+_MASK_64 = (1 << 64) - 1
+_EXTRA_LINK_LIMIT = int(EXTRA_LINK_CHANCE * (1 << 32))
+
+
+def cell_hash(seed: int, index: int) -> int:
+    """splitmix64 of the cell `index`, a well mixed 64 bit number for every seed and cell"""
+    z = (seed * 0x9E3779B97F4A7C15 + (index + 1) * 0xBF58476D1CE4E5B9) & _MASK_64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK_64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK_64
+    return z ^ (z >> 31)
+
+
+def generate_region(seed: int, width: int, height: int, first_row: int, last_row: int) -> bytes:
+    """returns the links of the rows `first_row` to `last_row` (excluded), one byte per cell"""
+    links = bytearray((last_row - first_row) * width)
+    position = 0
+    for y in range(first_row, last_row):
+        last_column = width - 1
+        for x in range(width):
+            value = cell_hash(seed, y * width + x)
+            if y == height - 1:
+                link = LINK_RIGHT if x < last_column else 0
+            elif x == last_column:
+                link = LINK_DOWN
+            elif value >> 32 < _EXTRA_LINK_LIMIT:
+                link = LINK_RIGHT | LINK_DOWN
+            else:
+                link = LINK_RIGHT if value & 1 else LINK_DOWN
+            links[position] = link
+            position += 1
+    return bytes(links)
+
+
+def generate_links(seed: int, width: int, height: int, workers: Optional[int] = None) -> bytes:
+    """generates the links of all cells, in `workers` processes for big worlds"""
+    regions = [(first_row, min(first_row + REGION_ROWS, height)) for first_row in range(0, height, REGION_ROWS)]
+    if width * height < PARALLEL_MIN_CELLS or workers == 1:
+        return b"".join(generate_region(seed, width, height, *region) for region in regions)
+    with ProcessPoolExecutor(workers or os.cpu_count(), mp_context=worker_context()) as pool:
+        futures = [pool.submit(generate_region, seed, width, height, *region) for region in regions]
+        return b"".join(future.result() for future in futures)
+
+
+def world_file(seed: int, width: int, height: int, path: Path = WORLD_PATH) -> Path:
+    return Path(path) / f"world_{seed}_{width}x{height}.bin"
+
+
+def save_links(file: Path, seed: int, width: int, height: int, links: bytes) -> None:
+    file.parent.mkdir(parents=True, exist_ok=True)
+    # written to a temporary file first, so an interrupted start never leaves a broken world
+    temporary_file = file.with_suffix(".tmp")
+    with open(temporary_file, 'wb') as fp:
+        fp.write(WORLD_HEADER.pack(WORLD_MAGIC, seed, width, height))
+        fp.write(links)
+    os.replace(temporary_file, file)
+
+
+def load_links(file: Path, seed: int, width: int, height: int) -> Optional[bytes]:
+    """returns the stored links or None, if the file is missing or belongs to another world"""
+    try:
+        with open(file, 'rb') as fp:
+            data = fp.read()
+    except OSError:
+        return None
+    if len(data) != WORLD_HEADER.size + width * height:
+        return None
+    if WORLD_HEADER.unpack_from(data) != (WORLD_MAGIC, seed, width, height):
+        return None
+    return data[WORLD_HEADER.size:]
+
+
+def get_world_links(seed: int, width: int, height: int, path: Optional[Path] = WORLD_PATH,
+                    workers: Optional[int] = None) -> bytes:
+    """loads the links of a world or generates and stores them. with `path` None nothing is stored"""
+    if width < 1 or height < 1:
+        raise ValueError(f"invalid world size {width}x{height}")
+    file = world_file(seed, width, height, path) if path is not None else None
+    links = load_links(file, seed, width, height) if file else None
+    if links is None:
+        links = generate_links(seed, width, height, workers)
+        if file:
+            save_links(file, seed, width, height, links)
+    return links
+
+
+def build_stages(links: bytes, width: int, sprite_group: MainCharGroup,
+                 tilemap: Optional[TileMap]) -> Tuple[GameStage, ...]:
+    """
+    creates the stages of a world in row major order and links them.
+    the links are set without the neighbor setters, which would walk the coordinates stage by stage
+    """
+    from game_world import GameStage
+
+    # millions of new objects would trigger the cyclic garbage collector over and over
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        stages = []
+        size = None
+        for index in range(len(links)):
+            y, x = divmod(index, width)
+            stage = GameStage(sprite_group, f"Stage {x},{y}", tilemap, size)
+            # all stages share one size tuple
+            size = stage.size
+            stage.coordinates[0] = x
+            stage.coordinates[1] = y
+            stages.append(stage)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    for index, stage in enumerate(stages):
+        link = links[index]
+        if link & LINK_RIGHT:
+            neighbor = stages[index + 1]
+            stage._right_stage = neighbor
+            neighbor._left_stage = stage
+        if link & LINK_DOWN:
+            neighbor = stages[index + width]
+            stage._bottom_stage = neighbor
+            neighbor._top_stage = stage
+    GameStage.topology_version += 1
+    return tuple(stages)
+
+
+def parse_world_size(text: str) -> Tuple[int, int]:
+    """parses `WIDTHxHEIGHT`, both at least 1"""
+    width, _, height = text.lower().partition("x")
+    size = int(width), int(height)
+    if min(size) < 1:
+        raise ValueError(f"world size {text} has less than one stage in a direction")
+    return size